@@ -0,0 +1,348 @@
+"""Per-client admission control: cost-weighted token buckets and fair slots.
+
+Every summarize, batch, chat and job request is charged an estimated cost
+(``request_cost``): one unit per request plus one per ``COST_BYTES`` of
+input, scaled by the speed mode and by ``ABSTRACTIVE_COST`` when BART runs.
+Each client has a token bucket that refills at ``ADMISSION_RATE`` units per
+second up to ``ADMISSION_BURST``. A request is admitted while its client's
+bucket holds its cost (or the whole burst, for requests costing more). The
+full cost is then deducted, so an oversized batch leaves the bucket in debt
+instead of being undercharged. Otherwise the request gets 429 with
+``Retry-After``.
+
+Clients are identified by their IP address. Identity headers are unverified,
+so anyone could send a new one with each request to get a fresh bucket; they
+are only used for requests from ``ADMISSION_TRUSTED_PROXIES``, an
+authenticating gateway that sets them itself. For those, the ``X-API-Key``
+header (hashed) identifies the client, else the ``X-User-Id`` header or the
+request's ``userId``, else the last ``X-Forwarded-For`` address.
+
+Admitted requests then wait for one of ``ADMISSION_CONCURRENCY`` slots
+(default: the CPU count). There are two priority classes. ``interactive``
+(summarize, chat) is served first and may use every slot. ``batch``
+(``/api/summarize/batch``) may hold at most ``ADMISSION_BATCH_SHARE`` of
+them, so interactive requests always find a free slot soon. Within a
+class, a free slot goes to the waiting client that has been granted the
+least cost so far, so one client's queue of 50 documents does not delay
+another client's single one. A request that waits longer than
+``ADMISSION_QUEUE_TIMEOUT`` gets 503 and its tokens back. Queued jobs are
+charged at submission but run under the job workers' own limits (jobs.py).
+
+Off unless ``ADMISSION_CONTROL`` is set: behind a load balancer every
+request comes from the balancer's address, so without
+``ADMISSION_TRUSTED_PROXIES`` all users would share one bucket.
+
+State is per worker process: with N workers a client can get up to N times
+``ADMISSION_RATE`` if its requests are spread across them.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+from fastapi import HTTPException, Request
+
+from metrics import (
+    ADMISSION_DECISIONS,
+    ADMISSION_QUEUED,
+    ADMISSION_RUNNING,
+    ADMISSION_WAIT_SECONDS,
+    CLIENT_COST,
+    CLIENT_REQUESTS,
+)
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "False").lower() in {"1", "true", "yes"}
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "2"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "50"))
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "0")) or (os.cpu_count() or 1)
+ADMISSION_BATCH_SHARE = float(os.getenv("ADMISSION_BATCH_SHARE", "0.5"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+# Peer addresses whose identity headers are trusted, comma-separated.
+ADMISSION_TRUSTED_PROXIES = {a.strip() for a in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if a.strip()}
+# Distinct client labels in metrics; further clients are reported as "other".
+ADMISSION_METRIC_CLIENTS = int(os.getenv("ADMISSION_METRIC_CLIENTS", "100"))
+
+COST_BYTES = 100_000
+SPEED_COST = {"fast": 0.5, "balanced": 1.0, "thorough": 2.0}
+ABSTRACTIVE_COST = 4.0
+CLASSES = ("interactive", "batch")  # in priority order
+# Idle buckets are dropped past this many clients (a full bucket carries no state).
+_MAX_BUCKETS = 10_000
+
+
+def request_cost(nbytes: int, settings: Optional[Dict[str, Any]] = None) -> float:
+    """Estimated cost in units: 1 + nbytes / COST_BYTES, scaled by speed mode and abstractive summarization."""
+    settings = settings or {}
+    cost = 1.0 + max(nbytes, 0) / COST_BYTES
+    cost *= SPEED_COST.get(settings.get("speedMode", "balanced"), 1.0)
+    if settings.get("useAbstractive"):
+        cost *= ABSTRACTIVE_COST
+    return cost
+
+
+def client_id(request: Request, user_id: Optional[str] = None) -> str:
+    """"ip:<address>" for the client behind `request`; "key:<hash>" or "user:<id>" only via a trusted proxy."""
+    host = request.client.host if request.client else "unknown"
+    if host not in ADMISSION_TRUSTED_PROXIES:
+        return f"ip:{host}"
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+    user = request.headers.get("x-user-id") or user_id
+    if user:
+        return f"user:{user}"
+    # The proxy appends the address it received the request from.
+    forwarded = request.headers.get("x-forwarded-for", "").split(",")[-1].strip()
+    return f"ip:{forwarded or host}"
+
+
+def body_bytes(request: Request) -> int:
+    size = request.headers.get("content-length")
+    return int(size) if size and size.isdigit() else 0
+
+
+class _Bucket:
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.cost = 0.0
+        self.rejected = 0
+
+
+class _Waiter:
+    def __init__(self, client: str, cost: float):
+        self.client = client
+        self.cost = cost
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.perf_counter()
+
+
+class _Class:
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.running = 0
+        self.queues: Dict[str, Deque[_Waiter]] = {}
+        # client -> cost granted (the fair-share clock)
+        self.served: Dict[str, float] = {}
+
+    def waiting(self) -> bool:
+        return any(self.queues.values())
+
+    def forget(self, client: str):
+        """Drop `client`'s queue once it is empty, and fair-share entries that no longer matter.
+
+        A client that starts waiting is lifted to the least-served waiting client (the floor), so
+        idle clients at or below the floor are dropped; past _MAX_BUCKETS entries, the least-served
+        idle ones go too.
+        """
+        if client in self.queues and not self.queues[client]:
+            del self.queues[client]
+        if self.queues:
+            floor = min(self.served.get(c, 0.0) for c in self.queues)
+            for c in [c for c, v in self.served.items() if v <= floor and c not in self.queues]:
+                del self.served[c]
+        if len(self.served) > _MAX_BUCKETS:
+            idle = sorted((v, c) for c, v in self.served.items() if c not in self.queues)
+            for _, c in idle[:len(self.served) - _MAX_BUCKETS // 2]:
+                del self.served[c]
+
+
+class AdmissionController:
+    """Token buckets per client plus prioritized, fair slots. Slots are used from the event loop only."""
+
+    def __init__(
+        self,
+        rate: float = ADMISSION_RATE,
+        burst: float = ADMISSION_BURST,
+        concurrency: int = ADMISSION_CONCURRENCY,
+        batch_share: float = ADMISSION_BATCH_SHARE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        enabled: bool = ADMISSION_CONTROL,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = max(1, concurrency)
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.classes = {
+            "interactive": _Class("interactive", self.concurrency),
+            "batch": _Class("batch", max(1, int(self.concurrency * batch_share))),
+        }
+        self.running = 0
+        self._buckets: Dict[str, _Bucket] = {}
+        self._labels: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _label(self, client: str) -> str:
+        # Caller holds self._lock.
+        if client not in self._labels:
+            if len(self._labels) >= ADMISSION_METRIC_CLIENTS:
+                return "other"
+            self._labels.add(client)
+        return client
+
+    def _refill(self, bucket: _Bucket, now: float):
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+
+    def charge(self, client: str, cost: float, klass: str = "interactive", force: bool = False):
+        """Take `cost` tokens from the client's bucket, or raise 429 with Retry-After (`force` never rejects)."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= _MAX_BUCKETS:
+                    self._prune(now)
+                bucket = self._buckets[client] = _Bucket(self.burst)
+            self._refill(bucket, now)
+            label = self._label(client)
+            needed = min(cost, self.burst)
+            if bucket.tokens < needed and not force:
+                bucket.rejected += 1
+                retry_after = (needed - bucket.tokens) / self.rate if self.rate > 0 else 60.0
+                CLIENT_REQUESTS.inc(client=label, decision="rate_limited")
+                ADMISSION_DECISIONS.inc(**{"class": klass, "decision": "rate_limited"})
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Rate limit exceeded; this request costs {cost:.1f} units at {self.rate:g} units/s.",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+            bucket.tokens -= cost
+            bucket.cost += cost
+            if not force:
+                CLIENT_REQUESTS.inc(client=label, decision="admitted")
+            CLIENT_COST.inc(cost, client=label, **{"class": klass})
+
+    def refund(self, client: str, cost: float):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is not None:
+                bucket.tokens = min(self.burst, bucket.tokens + cost)
+                bucket.cost -= cost
+
+    def _prune(self, now: float):
+        # Caller holds self._lock.
+        for client, bucket in list(self._buckets.items()):
+            self._refill(bucket, now)
+            if bucket.tokens >= self.burst:
+                del self._buckets[client]
+
+    def _free(self, cls: _Class) -> bool:
+        return self.running < self.concurrency and cls.running < cls.limit
+
+    def _grant(self, cls: _Class, client: str, cost: float):
+        self.running += 1
+        cls.running += 1
+        cls.served[client] = cls.served.get(client, 0.0) + cost
+        ADMISSION_RUNNING.inc(**{"class": cls.name})
+
+    def _dispatch(self):
+        """Hand free slots to waiters: higher classes first, least-served client first within a class."""
+        for name in CLASSES:
+            cls = self.classes[name]
+            while cls.waiting() and self._free(cls):
+                client = min((c for c, q in cls.queues.items() if q), key=lambda c: cls.served.get(c, 0.0))
+                waiter = cls.queues[client].popleft()
+                ADMISSION_QUEUED.dec(**{"class": name})
+                if not waiter.future.done():
+                    self._grant(cls, client, waiter.cost)
+                    waiter.future.set_result(None)
+                cls.forget(client)
+            if cls.waiting():
+                return  # lower classes wait until this one is served
+
+    def _release(self, klass: str):
+        cls = self.classes[klass]
+        self.running -= 1
+        cls.running -= 1
+        ADMISSION_RUNNING.dec(**{"class": klass})
+        self._dispatch()
+
+    async def _acquire(self, client: str, cost: float, klass: str):
+        cls = self.classes[klass]
+        higher = [self.classes[n] for n in CLASSES[:CLASSES.index(klass) + 1]]
+        if self._free(cls) and not any(c.waiting() for c in higher):
+            self._grant(cls, client, cost)
+            cls.forget(client)
+            ADMISSION_DECISIONS.inc(**{"class": klass, "decision": "admitted"})
+            ADMISSION_WAIT_SECONDS.observe(0.0, **{"class": klass})
+            return
+        queue = cls.queues.setdefault(client, deque())
+        if not queue:
+            # A client that was idle starts level with the waiting ones instead of spending saved-up credit.
+            active = [cls.served.get(c, 0.0) for c, q in cls.queues.items() if q]
+            cls.served[client] = max(cls.served.get(client, 0.0), min(active, default=0.0))
+        waiter = _Waiter(client, cost)
+        queue.append(waiter)
+        ADMISSION_QUEUED.inc(**{"class": klass})
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                self._release(klass)  # granted just as the wait ended
+            else:
+                waiter.future.cancel()
+                queue.remove(waiter)
+                cls.forget(client)
+                ADMISSION_QUEUED.dec(**{"class": klass})
+            self.refund(client, cost)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            ADMISSION_DECISIONS.inc(**{"class": klass, "decision": "queue_timeout"})
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy; no slot became free in time.",
+                headers={"Retry-After": str(max(1, math.ceil(self.queue_timeout)))},
+            )
+        ADMISSION_DECISIONS.inc(**{"class": klass, "decision": "queued"})
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - waiter.queued_at, **{"class": klass})
+
+    @asynccontextmanager
+    async def slot(self, client: str, cost: float, klass: str = "interactive") -> AsyncIterator[None]:
+        """Hold one of the worker's slots for the block, waiting for a fair turn if all are busy."""
+        if not self.enabled:
+            yield
+            return
+        await self._acquire(client, cost, klass)
+        try:
+            yield
+        finally:
+            self._release(klass)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            for bucket in self._buckets.values():
+                self._refill(bucket, now)
+            top = sorted(self._buckets.items(), key=lambda kv: kv[1].cost, reverse=True)[:50]
+            clients = {
+                client: {"tokens": round(b.tokens, 2), "cost": round(b.cost, 2), "rejected": b.rejected}
+                for client, b in top
+            }
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "burst": self.burst,
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "classes": {
+                name: {
+                    "limit": cls.limit,
+                    "running": cls.running,
+                    "queued": {c: len(q) for c, q in cls.queues.items() if q},
+                }
+                for name, cls in self.classes.items()
+            },
+            "clients": clients,
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,116 @@
+"""Chat latency while one client floods /api/summarize/batch, with admission control off and on.
+
+One bulk client keeps --bulk-requests batch uploads of --batch-files large
+documents in flight, all under one X-User-Id. Meanwhile --chat-users
+interactive users (one id each) send chat requests in a closed loop. The app
+runs in-process with ADMISSION_CONCURRENCY slots (--slots). Both runs report
+chat p50/p95/p99, completed and rate-limited (429) requests per side, and
+the cost each client was charged.
+
+    cd backend
+    python benchmarks/admission.py
+    python benchmarks/admission.py --slots 4 --bulk-requests 16 --duration 30
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import main as api  # noqa: E402
+from admission import ADMISSION_TRUSTED_PROXIES, AdmissionController  # noqa: E402
+from corpus import generate_document  # noqa: E402
+from loadtest import QUESTIONS, percentile  # noqa: E402
+from shared_cache import shared_cache  # noqa: E402
+
+
+async def run(args, enabled: bool) -> Dict[str, Any]:
+    api.admission = AdmissionController(concurrency=args.slots, enabled=enabled)
+    # Clients are told apart by X-User-Id, which counts only from a trusted proxy (httpx's 127.0.0.1 here).
+    ADMISSION_TRUSTED_PROXIES.add("127.0.0.1")
+    docs = [generate_document(args.doc_bytes, seed=i) for i in range(args.batch_files)]
+    chat_doc = generate_document(20_000, seed=99)
+    transport = httpx.ASGITransport(app=api.app)
+    deadline = time.perf_counter() + args.duration
+    chat_ms: List[float] = []
+    counts = {"bulk": {"ok": 0, "limited": 0, "other": 0}, "chat": {"ok": 0, "limited": 0, "other": 0}}
+
+    def record(side: str, status: int):
+        key = "ok" if status < 400 else "limited" if status == 429 else "other"
+        counts[side][key] += 1
+
+    async def bulk(client: httpx.AsyncClient):
+        while time.perf_counter() < deadline:
+            files = [("files", (f"doc{i}.txt", io.BytesIO(d.encode("utf-8")), "text/plain")) for i, d in enumerate(docs)]
+            r = await client.post(
+                "/api/summarize/batch",
+                files=files,
+                data={"settings": json.dumps({"speedMode": "balanced"})},
+                headers={"X-User-Id": "bulk"},
+            )
+            record("bulk", r.status_code)
+            if r.status_code == 429:
+                await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+
+    async def chat(client: httpx.AsyncClient, user: int):
+        i = 0
+        while time.perf_counter() < deadline:
+            payload = {"message": QUESTIONS[i % len(QUESTIONS)], "documentText": chat_doc, "conversationHistory": []}
+            started = time.perf_counter()
+            r = await client.post("/api/chat", json=payload, headers={"X-User-Id": f"chat-{user}"})
+            if r.status_code < 400:
+                chat_ms.append((time.perf_counter() - started) * 1000)
+            record("chat", r.status_code)
+            i += 1
+            await asyncio.sleep(args.think_ms / 1000)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=600) as client:
+        await asyncio.gather(
+            *(bulk(client) for _ in range(args.bulk_requests)),
+            *(chat(client, u) for u in range(args.chat_users)),
+        )
+    stats = api.admission.stats()
+    return {
+        "chat": {"p50": percentile(chat_ms, 50), "p95": percentile(chat_ms, 95), "p99": percentile(chat_ms, 99)},
+        "counts": counts,
+        "cost": {c: v["cost"] for c, v in stats["clients"].items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=2)
+    parser.add_argument("--bulk-requests", type=int, default=8, help="Concurrent batch uploads from the bulk client")
+    parser.add_argument("--batch-files", type=int, default=5)
+    parser.add_argument("--doc-bytes", type=int, default=200_000)
+    parser.add_argument("--chat-users", type=int, default=4)
+    parser.add_argument("--think-ms", type=float, default=1000.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    shared_cache.enabled = False
+    os.environ.pop("OPENAI_API_KEY", None)
+    os.environ.pop("HUGGINGFACE_API_TOKEN", None)
+    print(f"{'admission':>9} {'chat p50':>9} {'chat p95':>9} {'chat p99':>9} {'chat ok/429':>12} {'bulk ok/429':>12}  cost")
+    for enabled in (False, True):
+        r = asyncio.run(run(args, enabled))
+        c = r["counts"]
+        cost = ", ".join(
+            f"{name}={value:.0f}" for name, value in sorted(r["cost"].items(), key=lambda kv: -kv[1])[:3]
+        )
+        print(
+            f"{'on' if enabled else 'off':>9} {r['chat']['p50']:>9.0f} {r['chat']['p95']:>9.0f} {r['chat']['p99']:>9.0f} "
+            f"{c['chat']['ok']:>6}/{c['chat']['limited']:<5} {c['bulk']['ok']:>6}/{c['bulk']['limited']:<5}  {cost or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
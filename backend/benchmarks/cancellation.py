@@ -0,0 +1,156 @@
+"""Work left after a client disconnects from /api/summarize.
+
+The app runs in-process and is called over raw ASGI, so the script decides
+when the client goes away: its receive channel delivers the request body and
+then, --disconnect-ms later, ``http.disconnect``. For every disconnect time
+the script reports:
+
+- stop ms: time from the disconnect to the worker thread stopping, from
+  ``sumrify_cancel_stop_seconds``;
+- stage: the stage the work stopped before (``sumrify_cancelled_requests_total``);
+- saved ms: how much sooner the worker finished than a full run.
+
+A reference run without a disconnect is profiled first. The check passes if
+every cancelled run stopped within the longest single stage of that run
+(times --slack, for timing noise), i.e. a disconnected request stops at the
+next checkpoint. The exit status is 1 otherwise, so the script can gate CI.
+--timeout runs the same check with REQUEST_TIMEOUT instead of a disconnect.
+
+    cd backend
+    python benchmarks/cancellation.py
+    python benchmarks/cancellation.py --doc-bytes 2000000 --disconnect-ms 50 500 1500
+    python benchmarks/cancellation.py --timeout
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import cancellation  # noqa: E402
+import main as api  # noqa: E402
+from corpus import generate_document  # noqa: E402
+from metrics import CANCELLED_REQUESTS, CANCEL_STOP_SECONDS  # noqa: E402
+from shared_cache import shared_cache  # noqa: E402
+
+
+async def post(body: bytes, disconnect_after: Optional[float]) -> Tuple[int, Dict[str, Any], float]:
+    """(status, JSON response, seconds until the handler returned) for one POST /api/summarize."""
+    started = time.perf_counter()
+    sent = False
+    status, chunks = 0, []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        if disconnect_after is None:
+            await asyncio.Event().wait()  # stays connected
+        remaining = started + disconnect_after - time.perf_counter()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        return {"type": "http.disconnect"}
+
+    async def send(event):
+        nonlocal status
+        if event["type"] == "http.response.start":
+            status = event["status"]
+        elif event["type"] == "http.response.body":
+            chunks.append(event.get("body", b""))
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/summarize", "raw_path": b"/api/summarize",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "query_string": b"", "http_version": "1.1", "scheme": "http", "root_path": "",
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80), "asgi": {"version": "3.0"},
+    }
+    await api.app(scope, receive, send)
+    elapsed = time.perf_counter() - started
+    raw = b"".join(chunks)
+    return status, json.loads(raw) if raw else {}, elapsed
+
+
+def cancelled_since(before: Dict[str, Any]) -> Tuple[Optional[str], Optional[float]]:
+    """(stage, stop seconds) of the cancellation recorded since the `before` snapshots."""
+    stage = None
+    counts = CANCELLED_REQUESTS.snapshot()["samples"]
+    for key, value in counts.items():
+        if value > before["counts"].get(key, 0.0):
+            stage = json.loads(key)[2]
+    stops = CANCEL_STOP_SECONDS.snapshot()["samples"].get(json.dumps(["summarize"]))
+    previous = before["stops"]
+    if stops is None or (previous is not None and stops[-1] == previous[-1]):
+        return stage, None
+    return stage, stops[-2] - (previous[-2] if previous else 0.0)
+
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        "counts": CANCELLED_REQUESTS.snapshot()["samples"],
+        "stops": CANCEL_STOP_SECONDS.snapshot()["samples"].get(json.dumps(["summarize"])),
+    }
+
+
+async def run(args) -> bool:
+    text = generate_document(args.doc_bytes, seed=7)
+    settings = {"speedMode": args.speed, "useAbstractive": args.abstractive}
+    status, reference, full = await post(json.dumps({"text": text, "settings": {**settings, "profile": "stages"}}).encode(), None)
+    if status != 200:
+        print(f"reference run failed: {status} {reference}")
+        return False
+    stages = reference["metrics"]["profile"]["stages"]
+    longest = max(stages, key=lambda s: s["ms"])
+    limit = longest["ms"] * args.slack
+    print(f"full run {full * 1000:.0f} ms; longest stage {longest['stage']} {longest['ms']:.0f} ms; limit {limit:.0f} ms")
+
+    body = json.dumps({"text": text, "settings": settings}).encode()
+    ok = True
+    label = "timeout ms" if args.timeout else "disconnect ms"
+    print(f"{label:>13} {'status':>7} {'stop ms':>8} {'stage':>12} {'saved ms':>9}  within limit")
+    for after_ms in args.disconnect_ms:
+        before = snapshot()
+        if args.timeout:
+            cancellation.REQUEST_TIMEOUT = after_ms / 1000
+            status, _, elapsed = await post(body, None)
+            cancellation.REQUEST_TIMEOUT = 0.0
+        else:
+            status, _, elapsed = await post(body, after_ms / 1000)
+        stage, stop = cancelled_since(before)
+        if stop is None:
+            # Finished before the disconnect was noticed: nothing to cancel.
+            print(f"{after_ms:>13.0f} {status:>7} {'-':>8} {'-':>12} {'-':>9}  (completed)")
+            continue
+        within = stop * 1000 <= limit
+        ok = ok and within
+        print(
+            f"{after_ms:>13.0f} {status:>7} {stop * 1000:>8.1f} {stage or '-':>12} {(full - elapsed) * 1000:>9.0f}  "
+            f"{'yes' if within else 'NO'}"
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doc-bytes", type=int, default=1_000_000)
+    parser.add_argument("--speed", default="balanced", choices=["fast", "balanced", "thorough"])
+    parser.add_argument("--abstractive", action="store_true")
+    parser.add_argument("--disconnect-ms", type=float, nargs="+", default=[20, 200, 500, 800])
+    parser.add_argument("--timeout", action="store_true", help="Cancel with REQUEST_TIMEOUT instead of a disconnect")
+    parser.add_argument("--slack", type=float, default=1.5)
+    args = parser.parse_args()
+
+    shared_cache.enabled = False
+    api.admission.enabled = False
+    ok = asyncio.run(run(args))
+    print("PASS" if ok else "FAIL: a cancelled request ran past its next checkpoint")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Cold start of the serverless chat handler: import time and time to first response.
+
+Each run starts a fresh Python process that imports the handler file, then
+sends it one chat request over ASGI (no HTTP server or client involved). The
+process reports:
+
+- import ms: loading the handler module and everything it imports
+- first ms: handling the first request, including any provider import it triggers
+- warm ms: handling a second request in the same process
+- which heavy modules (FastAPI, pydantic, httpx, OpenAI SDK) are loaded by then
+
+The script prints medians over --runs processes for each handler. By default
+the handlers are api/chat.py and frontend/api/chat.py; pass --handler to
+compare others, such as an older version of the file. With --provider
+openai or huggingface, a stub provider (stub_llm.py) answers.
+
+    cd backend
+    python benchmarks/chat_coldstart.py
+    python benchmarks/chat_coldstart.py --provider huggingface --runs 20
+    python benchmarks/chat_coldstart.py --handler /tmp/old_chat.py --handler ../api/chat.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+HEAVY_MODULES = ("fastapi", "pydantic", "httpx", "openai")
+
+# Runs in the fresh process; argv: handler path, request body.
+CHILD = r"""
+# The serverless runtime has its event loop running before it imports the handler.
+import asyncio, importlib.util, json, sys, time
+started = time.perf_counter()
+
+spec = importlib.util.spec_from_file_location("chat_handler", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+
+async def call(body):
+    sent, out = [False], {}
+    async def receive():
+        if sent[0]:
+            return {"type": "http.disconnect"}
+        sent[0] = True
+        return {"type": "http.request", "body": body, "more_body": False}
+    async def send(event):
+        if event["type"] == "http.response.start":
+            out["status"] = event["status"]
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": [(b"content-type", b"application/json")],
+             "query_string": b"", "http_version": "1.1", "scheme": "http", "root_path": "",
+             "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80), "asgi": {"version": "3.0"}}
+    await module.app(scope, receive, send)
+    return out.get("status")
+
+body = sys.argv[2].encode("utf-8")
+status = asyncio.run(call(body))
+first = time.perf_counter()
+asyncio.run(call(body))
+warm = time.perf_counter()
+print(json.dumps({
+    "importMs": (imported - started) * 1000,
+    "firstMs": (first - imported) * 1000,
+    "warmMs": (warm - first) * 1000,
+    "status": status,
+    "heavy": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def measure(handler: str, body: str, runs: int) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD % (HEAVY_MODULES,), handler, body],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(handler),
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "importMs": statistics.median(s["importMs"] for s in samples),
+        "firstMs": statistics.median(s["firstMs"] for s in samples),
+        "warmMs": statistics.median(s["warmMs"] for s in samples),
+        "status": samples[-1]["status"],
+        "heavy": samples[-1]["heavy"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handler", action="append", help="Handler file (repeatable)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--provider", choices=["local", "openai", "huggingface"], default="local")
+    parser.add_argument("--doc-bytes", type=int, default=20_000)
+    parser.add_argument("--stub-port", type=int, default=8901)
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    handlers = args.handler or [os.path.join(REPO_DIR, "api", "chat.py"), os.path.join(REPO_DIR, "frontend", "api", "chat.py")]
+
+    from corpus import generate_document
+    from loadtest import QUESTIONS
+
+    for key in ("OPENAI_API_KEY", "HUGGINGFACE_API_TOKEN", "HF_API_TOKEN"):
+        os.environ.pop(key, None)
+    if args.provider != "local":
+        from loadtest import start_stub
+
+        args.stub_jitter_ms, args.stub_tokens = 0.0, 60
+        start_stub(args)
+    body = json.dumps({"message": QUESTIONS[0], "documentText": generate_document(args.doc_bytes, seed=0), "conversationHistory": []})
+
+    print(f"{'handler':<40} {'import ms':>10} {'first ms':>9} {'warm ms':>8} {'status':>7}  heavy modules")
+    for handler in handlers:
+        r = measure(os.path.abspath(handler), body, args.runs)
+        name = os.path.relpath(os.path.abspath(handler), REPO_DIR)
+        print(f"{name:<40} {r['importMs']:>10.1f} {r['firstMs']:>9.1f} {r['warmMs']:>8.1f} {r['status']!s:>7}  {', '.join(r['heavy']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
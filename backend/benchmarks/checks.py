@@ -0,0 +1,218 @@
+"""Behavior checks for paths the other benchmarks only time.
+
+Each check runs in a fresh Python process with a time limit, so a hang fails
+the check instead of blocking the run. The script prints one line per check
+and exits with status 1 if any failed, so it can gate CI.
+
+- hierarchical_after_flat: a hierarchical (map-reduce) summary completes after
+  a flat one has started the inference slots, and a map worker can make a
+  model call, with each start method (HIERARCHICAL_START_METHOD) available
+  on this platform.
+- dedup_keeps_summary_length: sentences that differ only in their figures
+  are not near-duplicates, a running head that differs only in its page
+  number is, and MMR still returns the requested number of sentences when
+  fewer near-duplicate groups than that remain.
+- cancelled_request_releases_slot: with one admission slot, a /api/summarize
+  request whose client disconnects mid-run, one that disconnects while
+  queued behind it, and one that hits REQUEST_TIMEOUT all give their slot
+  back, and the next request is admitted and completes.
+- frontend_chat_core_in_sync: frontend/api/chat_core.py, bundled with the
+  frontend's serverless chat, is a current copy of backend/chat_core.py.
+
+    cd backend
+    python benchmarks/checks.py
+    python benchmarks/checks.py hierarchical_after_flat --timeout 300
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Backend modules first: some benchmarks share their names (admission.py, cancellation.py).
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+CHECKS: Dict[str, Callable[[], None]] = {}
+
+
+def check(fn: Callable[[], None]) -> Callable[[], None]:
+    CHECKS[fn.__name__] = fn
+    return fn
+
+
+def _model_call_in_worker() -> int:
+    import inference
+
+    return inference.run("embedding", os.getpid)
+
+
+@check
+def hierarchical_after_flat():
+    # Read at import: several small sections, two map workers.
+    os.environ["HIERARCHICAL_SECTION_SENTENCES"] = "200"
+    os.environ["HIERARCHICAL_WORKERS"] = "2"
+    import hierarchical
+    import inference
+    from corpus import generate_document
+    from shared_cache import shared_cache
+    from summarizer import summarize_document
+
+    shared_cache.enabled = False
+    text = generate_document(200_000, seed=5)
+    # An earlier semantic request leaves the embedding slots running in this process.
+    inference.run("embedding", lambda: None)
+    flat = summarize_document(text, hierarchical=False)
+    for method in ("fork", "forkserver", "spawn"):
+        if method not in multiprocessing.get_all_start_methods():
+            continue
+        hierarchical.START_METHOD = method
+        result = summarize_document(text, hierarchical=True)
+        workers = result["metrics"]["hierarchical"]["workers"]
+        assert workers == 2, f"{method}: expected 2 map workers, got {workers}"
+        assert result["summary"] and flat["summary"], f"{method}: empty summary"
+        # Map workers make model calls only with the models installed; make one directly.
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(method)) as pool:
+            pool.submit(_model_call_in_worker).result()
+
+
+@check
+def dedup_keeps_summary_length():
+    import numpy as np
+
+    import dedup
+    import summarizer
+    from shared_cache import shared_cache
+
+    shared_cache.enabled = False
+    figures = [f"Revenue in region {i} grew by {i * 3 + 1} percent to {i * 7 + 20} million dollars in the fiscal year." for i in range(400)]
+    groups = dedup.near_duplicate_groups(figures)
+    assert len(set(groups)) == len(figures), f"{len(set(groups))} groups for {len(figures)} sentences differing in figures"
+    heads = [f"Annual Report of the Example Company, page {page} of 40." for page in range(1, 41)]
+    assert len(set(dedup.near_duplicate_groups(heads))) == 1, "running heads differing in page number not grouped"
+
+    # Three groups of near-duplicates, ten sentences requested: MMR (embeddings given) refills from the groups.
+    sentences = [heads[i % 40] if i % 3 == 0 else f"{'Alpha' if i % 3 == 1 else 'Beta'} section text repeated here." for i in range(30)]
+    scores = [{"index": i, "score": 1.0 - i / 100} for i in range(len(sentences))]
+    embeddings = np.random.default_rng(0).random((len(sentences), 8), dtype=np.float32)
+    summarizer.ADVANCED_MODE = True
+    summarizer.get_embedding_model = lambda: object()
+    selected = summarizer.maximal_marginal_relevance(sentences, scores, 10, embeddings=embeddings)
+    assert len(selected) == len(set(selected)) == 10, f"MMR selected {selected}, expected 10 sentences"
+
+
+async def _post_summarize(app, text: str, disconnect_after: Optional[float] = None) -> int:
+    """Status of one POST /api/summarize over raw ASGI; the client disconnects `disconnect_after` seconds in."""
+    body = json.dumps({"text": text, "settings": {"speedMode": "balanced"}}).encode()
+    started = time.perf_counter()
+    sent, status = False, 0
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(max(0.0, started + disconnect_after - time.perf_counter()))
+        return {"type": "http.disconnect"}
+
+    async def send(event):
+        nonlocal status
+        if event["type"] == "http.response.start":
+            status = event["status"]
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/summarize", "raw_path": b"/api/summarize",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "query_string": b"", "http_version": "1.1", "scheme": "http", "root_path": "",
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80), "asgi": {"version": "3.0"},
+    }
+    await app(scope, receive, send)
+    return status
+
+
+@check
+def cancelled_request_releases_slot():
+    import cancellation
+    import main as api
+    from admission import AdmissionController
+    from corpus import generate_document
+    from shared_cache import shared_cache
+
+    shared_cache.enabled = False
+    api.admission = AdmissionController(concurrency=1, burst=1e9, enabled=True)
+    long_text = generate_document(1_000_000, seed=11)
+    short_text = generate_document(5_000, seed=12)
+
+    def idle(after: str):
+        stats = api.admission.stats()
+        queued = sum(len(q) for cls in stats["classes"].values() for q in cls["queued"].values())
+        assert stats["running"] == 0 and queued == 0, f"after {after}: {stats['running']} running, {queued} queued"
+
+    async def run():
+        status = await _post_summarize(api.app, long_text, disconnect_after=0.2)
+        assert status == 499, f"disconnect mid-run: status {status}"
+        idle("a disconnect mid-run")
+        # The second request disconnects while the first holds the only slot.
+        statuses = await asyncio.gather(
+            _post_summarize(api.app, long_text, disconnect_after=0.6),
+            _post_summarize(api.app, long_text, disconnect_after=0.2),
+        )
+        assert statuses == [499, 499], f"disconnect while queued: statuses {statuses}"
+        idle("a disconnect while queued")
+        cancellation.REQUEST_TIMEOUT = 0.2
+        status = await _post_summarize(api.app, long_text)
+        cancellation.REQUEST_TIMEOUT = 0.0
+        assert status == 504, f"timeout: status {status}"
+        idle("a timeout")
+        status = await asyncio.wait_for(_post_summarize(api.app, short_text), 60)
+        assert status == 200, f"request after the cancellations: status {status}"
+        idle("a completed request")
+
+    asyncio.run(run())
+
+
+@check
+def frontend_chat_core_in_sync():
+    backend_dir = os.path.dirname(BENCH_DIR)
+    with open(os.path.join(backend_dir, "chat_core.py"), "rb") as f:
+        source = f.read()
+    with open(os.path.join(os.path.dirname(backend_dir), "frontend", "api", "chat_core.py"), "rb") as f:
+        copy = f.read()
+    assert copy == source, "frontend/api/chat_core.py differs from backend/chat_core.py; copy it again"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("checks", nargs="*", help="Checks to run (default: all)")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Seconds per check")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        CHECKS[args.run]()
+        return
+
+    failed = 0
+    for name in args.checks or list(CHECKS):
+        started = time.perf_counter()
+        try:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", name],
+                capture_output=True, text=True, timeout=args.timeout,
+            )
+            ok, detail = proc.returncode == 0, (proc.stderr.strip().splitlines() or [""])[-1]
+        except subprocess.TimeoutExpired:
+            ok, detail = False, f"timed out after {args.timeout:.0f} s"
+        failed += not ok
+        print(f"{'PASS' if ok else 'FAIL'}  {name:<32} {time.perf_counter() - started:>6.1f} s  {'' if ok else detail}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Deterministic synthetic corpora for benchmarks.
+
+Documents range from short plain notes to multi-megabyte "PDF extractions"
+with the artifacts `clean_extracted_text` exists to remove: running headers,
+page footers, DOI lines, copyright boilerplate, table captions and lines
+hard-wrapped mid-sentence. The same (size, seed) always yields the same text.
+"""
+import random
+from typing import Dict, List
+
+SIZES: Dict[str, int] = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+    "50m": 50_000_000,
+}
+
+DOMAINS = {
+    "academic": {
+        "nouns": ["study", "sample", "cohort", "model", "hypothesis", "dataset", "method", "variable", "trial", "analysis"],
+        "verbs": ["suggests", "confirms", "measures", "predicts", "explains", "challenges", "extends", "replicates"],
+        "adjs": ["significant", "robust", "novel", "longitudinal", "statistical", "empirical", "controlled", "baseline"],
+        "orgs": ["the research team", "the authors", "prior work", "the review board", "the consortium"],
+    },
+    "legal": {
+        "nouns": ["agreement", "party", "obligation", "liability", "clause", "contract", "licensee", "term", "notice", "right"],
+        "verbs": ["shall govern", "limits", "grants", "terminates", "requires", "excludes", "assigns", "indemnifies"],
+        "adjs": ["binding", "exclusive", "material", "written", "applicable", "reasonable", "prior", "confidential"],
+        "orgs": ["the licensor", "either party", "the court", "the arbitrator", "the parties hereto"],
+    },
+    "journalistic": {
+        "nouns": ["council", "minister", "market", "election", "storm", "company", "report", "budget", "strike", "vote"],
+        "verbs": ["announced", "reported", "delayed", "approved", "criticised", "confirmed", "rejected", "revealed"],
+        "adjs": ["local", "national", "unexpected", "record", "quarterly", "disputed", "emergency", "official"],
+        "orgs": ["officials", "a spokesperson", "analysts", "residents", "the agency"],
+    },
+}
+
+HEADERS = [
+    "Journal of Applied Computational Studies Vol. 12",
+    "Discover Oncology (2024) 15:212",
+    "Scientific Reports | www.nature.com/scientificreports",
+]
+
+
+def _sentence(rng: random.Random, vocab: Dict[str, List[str]]) -> str:
+    n1, n2 = rng.sample(vocab["nouns"], 2)
+    templates = [
+        "The {a} {n1} {v} the {n2} across {k} observed cases, according to {o}.",
+        "In {y}, {o} noted that the {n1} {v} the {a} {n2} by {p} percent.",
+        "Because the {n1} {v} the {n2}, {o} recommended a {a} review within {k} months.",
+        "{O} said the {a} {n1} {v} the {n2} only when the {n2} exceeded {k} units.",
+        "A {a} {n1} {v} each {n2}, which {o} described as consistent with earlier findings.",
+    ]
+    org = rng.choice(vocab["orgs"])
+    return rng.choice(templates).format(
+        a=rng.choice(vocab["adjs"]),
+        n1=n1,
+        n2=n2,
+        v=rng.choice(vocab["verbs"]),
+        o=org,
+        O=org[0].upper() + org[1:],
+        k=rng.randint(2, 400),
+        p=rng.randint(1, 95),
+        y=rng.randint(1990, 2024),
+    )
+
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def generate_document(size: int, seed: int = 0, domain: str = "academic", noisy: bool = True) -> str:
+    """Return about `size` bytes of text; `noisy` adds PDF page furniture."""
+    rng = random.Random(f"{seed}:{size}:{domain}")
+    vocab = DOMAINS.get(domain, DOMAINS["academic"])
+    header = rng.choice(HEADERS)
+    doi = f"https://doi.org/10.{rng.randint(1000, 9999)}/s{rng.randint(10000, 99999)}-024-{rng.randint(10000, 99999)}-{rng.randint(0, 9)}"
+
+    out: List[str] = []
+    total = 0
+    page = 1
+    page_bytes = 0
+    while total < size:
+        paragraph = " ".join(_sentence(rng, vocab) for _ in range(rng.randint(3, 7)))
+        lines = _wrap(paragraph, rng.choice([78, 90, 104])) if noisy else [paragraph]
+        if noisy and rng.random() < 0.08:
+            lines.append(f"Table {rng.randint(1, 9)} Summary of {rng.choice(vocab['nouns'])} outcomes")
+        for line in lines:
+            out.append(line)
+            total += len(line) + 1
+            page_bytes += len(line) + 1
+        out.append("")
+        if noisy and page_bytes > 3000:
+            # Page break: footer, DOI line, page number, then the next running head.
+            out.extend([doi, "© 2024 The Author(s). Open Access", str(page), header])
+            total += len(doi) + len(header) + 40
+            page += 1
+            page_bytes = 0
+    text = "\n".join(out)
+    if noisy:
+        text = header + "\n" + text
+    return text[:size] if len(text) > size else text
+
+
+def generate_corpus(names: List[str], seed: int = 0) -> Dict[str, str]:
+    """Generate the named corpora; sizes up to 1k are clean notes, larger ones PDF-like."""
+    corpus = {}
+    for name in names:
+        size = SIZES[name]
+        corpus[name] = generate_document(size, seed=seed, noisy=size > 1_000)
+    return corpus
@@ -0,0 +1,152 @@
+"""DOCX extraction benchmark: streaming extractor vs python-docx.
+
+Writes a synthetic DOCX of N pages (paragraphs from corpus.py, a table on
+every page, a header, a footer and footnotes), then extracts it with
+`docx_stream.iter_docx_text` and with python-docx (paragraphs and, for a fair
+comparison, table cells too). It reports wall time, peak RSS growth and
+extracted characters for each.
+
+    cd backend
+    python benchmarks/docx_extract.py --pages 1000
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+import docx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from corpus import generate_document  # noqa: E402
+from docx_stream import iter_docx_text  # noqa: E402
+
+NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" ' \
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/header1.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"/>
+<Override PartName="/word/footer1.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml"/>
+<Override PartName="/word/footnotes.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"/>
+</Types>"""
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+DOC_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/header" Target="header1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer" Target="footer1.xml"/>
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/footnotes" Target="footnotes.xml"/>
+</Relationships>"""
+
+
+def _p(text: str, footnote: int = 0) -> str:
+    ref = f'<w:r><w:footnoteReference w:id="{footnote}"/></w:r>' if footnote else ""
+    return f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(text)}</w:t></w:r>{ref}</w:p>"
+
+
+def build_docx(pages: int, paragraphs_per_page: int = 8, return_text: bool = False):
+    """A DOCX of roughly `pages` pages (about 450 words of body text plus a 4x3 table each).
+
+    With `return_text`, returns (bytes, body, table and footnote text written).
+    """
+    sentences = [s for s in generate_document(pages * 3200, seed=7).replace("\n", " ").split(". ") if s]
+    per_paragraph = max(1, len(sentences) // (pages * paragraphs_per_page))
+    body = []
+    notes = []
+    written = []
+    idx = 0
+    for page in range(pages):
+        for j in range(paragraphs_per_page):
+            chunk = ". ".join(sentences[idx:idx + per_paragraph]) + "."
+            idx += per_paragraph
+            note = 0
+            if j == 0:
+                note = page + 1
+                notes.append(f'<w:footnote w:id="{note}">{_p(f"Note {note}: source table {page}.")}</w:footnote>')
+                written.append(f"Note {note}: source table {page}.")
+            body.append(_p(chunk, note))
+            written.append(chunk)
+        rows = "".join(
+            "<w:tr>" + "".join(f"<w:tc>{_p(f'Cell {page}.{r}.{c}')}</w:tc>" for c in range(3)) + "</w:tr>"
+            for r in range(4)
+        )
+        body.append(f"<w:tbl>{rows}</w:tbl>")
+        written.extend(f"Cell {page}.{r}.{c}" for r in range(4) for c in range(3))
+        body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    document = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {NS}><w:body>{"".join(body)}' \
+               f'<w:sectPr><w:headerReference w:type="default" r:id="rId1"/>' \
+               f'<w:footerReference w:type="default" r:id="rId2"/></w:sectPr></w:body></w:document>'
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", CONTENT_TYPES)
+        zf.writestr("_rels/.rels", ROOT_RELS)
+        zf.writestr("word/_rels/document.xml.rels", DOC_RELS)
+        zf.writestr("word/document.xml", document)
+        zf.writestr("word/header1.xml", f"<w:hdr {NS}>{_p('Quarterly Review — Confidential')}</w:hdr>")
+        zf.writestr("word/footer1.xml", f"<w:ftr {NS}>{_p('Sumrify benchmark document')}</w:ftr>")
+        zf.writestr("word/footnotes.xml", f"<w:footnotes {NS}>{''.join(notes)}</w:footnotes>")
+    if return_text:
+        return out.getvalue(), "\n".join(written)
+    return out.getvalue()
+
+
+def python_docx_text(data: bytes) -> str:
+    doc = docx.Document(io.BytesIO(data))
+    parts = [p.text for p in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            parts.extend(cell.text for cell in row.cells)
+    return "\n".join(parts)
+
+
+def streaming_text(data: bytes) -> str:
+    return "\n".join(iter_docx_text(io.BytesIO(data), include_headers=True, include_notes=True))
+
+
+def _child(fn, data: bytes, conn):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    text = fn(data)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send((elapsed, (peak - base) / 1024, len(text)))
+    conn.close()
+
+
+def measure(fn, data: bytes):
+    """Run `fn` in a forked child; peak RSS growth covers lxml's C allocations, which tracemalloc misses."""
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(fn, data, child))
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'docx MB':>8} {'extractor':<12} {'seconds':>8} {'RSS +MB':>8} {'chars':>10}")
+    for pages in args.pages:
+        data = build_docx(pages)
+        for name, fn in (("streaming", streaming_text), ("python-docx", python_docx_text)):
+            elapsed, peak, chars = measure(fn, data)
+            print(f"{pages:>6} {len(data) / 1e6:>8.2f} {name:<12} {elapsed:>8.2f} {peak:>8.1f} {chars:>10}")
+
+
+if __name__ == "__main__":
+    main()
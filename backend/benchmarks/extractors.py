@@ -0,0 +1,157 @@
+"""Extractor registry benchmark: pages per second and extraction quality per backend.
+
+Builds synthetic documents with known text, namely single-column PDFs,
+two-column PDFs (the "difficult layout" case), DOCX files with tables, and
+text files in several encodings. Each one runs through every installed
+backend in `parsers.EXTRACTORS`. Quality is the token-level F1 between the
+extracted text and the text that was written, so it drops when a backend
+loses words or glues them together. Bigram F1 also drops when the reading
+order is wrong, for example when lines of two columns are interleaved.
+
+    cd backend
+    python benchmarks/extractors.py --pages 50 200
+"""
+import argparse
+import io
+import os
+import re
+import sys
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import parsers  # noqa: E402
+from shared_cache import shared_cache  # noqa: E402
+from corpus import generate_document  # noqa: E402
+from docx_extract import build_docx  # noqa: E402
+
+LINES_PER_PAGE = 48
+CHARS_PER_LINE = 90
+
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _pdf_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages: int, columns: int = 1, seed: int = 0) -> Tuple[bytes, str]:
+    """A Helvetica text PDF with `pages` pages in 1 or 2 columns; returns (bytes, text written)."""
+    width = CHARS_PER_LINE // columns - 4
+    lines = _wrap(generate_document(pages * LINES_PER_PAGE * CHARS_PER_LINE, seed=seed).replace("\n", " "), width)
+    per_page = LINES_PER_PAGE * columns
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    pages_id = add(b"")  # filled in below
+    kids, written = [], []
+    for p in range(pages):
+        page_lines = lines[p * per_page:(p + 1) * per_page]
+        written.extend(page_lines)
+        ops = ["BT", "/F1 9 Tf"]
+        # Drawn row by row across columns, so the content-stream order differs from
+        # the reading order (column by column) whenever there is more than one column.
+        for row in range(LINES_PER_PAGE):
+            for c in range(columns):
+                i = c * LINES_PER_PAGE + row
+                if i < len(page_lines):
+                    ops.append(f"1 0 0 1 {40 + c * 280} {800 - row * 11} Tm ({_pdf_escape(page_lines[i])}) Tj")
+        ops.append("ET")
+        stream = zlib.compress("\n".join(ops).encode("cp1252", errors="replace"))
+        content = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 %d 0 R >> >> "
+            b"/Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % i + obj + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for off in offsets:
+        out.write(b"%010d 00000 n \n" % off)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue(), "\n".join(written)
+
+
+def _ngrams(text: str, n: int) -> Counter:
+    words = re.findall(r"\w+", text.lower())
+    return Counter(zip(*(words[i:] for i in range(n))))
+
+
+def ngram_f1(extracted: str, truth: str, n: int = 1) -> float:
+    """Token (n=1) or bigram (n=2, sensitive to reading order) F1 against the written text."""
+    got, want = _ngrams(extracted, n), _ngrams(truth, n)
+    overlap = sum((got & want).values())
+    if not overlap:
+        return 0.0
+    p, r = overlap / sum(got.values()), overlap / sum(want.values())
+    return round(2 * p * r / (p + r), 4)
+
+
+def build_cases(pages: int) -> List[Dict]:
+    cases = []
+    for columns in (1, 2):
+        data, truth = build_pdf(pages, columns=columns, seed=pages)
+        cases.append({"name": f"pdf-{columns}col", "format": "pdf", "pages": pages, "data": data, "truth": truth})
+    data, truth = build_docx(pages, return_text=True)
+    cases.append({"name": "docx", "format": "docx", "pages": pages, "data": data, "truth": truth})
+    text = "Le café était fermé; naïve façade. " + generate_document(pages * 3000, seed=pages)
+    for enc in ("utf-8", "utf-16", "cp1252"):
+        cases.append({"name": f"txt-{enc}", "format": "txt", "pages": pages, "data": text.encode(enc), "truth": text})
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50])
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    shared_cache.enabled = False
+    print("installed:", {fmt: list(b) for fmt, b in parsers.EXTRACTORS.items()})
+    print(f"{'case':<12} {'pages':>5} {'backend':<12} {'detected':<9} {'pages/s':>9} {'F1':>7} {'bigramF1':>9}")
+    for pages in args.pages:
+        for case in build_cases(pages):
+            f = io.BytesIO(case["data"])
+            detected = parsers.detect_format(case["data"][:parsers.SNIFF_BYTES], f)
+            for name, extractor in parsers.EXTRACTORS[case["format"]].items():
+                best = float("inf")
+                text = ""
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    text = extractor(io.BytesIO(case["data"]))
+                    best = min(best, time.perf_counter() - started)
+                rate = case["pages"] / best if best else float("inf")
+                print(f"{case['name']:<12} {pages:>5} {name:<12} {detected or '-':<9} {rate:>9.1f} "
+                      f"{ngram_f1(text, case['truth']):>7.3f} {ngram_f1(text, case['truth'], 2):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
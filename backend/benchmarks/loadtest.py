@@ -0,0 +1,279 @@
+"""Closed-loop load generator for the backend and the serverless chat app.
+
+Virtual users repeatedly pick an endpoint from a weighted mix (summarize,
+batch, chat, history), send a realistic request and record latency. Each
+concurrency step runs for a fixed duration. The report gives throughput,
+p50/p95/p99 latency and error rate per endpoint, plus the highest throughput
+that still met the latency SLO (max sustainable RPS).
+
+Chat calls go to a local stub of the OpenAI / Hugging Face APIs (stub_llm.py),
+started automatically, so provider latency is controlled and free.
+
+    cd backend
+    python benchmarks/loadtest.py                                   # backend/main.py in-process
+    python benchmarks/loadtest.py --app chat --mix chat=1           # api/chat.py in-process
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --concurrency 1 4 16 64
+    python benchmarks/loadtest.py --provider huggingface --stub-latency-ms 800 --report load.json
+
+In-process runs share one event loop and one process with the app. Use
+--url against `serve.py` to get numbers that match production. A closed loop
+without think time exceeds any per-client rate limit, so in-process runs
+turn admission control (admission.py) off unless --admission is given. Every
+virtual user sends its own X-User-Id; rate-limited (429) responses count as
+errors and are also reported per endpoint. With --url, start the server with
+ADMISSION_TRUSTED_PROXIES=127.0.0.1 so the ids count as separate clients.
+"""
+import argparse
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from corpus import generate_document  # noqa: E402
+
+ENDPOINTS = ("summarize", "batch", "chat", "history")
+QUESTIONS = [
+    "What did the consortium conclude about the cohort?",
+    "Summarize the findings on the dataset.",
+    "Which method was recommended for review?",
+    "How many observed cases were reported?",
+]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def start_stub(args) -> None:
+    """Run the stub LLM server in a daemon thread and point the providers at it."""
+    import uvicorn
+    import stub_llm
+
+    stub_llm.config.latency_ms = args.stub_latency_ms
+    stub_llm.config.jitter_ms = args.stub_jitter_ms
+    stub_llm.config.tokens = args.stub_tokens
+    server = uvicorn.Server(uvicorn.Config(stub_llm.app, host="127.0.0.1", port=args.stub_port, log_level="warning"))
+    threading.Thread(target=server.run, name="stub-llm", daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{args.stub_port}"
+    for key in ("OPENAI_API_KEY", "HUGGINGFACE_API_TOKEN", "HF_API_TOKEN"):
+        os.environ.pop(key, None)
+    if args.provider == "openai":
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = base + "/v1"
+    elif args.provider == "huggingface":
+        os.environ["HUGGINGFACE_API_TOKEN"] = "stub"
+        os.environ["HUGGINGFACE_API_URL"] = base + "/models"
+
+
+def load_app(name: str, admission: bool = False):
+    if name == "backend":
+        import admission as admission_control
+        import main
+
+        main.admission.enabled = admission
+        # The virtual users' X-User-Id headers count only from a trusted proxy; in-process that is httpx's 127.0.0.1.
+        admission_control.ADMISSION_TRUSTED_PROXIES.add("127.0.0.1")
+        return main.app
+    path = os.path.join(REPO_DIR, "api", "chat.py")
+    spec = importlib.util.spec_from_file_location("sumrify_chat_api", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+class Workload:
+    """Builds requests for each endpoint from deterministic synthetic documents."""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.docs = [generate_document(args.doc_bytes, seed=i) for i in range(8)]
+        self.mix = args.mix
+        self.names = list(self.mix)
+        self.weights = [self.mix[n] for n in self.names]
+
+    def pick(self) -> str:
+        return self.rng.choices(self.names, weights=self.weights)[0]
+
+    async def send(self, client: httpx.AsyncClient, endpoint: str, user: int = 0) -> httpx.Response:
+        doc = self.rng.choice(self.docs)
+        # One admission-control client per virtual user (admission.py).
+        headers = {"X-User-Id": f"vu-{user}"}
+        if endpoint == "summarize":
+            mode = self.rng.choice(["fast", "balanced", "thorough"])
+            return await client.post("/api/summarize", json={"text": doc, "settings": {"speedMode": mode}}, headers=headers)
+        if endpoint == "batch":
+            files = [
+                ("files", (f"doc{i}.txt", io.BytesIO(self.rng.choice(self.docs).encode("utf-8")), "text/plain"))
+                for i in range(3)
+            ]
+            return await client.post("/api/summarize/batch", files=files, data={"settings": json.dumps({"speedMode": "fast"})}, headers=headers)
+        if endpoint == "chat":
+            history = [{"role": "user", "content": q} for q in self.rng.sample(QUESTIONS, 2)]
+            payload = {"message": self.rng.choice(QUESTIONS), "documentText": doc, "conversationHistory": history}
+            return await client.post("/api/chat", json=payload, headers=headers)
+        if self.rng.random() < 0.5:
+            return await client.get("/api/history")
+        item = {
+            "id": str(self.rng.randint(0, 10**9)),
+            "fileName": "load.txt",
+            "timestamp": "2024-01-01T00:00:00",
+            "summary": doc[:400],
+            "compressionRatio": 60,
+            "settings": {},
+        }
+        return await client.post("/api/history", json=item)
+
+
+async def run_step(client: httpx.AsyncClient, workload: Workload, concurrency: int, duration: float, timeout: float):
+    samples: List[Tuple[str, float, bool]] = []
+    limited: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def user(index: int):
+        while time.perf_counter() < deadline:
+            endpoint = workload.pick()
+            started = time.perf_counter()
+            ok = False
+            try:
+                r = await asyncio.wait_for(workload.send(client, endpoint, index), timeout)
+                ok = r.status_code < 400
+                if r.status_code == 429:
+                    limited[endpoint] = limited.get(endpoint, 0) + 1
+            except Exception:
+                ok = False
+            samples.append((endpoint, (time.perf_counter() - started) * 1000, ok))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    per_endpoint: Dict[str, Any] = {}
+    for name in sorted({s[0] for s in samples}):
+        lat = [s[1] for s in samples if s[0] == name]
+        errors = sum(1 for s in samples if s[0] == name and not s[2])
+        per_endpoint[name] = {
+            "requests": len(lat),
+            "rps": round(len(lat) / elapsed, 2),
+            "p50": round(percentile(lat, 50), 1),
+            "p95": round(percentile(lat, 95), 1),
+            "p99": round(percentile(lat, 99), 1),
+            "errorRate": round(errors / len(lat), 4) if lat else 0.0,
+            "rateLimited": limited.get(name, 0),
+        }
+    all_lat = [s[1] for s in samples]
+    errors = sum(1 for s in samples if not s[2])
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50": round(percentile(all_lat, 50), 1),
+        "p95": round(percentile(all_lat, 95), 1),
+        "p99": round(percentile(all_lat, 99), 1),
+        "errorRate": round(errors / len(samples), 4) if samples else 0.0,
+        "endpoints": per_endpoint,
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        app = load_app(args.app, args.admission)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=args.timeout)
+    workload = Workload(args)
+    steps = []
+    async with client:
+        for concurrency in args.concurrency:
+            step = await run_step(client, workload, concurrency, args.duration, args.timeout)
+            steps.append(step)
+            print(
+                f"c={concurrency:<4} rps={step['rps']:<8} p50={step['p50']:<8} p95={step['p95']:<8} "
+                f"p99={step['p99']:<8} errors={step['errorRate']:.2%}"
+            )
+            for name, ep in step["endpoints"].items():
+                print(
+                    f"    {name:<10} n={ep['requests']:<6} rps={ep['rps']:<8} p50={ep['p50']:<8} "
+                    f"p95={ep['p95']:<8} p99={ep['p99']:<8} errors={ep['errorRate']:.2%} 429s={ep['rateLimited']}"
+                )
+    sustainable = [s for s in steps if s["p99"] <= args.slo_ms and s["errorRate"] <= args.max_error_rate]
+    best: Optional[Dict[str, Any]] = max(sustainable, key=lambda s: s["rps"]) if sustainable else None
+    return {
+        "target": args.url or f"in-process:{args.app}",
+        "provider": args.provider,
+        "mix": args.mix,
+        "sloMs": args.slo_ms,
+        "steps": steps,
+        "maxSustainableRps": best["rps"] if best else 0.0,
+        "maxSustainableConcurrency": best["concurrency"] if best else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=["backend", "chat"], default="backend", help="In-process target")
+    parser.add_argument("--url", help="Drive a running server over HTTP instead")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("summarize=4,batch=1,chat=4,history=1"))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per concurrency step")
+    parser.add_argument("--doc-bytes", type=int, default=20_000)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--slo-ms", type=float, default=5000.0, help="p99 latency a step must meet")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--provider", choices=["openai", "huggingface", "local"], default="openai")
+    parser.add_argument("--no-stub", action="store_true", help="Don't start the stub LLM (use real providers)")
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--stub-tokens", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--admission", action="store_true", help="Keep per-client admission control on in-process")
+    parser.add_argument("--report", help="Write the JSON report here")
+    args = parser.parse_args()
+    if args.app == "chat":
+        args.mix = {k: v for k, v in args.mix.items() if k == "chat"} or {"chat": 1.0}
+
+    if not args.no_stub and args.provider != "local":
+        start_stub(args)
+    report = asyncio.run(run(args))
+    print(f"max sustainable: {report['maxSustainableRps']} rps at concurrency {report['maxSustainableConcurrency']}"
+          f" (p99 <= {args.slo_ms:.0f} ms, errors <= {args.max_error_rate:.0%})")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
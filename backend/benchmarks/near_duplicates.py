@@ -0,0 +1,112 @@
+"""Near-duplicate collapsing (dedup.py) on a boilerplate-heavy corpus.
+
+Builds documents in which every page repeats a running head with its page
+number, a license sentence and a numbered figure caption inline. These are
+the repeats that survive `clean_extracted_text` when an extractor joins a page
+into one line. For each speed mode, the script summarizes each document with
+grouping off (NEAR_DUPLICATE_THRESHOLD=0) and on. It reports sentences,
+groups, the grouping time, sentences actually encoded and MMR candidates.
+It also reports the near-duplicate repeats in each summary, and the share of
+the original summary's distinct sentences (ignoring punctuation and page numbers)
+that the deduplicated summary keeps.
+
+    cd backend
+    python benchmarks/near_duplicates.py                 # offline: counts and summaries on the fallback path
+    python benchmarks/near_duplicates.py --advanced      # with the installed embedding model
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import dedup  # noqa: E402
+import profiling  # noqa: E402
+import summarizer  # noqa: E402
+from corpus import SIZES, generate_document  # noqa: E402
+from shared_cache import shared_cache  # noqa: E402
+
+BOILERPLATE = [
+    "Journal of Applied Computational Studies, Volume 12, Issue 4, page {page} of {pages}, published online by the Example Press.",
+    "This article is licensed under a Creative Commons Attribution 4.0 International License, which permits use and sharing in any medium.",
+    "Figure {figure} shows the distribution of the measured values across all participating sites in the cohort.",
+]
+
+
+def boilerplate_document(size: int, seed: int = 0) -> str:
+    """About `size` bytes of paragraphs, each page carrying the BOILERPLATE sentences inline."""
+    rng = random.Random(f"dedup:{seed}:{size}")
+    paragraphs = [p for p in generate_document(size, seed=seed, noisy=False).split("\n\n") if p.strip()]
+    pages = max(1, len(paragraphs) // 2)
+    out = []
+    for i, paragraph in enumerate(paragraphs):
+        page = i // 2 + 1
+        sentences = [paragraph]
+        if i % 2 == 0:
+            sentences += [b.format(page=page, pages=pages, figure=rng.randint(1, 9)) for b in BOILERPLATE]
+        out.append(" ".join(sentences))
+    return "\n\n".join(out)
+
+
+def run(text: str, speed_mode: str, threshold: float) -> Dict[str, Any]:
+    dedup.NEAR_DUPLICATE_THRESHOLD = threshold
+    with profiling.profile_request({"stages"}, "bench") as prof:
+        started = time.perf_counter()
+        result = summarizer.summarize_document(text, speed_mode=speed_mode, domain="academic")
+        total_ms = (time.perf_counter() - started) * 1000
+    encoded = sum(call["sentences"] for call in prof.counters.get("encodeCalls", []))
+    return {
+        "totalMs": total_ms,
+        "encoded": encoded if summarizer.ADVANCED_MODE else None,
+        "mmrCandidates": prof.counters.get("mmrCandidates"),
+        "sentences": summarizer.split_sentences(result["summary"]),
+    }
+
+
+def repeats(sentences: List[str], threshold: float) -> int:
+    return len(sentences) - len(dedup.representatives(dedup.near_duplicate_groups(sentences, threshold)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["100k", "1m"], choices=list(SIZES))
+    parser.add_argument("--modes", nargs="+", default=["fast", "balanced", "thorough"])
+    parser.add_argument("--threshold", type=float, default=dedup.NEAR_DUPLICATE_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--advanced", action="store_true", help="Use installed models instead of the fallback paths")
+    args = parser.parse_args()
+
+    if not args.advanced:
+        summarizer.ADVANCED_MODE = False
+    shared_cache.enabled = False
+
+    print(f"{'corpus':>7} {'mode':>9} {'sents':>7} {'groups':>7} {'group ms':>9} "
+          f"{'encoded':>15} {'mmr cands':>15} {'total ms':>17} {'repeats':>9} {'kept':>6}")
+    for name in args.sizes:
+        text = boilerplate_document(SIZES[name], seed=args.seed)
+        sentences = summarizer.analyze_document(text)["sentences"]
+        started = time.perf_counter()
+        groups = dedup.near_duplicate_groups(sentences, args.threshold)
+        group_ms = (time.perf_counter() - started) * 1000
+        for mode in args.modes:
+            off, on = run(text, mode, 0), run(text, mode, args.threshold)
+            off["repeats"], on["repeats"] = (
+                repeats(off["sentences"], args.threshold), repeats(on["sentences"], args.threshold)
+            )
+            # Sentences that differ only in digits or punctuation count as the same.
+            distinct = {frozenset(dedup.shingles(x)) for x in off["sentences"]}
+            kept = len(distinct & {frozenset(dedup.shingles(x)) for x in on["sentences"]}) / len(distinct) if distinct else 1.0
+            pair = lambda key, fmt="{}": f"{fmt.format(off[key]) if off[key] is not None else '-'}->{fmt.format(on[key]) if on[key] is not None else '-'}"
+            print(
+                f"{name:>7} {mode:>9} {len(sentences):>7} {len(dedup.representatives(groups)):>7} {group_ms:>9.1f} "
+                f"{pair('encoded'):>15} {pair('mmrCandidates'):>15} {pair('totalMs', '{:.0f}'):>17} "
+                f"{pair('repeats'):>9} {kept:>6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Response payload benchmark: JSON encoder and wire compression.
+
+Summarizes synthetic corpora (offline fallback paths), then for the full and
+the compact response of each document measures serialization time with the
+stdlib json module and with orjson, and the size and compress/decompress time
+of every codec the server can negotiate (gzip, br, zstd).
+
+    cd backend
+    python benchmarks/payload.py                       # 100k, 1m
+    python benchmarks/payload.py --sizes 1m 10m --repeat 3 --report payload.json
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import codec  # noqa: E402
+import summarizer  # noqa: E402
+from compact import compact_result  # noqa: E402
+from corpus import SIZES, generate_corpus  # noqa: E402
+from shared_cache import shared_cache  # noqa: E402
+
+
+def _best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return round(min(times), 2)
+
+
+def _decompressors() -> Dict[str, Callable[[bytes], bytes]]:
+    out: Dict[str, Callable[[bytes], bytes]] = {"gzip": gzip.decompress}
+    if codec.brotli is not None:
+        out["br"] = codec.brotli.decompress
+    if codec.zstandard is not None:
+        out["zstd"] = lambda data: codec.zstandard.ZstdDecompressor().decompress(data)
+    return out
+
+
+def measure(payload: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    stdlib = lambda: json.dumps(payload).encode("utf-8")  # noqa: E731 - what fastapi's JSONResponse does
+    raw = codec.dumps(payload)
+    row: Dict[str, Any] = {
+        "bytes": len(raw),
+        "encodeMs": {"json": _best_ms(stdlib, repeat)},
+        "codecs": {},
+    }
+    if codec.orjson is not None:
+        row["encodeMs"]["orjson"] = _best_ms(lambda: codec.dumps(payload), repeat)
+    decompressors = _decompressors()
+    for name, compress in codec.COMPRESSORS.items():
+        data = compress(raw)
+        row["codecs"][name] = {
+            "bytes": len(data),
+            "ratio": round(len(raw) / max(1, len(data)), 2),
+            "compressMs": _best_ms(lambda: compress(raw), repeat),
+            "decompressMs": _best_ms(lambda: decompressors[name](data), repeat),
+        }
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["100k", "1m"], choices=list(SIZES))
+    parser.add_argument("--mode", default="balanced", choices=["fast", "balanced", "thorough"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--report", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    summarizer.ADVANCED_MODE = False
+    shared_cache.enabled = False
+    print(f"orjson={'yes' if codec.orjson else 'no'} codecs={','.join(codec.COMPRESSORS)}")
+
+    report: Dict[str, Any] = {"results": []}
+    for name, text in generate_corpus(args.sizes).items():
+        result = summarizer.summarize_document(text, speed_mode=args.mode)
+        variants = {
+            "full": result,
+            "compact": compact_result(result, "bench", include_text=True),
+            "compact-notext": compact_result(result, "bench", include_text=False),
+        }
+        for variant, payload in variants.items():
+            row = {"size": name, "format": variant, **measure(payload, args.repeat)}
+            report["results"].append(row)
+            encode = " ".join(f"{k}={v}ms" for k, v in row["encodeMs"].items())
+            wire = " ".join(
+                f"{k}={c['bytes'] / 1e6:.2f}MB/{c['compressMs']}ms" for k, c in row["codecs"].items()
+            )
+            print(f"{name:<5} {variant:<15} raw={row['bytes'] / 1e6:.2f}MB {encode}  {wire}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Summarization pipeline benchmark with regression gates.
+
+Runs `summarize_document` over deterministic synthetic corpora (see corpus.py)
+for every speed mode, on the offline fallback paths (no model downloads), and
+records per-stage wall time, peak traced memory and ROUGE overlap with stored
+reference summaries. Compared against a saved baseline it exits non-zero when
+time, memory or quality regress beyond the configured thresholds.
+
+    cd backend
+    python benchmarks/pipeline.py                                  # 1k, 10k, 100k
+    python benchmarks/pipeline.py --sizes 1k 10k 100k 1m 10m 50m --repeat 1
+    python benchmarks/pipeline.py --save bench.json                # new baseline
+    python benchmarks/pipeline.py --baseline bench.json --max-time-regression 0.2
+    python benchmarks/pipeline.py --update-references              # after intended output changes
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import profiling  # noqa: E402
+import summarizer  # noqa: E402
+from corpus import SIZES, generate_corpus  # noqa: E402
+from shared_cache import shared_cache  # noqa: E402
+
+REFERENCES_PATH = os.path.join(BENCH_DIR, "references", "pipeline.json")
+SPEED_MODES = ["fast", "balanced", "thorough"]
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _ngrams(tokens: List[str], n: int) -> Dict[tuple, int]:
+    counts: Dict[tuple, int] = {}
+    for i in range(len(tokens) - n + 1):
+        key = tuple(tokens[i:i + n])
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def _f1(overlap: int, candidate: int, reference: int) -> float:
+    if not overlap or not candidate or not reference:
+        return 0.0
+    p, r = overlap / candidate, overlap / reference
+    return 2 * p * r / (p + r)
+
+
+def _lcs(a: List[str], b: List[str]) -> int:
+    prev = [0] * (len(b) + 1)
+    for x in a:
+        cur = [0]
+        for j, y in enumerate(b):
+            cur.append(prev[j] + 1 if x == y else max(prev[j + 1], cur[j]))
+        prev = cur
+    return prev[-1]
+
+
+def rouge(candidate: str, reference: str) -> Dict[str, float]:
+    """ROUGE-1/2/L F1 without external dependencies (deterministic, offline)."""
+    c, r = _tokens(candidate), _tokens(reference)
+    out = {}
+    for n in (1, 2):
+        cn, rn = _ngrams(c, n), _ngrams(r, n)
+        overlap = sum(min(v, rn.get(k, 0)) for k, v in cn.items())
+        out[f"rouge{n}"] = round(_f1(overlap, sum(cn.values()), sum(rn.values())), 4)
+    # LCS is quadratic; cap the inputs so huge summaries stay cheap to score.
+    out["rougeL"] = round(_f1(_lcs(c[:3000], r[:3000]), min(len(c), 3000), min(len(r), 3000)), 4)
+    return out
+
+
+def run_once(text: str, speed_mode: str, options) -> Dict[str, Any]:
+    with profiling.profile_request(options, "bench") as prof:
+        started = time.perf_counter()
+        result = summarizer.summarize_document(text, speed_mode=speed_mode, domain="academic")
+        total_ms = (time.perf_counter() - started) * 1000
+    stages: Dict[str, float] = {}
+    peaks: Dict[str, float] = {}
+    for entry in prof.stages:
+        stages[entry["stage"]] = stages.get(entry["stage"], 0.0) + entry["ms"]
+        if "peakKb" in entry:
+            peaks[entry["stage"]] = max(peaks.get(entry["stage"], 0.0), entry["peakKb"])
+    return {
+        "totalMs": total_ms,
+        "stages": stages,
+        "stagePeakKb": peaks,
+        "peakKb": prof.peak_bytes / 1024,
+        "result": result,
+    }
+
+
+def benchmark(name: str, text: str, speed_mode: str, repeat: int) -> Dict[str, Any]:
+    runs = [run_once(text, speed_mode, {"stages"}) for _ in range(repeat)]
+    stage_names = sorted({s for r in runs for s in r["stages"]})
+
+    # Separate pass for memory: tracemalloc distorts timings, so never mix the two.
+    mem_run = run_once(text, speed_mode, {"stages", "alloc"})
+
+    return {
+        "corpus": name,
+        "bytes": len(text),
+        "speedMode": speed_mode,
+        "sentences": runs[0]["result"]["metrics"]["originalSentences"],
+        "totalMs": round(statistics.median(r["totalMs"] for r in runs), 3),
+        "stages": {s: round(statistics.median(r["stages"].get(s, 0.0) for r in runs), 3) for s in stage_names},
+        "peakKb": round(mem_run["peakKb"], 1),
+        "stagePeakKb": mem_run["stagePeakKb"],
+        "summary": runs[0]["result"]["summary"],
+    }
+
+
+def _ratio(new: float, old: float) -> float:
+    return (new - old) / old if old > 0 else 0.0
+
+
+def check_regressions(results: List[Dict[str, Any]], baseline: Dict[str, Any], args) -> List[str]:
+    failures = []
+    base = {(r["corpus"], r["speedMode"]): r for r in baseline.get("results", [])}
+    for r in results:
+        old = base.get((r["corpus"], r["speedMode"]))
+        if not old:
+            continue
+        label = f"{r['corpus']}/{r['speedMode']}"
+        if old["totalMs"] >= args.min_stage_ms and _ratio(r["totalMs"], old["totalMs"]) > args.max_time_regression:
+            failures.append(f"{label}: total {old['totalMs']:.1f} -> {r['totalMs']:.1f} ms")
+        for stage, ms in r["stages"].items():
+            old_ms = old.get("stages", {}).get(stage)
+            if old_ms and old_ms >= args.min_stage_ms and _ratio(ms, old_ms) > args.max_time_regression:
+                failures.append(f"{label}: {stage} {old_ms:.1f} -> {ms:.1f} ms")
+        if _ratio(r["peakKb"], old.get("peakKb", 0)) > args.max_memory_regression:
+            failures.append(f"{label}: peak memory {old['peakKb']:.0f} -> {r['peakKb']:.0f} KB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1k", "10k", "100k"], choices=list(SIZES))
+    parser.add_argument("--modes", nargs="+", default=SPEED_MODES, choices=SPEED_MODES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write results JSON (use as a future --baseline)")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--max-time-regression", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--max-memory-regression", type=float, default=0.25)
+    parser.add_argument("--min-stage-ms", type=float, default=5.0, help="Ignore stages faster than this (noise)")
+    parser.add_argument("--min-rouge", type=float, default=0.9, help="Minimum ROUGE-L F1 against references")
+    parser.add_argument("--update-references", action="store_true")
+    parser.add_argument("--advanced", action="store_true", help="Use installed models instead of the fallback paths")
+    args = parser.parse_args()
+
+    if not args.advanced:
+        summarizer.ADVANCED_MODE = False
+    shared_cache.enabled = False
+
+    references: Dict[str, str] = {}
+    if os.path.exists(REFERENCES_PATH):
+        with open(REFERENCES_PATH, "r", encoding="utf-8") as f:
+            references = json.load(f)
+
+    corpus = generate_corpus(args.sizes, seed=args.seed)
+    results = []
+    failures: List[str] = []
+    print(f"{'corpus':>7} {'mode':>9} {'sents':>7} {'total ms':>10} {'peak MB':>8} {'rougeL':>7}  slowest stages")
+    for name in args.sizes:
+        for mode in args.modes:
+            r = benchmark(name, corpus[name], mode, args.repeat)
+            ref_key = f"{name}/{mode}/seed{args.seed}"
+            if args.update_references:
+                references[ref_key] = r["summary"]
+            if ref_key in references:
+                r["rouge"] = rouge(r["summary"], references[ref_key])
+                if r["rouge"]["rougeL"] < args.min_rouge:
+                    failures.append(f"{name}/{mode}: ROUGE-L {r['rouge']['rougeL']:.3f} < {args.min_rouge}")
+            slowest = sorted(r["stages"].items(), key=lambda kv: kv[1], reverse=True)[:3]
+            print(
+                f"{name:>7} {mode:>9} {r['sentences']:>7} {r['totalMs']:>10.1f} {r['peakKb'] / 1024:>8.1f} "
+                f"{r.get('rouge', {}).get('rougeL', float('nan')):>7.3f}  "
+                + ", ".join(f"{s.split('.', 1)[-1]}={ms:.1f}" for s, ms in slowest)
+            )
+            del r["summary"]
+            results.append(r)
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "advanced": args.advanced},
+        "results": results,
+    }
+    if args.update_references:
+        os.makedirs(os.path.dirname(REFERENCES_PATH), exist_ok=True)
+        with open(REFERENCES_PATH, "w", encoding="utf-8") as f:
+            json.dump(references, f, indent=2, sort_keys=True)
+        print(f"Updated {len(references)} reference summaries in {REFERENCES_PATH}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures.extend(check_regressions(results, json.load(f), args))
+
+    if failures:
+        print("\nREGRESSIONS:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
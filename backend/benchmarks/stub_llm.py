@@ -0,0 +1,125 @@
+"""Local stub of the OpenAI and Hugging Face inference APIs for load tests.
+
+Answers ``POST /v1/chat/completions`` (OpenAI, optionally streamed as SSE) and
+``POST /models/{model}`` (Hugging Face text generation, optionally streamed)
+after a configurable delay, so chat latency can be measured without a network
+or an API bill. Point the apps at it with:
+
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+    HUGGINGFACE_API_TOKEN=stub HUGGINGFACE_API_URL=http://127.0.0.1:8900/models
+
+    python benchmarks/stub_llm.py --port 8900 --latency-ms 400 --jitter-ms 150
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = float(os.getenv("STUB_LLM_LATENCY_MS", "300"))
+    jitter_ms: float = float(os.getenv("STUB_LLM_JITTER_MS", "100"))
+    tokens: int = int(os.getenv("STUB_LLM_TOKENS", "60"))
+    token_interval_ms: float = float(os.getenv("STUB_LLM_TOKEN_INTERVAL_MS", "15"))
+    error_rate: float = float(os.getenv("STUB_LLM_ERROR_RATE", "0"))
+
+
+config = StubConfig()
+app = FastAPI(title="Stub LLM")
+WORDS = "the document states that the reported figures were reviewed and confirmed by the team".split()
+
+
+def _answer(n: int) -> str:
+    return " ".join(WORDS[i % len(WORDS)] for i in range(n)).capitalize() + "."
+
+
+async def _delay():
+    jitter = random.uniform(-config.jitter_ms, config.jitter_ms)
+    await asyncio.sleep(max(0.0, config.latency_ms + jitter) / 1000)
+    if config.error_rate and random.random() < config.error_rate:
+        raise HTTPException(status_code=503, detail="stub overloaded")
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    await _delay()
+    created = int(time.time())
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+
+    if body.get("stream"):
+        async def events():
+            for i in range(config.tokens):
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": WORDS[i % len(WORDS)] + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(config.token_interval_ms / 1000)
+            done = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # Non-streamed responses still pay the generation time of every token.
+    await asyncio.sleep(config.tokens * config.token_interval_ms / 1000)
+    return JSONResponse({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": _answer(config.tokens)}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": config.tokens, "total_tokens": prompt_tokens + config.tokens},
+    })
+
+
+@app.post("/models/{model:path}")
+async def huggingface_generate(model: str, request: Request):
+    body = await request.json()
+    await _delay()
+    if body.get("stream"):
+        async def events():
+            for i in range(config.tokens):
+                yield f"data: {json.dumps({'token': {'id': i, 'text': WORDS[i % len(WORDS)] + ' '}})}\n\n"
+                await asyncio.sleep(config.token_interval_ms / 1000)
+            yield f"data: {json.dumps({'generated_text': _answer(config.tokens)})}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+    await asyncio.sleep(config.tokens * config.token_interval_ms / 1000)
+    return JSONResponse([{"generated_text": _answer(config.tokens)}])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms, help="Time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=config.jitter_ms)
+    parser.add_argument("--tokens", type=int, default=config.tokens)
+    parser.add_argument("--token-interval-ms", type=float, default=config.token_interval_ms)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    args = parser.parse_args()
+    config.latency_ms = args.latency_ms
+    config.jitter_ms = args.jitter_ms
+    config.tokens = args.tokens
+    config.token_interval_ms = args.token_interval_ms
+    config.error_rate = args.error_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
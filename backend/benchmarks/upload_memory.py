@@ -0,0 +1,117 @@
+"""Peak memory of receiving a multipart batch: streaming uploads vs read-into-memory.
+
+Streams a 20-file multipart body through an ASGI app without ever building the
+whole body, once with `uploads.receive_uploads` (spooled, limits enforced) and
+once the old way (`request.form()` then `await file.read()` per file). It
+reports peak traced Python memory for each, per file size. The streaming path
+should stay flat as files grow.
+
+    cd backend
+    python benchmarks/upload_memory.py --files 20 --sizes-mb 1 8 32
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fastapi import FastAPI, Request  # noqa: E402
+
+import uploads  # noqa: E402
+
+BOUNDARY = b"sumrifybenchboundary"
+CHUNK = 64 * 1024
+
+
+def body_chunks(n_files: int, size: int):
+    """Yield a multipart body in 64 KB pieces; file contents are generated on the fly."""
+    yield b"--" + BOUNDARY + b'\r\nContent-Disposition: form-data; name="settings"\r\n\r\n{}\r\n'
+    block = (b"lorem ipsum dolor sit amet " * (CHUNK // 27 + 1))[:CHUNK]
+    for i in range(n_files):
+        yield (b"--" + BOUNDARY + b'\r\nContent-Disposition: form-data; name="files"; filename="doc%d.txt"\r\n'
+               b"Content-Type: text/plain\r\n\r\n" % i)
+        for start in range(0, size, CHUNK):
+            yield block[:min(CHUNK, size - start)]
+        yield b"\r\n"
+    yield b"--" + BOUNDARY + b"--\r\n"
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/streaming")
+    async def streaming(request: Request):
+        with await uploads.receive_uploads(request) as received:
+            for upload in received.files:
+                digest = hashlib.sha256()
+                for piece in iter(lambda: upload.file.read(CHUNK), b""):
+                    digest.update(piece)
+        return {"files": len(received.files)}
+
+    @app.post("/buffered")
+    async def buffered(request: Request):
+        form = await request.form(max_files=10_000)
+        files = form.getlist("files")
+        for file in files:
+            data = await file.read()
+            hashlib.sha256(data).hexdigest()
+        await form.close()
+        return {"files": len(files)}
+
+    return app
+
+
+async def measure(app, path: str, n_files: int, size: int) -> float:
+    chunks = body_chunks(n_files, size)
+    scope = {
+        "type": "http", "method": "POST", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "scheme": "http", "server": ("bench", 80), "client": ("bench", 1),
+        "http_version": "1.1", "asgi": {"version": "3.0"},
+        "headers": [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)],
+    }
+    status = {}
+
+    async def receive():
+        piece = next(chunks, None)
+        return {"type": "http.request", "body": piece or b"", "more_body": piece is not None}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await app(scope, receive, send)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if status.get("code") != 200:
+        raise RuntimeError(f"{path} returned {status.get('code')}")
+    return peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    uploads.UPLOAD_MAX_FILES = args.files
+    uploads.UPLOAD_MAX_FILE_BYTES = uploads.UPLOAD_MAX_REQUEST_BYTES = 1 << 40
+    app = make_app()
+    # Warm up so first-call imports and caches aren't counted.
+    asyncio.run(measure(app, "/streaming", 1, 1024))
+    asyncio.run(measure(app, "/buffered", 1, 1024))
+    print(f"{'file MB':>8} {'streaming peak MB':>18} {'buffered peak MB':>17}")
+    for size_mb in args.sizes_mb:
+        size = int(size_mb * uploads.MB)
+        streaming = asyncio.run(measure(app, "/streaming", args.files, size))
+        buffered = asyncio.run(measure(app, "/buffered", args.files, size))
+        print(f"{size_mb:>8g} {streaming:>18.1f} {buffered:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
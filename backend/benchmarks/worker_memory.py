@@ -0,0 +1,108 @@
+"""Per-worker memory and cache hit rate with 1, 4 and 8 pre-forked workers.
+
+Starts ``serve.py`` for each worker count, replays the same summarize workload
+(a small set of documents requested repeatedly, as in production), then reads
+``/api/workers`` and prints RSS, PSS and summary/embedding hit rate per worker.
+
+    cd backend
+    python benchmarks/worker_memory.py --workers 1 4 8 --requests 200
+    python benchmarks/worker_memory.py --no-preload     # per-worker model copies
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOPICS = ["revenue", "latency", "contract", "patient", "sensor", "climate", "network", "policy"]
+
+
+def make_document(seed: int, sentences: int = 60) -> str:
+    rng = random.Random(seed)
+    out = []
+    for i in range(sentences):
+        a, b = rng.sample(TOPICS, 2)
+        out.append(
+            f"Section {i} reports that the {a} analysis changed by {rng.randint(1, 99)} percent "
+            f"when the {b} data was reviewed over {rng.randint(2, 12)} months."
+        )
+    return " ".join(out)
+
+
+def wait_healthy(url: str, timeout: float = 600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url + "/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not become healthy")
+
+
+def run(workers: int, args) -> list:
+    port = args.port
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env["SHARED_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="sumrify-cache-"), "cache.sqlite3")
+    cmd = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"]
+    if args.no_preload:
+        cmd.append("--no-preload")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    try:
+        wait_healthy(url)
+        docs = [make_document(i) for i in range(args.documents)]
+        rng = random.Random(0)
+        workload = [rng.choice(docs) for _ in range(args.requests)]
+
+        def call(text: str):
+            r = httpx.post(
+                url + "/api/summarize",
+                json={"text": text, "settings": {"speedMode": "balanced", "domain": "general"}},
+                timeout=600,
+            )
+            r.raise_for_status()
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(call, workload))
+        return httpx.get(url + "/api/workers", timeout=30).json()["workers"]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-preload", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'pid':>7} {'rss MB':>8} {'pss MB':>8} {'summary hit':>12} {'embed hit':>10}")
+    for n in args.workers:
+        stats = run(n, args)
+        total_pss = 0
+        for w in stats:
+            mem = w.get("memory", {})
+            cache = w.get("cache", {})
+            total_pss += mem.get("pss", 0)
+            print(
+                f"{n:>7} {w['pid']:>7} {mem.get('rss', 0) / 2**20:>8.1f} {mem.get('pss', 0) / 2**20:>8.1f} "
+                f"{cache.get('summary', {}).get('hitRate', 0):>12.2%} {cache.get('embedding', {}).get('hitRate', 0):>10.2%}"
+            )
+        print(f"{n:>7} {'total':>7} {'':>8} {total_pss / 2**20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Latency budgets for /api/summarize (``settings.deadlineMs``).
+
+With a deadline, the pipeline runs as an anytime algorithm. Once the document
+has been cleaned and split, the cost of each remaining stage is estimated from
+the document size, and stages are downgraded until the estimate fits the time
+that is left. The stages are, in the order they are given up:
+
+- abstractive: the abstractive (BART) pass is skipped
+- keywords: TF-IDF keywords instead of KeyBERT
+- selection: top sentences by score instead of embedding MMR
+- scoring: TF-IDF scores without sentence embeddings
+
+Just before each stage runs, the decision is made again with the time actually
+left, so an earlier overrun still degrades the later stages. Costs are kept
+per unit of work (sentences, characters, MMR comparisons, words). They start
+from the defaults below and follow the measured timings of this process
+(exponential moving average). Loading a model counts against the first
+request that needs it.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import profiling
+from metrics import timed
+
+# Fraction of the remaining time that planned stages may use; the rest is
+# headroom for response building and estimation error.
+DEADLINE_SAFETY = float(os.getenv("DEADLINE_SAFETY", "0.8"))
+COST_SMOOTHING = 0.2
+
+# component: (size unit, default ms per unit) -- CPU figures for MiniLM / BART-large
+_costs: Dict[str, Tuple[str, float]] = {
+    "tfidf": ("sentences", 0.05),
+    "encode": ("sentences", 1.5),
+    "mmr": ("mmrPairs", 0.03),
+    "scores": ("sentences", 0.01),
+    "keybert": ("chars", 0.004),
+    "keywords_tfidf": ("chars", 0.001),
+    "abstractive": ("summaryWords", 12.0),
+}
+# model: load time in ms until one has been measured
+_load_ms: Dict[str, float] = {"embedding": 4000.0, "keybert": 1000.0, "summarization": 20000.0}
+_lock = threading.Lock()
+
+# stage -> (mode, components, model to load); the first mode is the full one
+MODES: Dict[str, List[Tuple[str, Tuple[str, ...], Optional[str]]]] = {
+    "scoring": [("semantic", ("tfidf", "encode"), "embedding"), ("tfidf", ("tfidf",), None)],
+    "selection": [("mmr", ("mmr",), "embedding"), ("score", (), None)],
+    "abstractive": [("model", ("abstractive",), "summarization"), ("skipped", (), None)],
+    "keywords": [("keybert", ("keybert",), "keybert"), ("tfidf", ("keywords_tfidf",), None)],
+}
+PIPELINE_ORDER = ("scoring", "selection", "abstractive", "keywords")
+DEGRADE_ORDER = ("abstractive", "keywords", "selection", "scoring")
+
+
+def observe(component: str, units: float, seconds: float):
+    """Fold a measured duration into the per-unit cost of `component`."""
+    # Profiled requests run slower (allocation tracing) and would skew the estimates.
+    if units <= 0 or component not in _costs or profiling.current() is not None:
+        return
+    with _lock:
+        unit, per_unit = _costs[component]
+        measured = seconds * 1000 / units
+        _costs[component] = (unit, per_unit + COST_SMOOTHING * (measured - per_unit))
+
+
+def observe_load(model: str, seconds: float):
+    with _lock:
+        _load_ms[model] = seconds * 1000
+
+
+@contextmanager
+def measured(component: str, units: float, pipeline: str = "summarize"):
+    """`metrics.timed` that also updates the cost estimate of `component`."""
+    started = time.perf_counter()
+    with timed(pipeline, component):
+        yield
+    observe(component, units, time.perf_counter() - started)
+
+
+def stage_costs() -> Dict[str, Dict[str, float]]:
+    """Current per-unit cost estimates (for benchmarks and debugging)."""
+    with _lock:
+        costs = {c: {"unit": u, "msPerUnit": round(ms, 5)} for c, (u, ms) in _costs.items()}
+        costs.update({f"load:{m}": {"unit": "load", "msPerUnit": round(ms, 1)} for m, ms in _load_ms.items()})
+    return costs
+
+
+class LatencyBudget:
+    """Stage modes for one request. Without a deadline every stage runs in full."""
+
+    def __init__(self, deadline_ms: Optional[float] = None):
+        self.deadline_ms = float(deadline_ms) if deadline_ms else None
+        self.started = time.perf_counter()
+        self.modes = {stage: modes[0][0] for stage, modes in MODES.items()}
+        self.degraded: Dict[str, str] = {}
+        self.sizes: Dict[str, float] = {}
+        self.free: set = set()
+        self.loaded: set = set()
+        self.estimated_ms: Optional[float] = None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def remaining_ms(self) -> float:
+        return self.deadline_ms - self.elapsed_ms()
+
+    def _components(self, stage: str, mode: str, modes: Dict[str, str]) -> Tuple[set, Optional[str]]:
+        _, components, model = next(m for m in MODES[stage] if m[0] == mode)
+        components = set(components) - self.free
+        # MMR needs embeddings; they are only already computed with semantic scoring.
+        if stage == "selection" and mode == "mmr" and modes["scoring"] != "semantic":
+            components |= {"encode"} - self.free
+        return components, model
+
+    def _stage_cost(self, stage: str, mode: str, modes: Dict[str, str]) -> float:
+        components, model = self._components(stage, mode, modes)
+        # Models that this request will already have loaded by the time `stage` runs.
+        loaded = set(self.loaded)
+        for earlier in PIPELINE_ORDER[:PIPELINE_ORDER.index(stage)]:
+            earlier_components, earlier_model = self._components(earlier, modes[earlier], modes)
+            if earlier_components and earlier_model:
+                loaded.add(earlier_model)
+        with _lock:
+            ms = sum(self.sizes.get(_costs[c][0], 0) * _costs[c][1] for c in components)
+            if components and model:
+                # KeyBERT is built on the embedding model.
+                for needed in ((model, "embedding") if model == "keybert" else (model,)):
+                    if needed not in loaded:
+                        ms += _load_ms[needed]
+                        loaded.add(needed)
+        return ms
+
+    def _total(self, stages: Iterable[str], modes: Dict[str, str]) -> float:
+        with _lock:
+            fixed = self.sizes.get("sentences", 0) * _costs["scores"][1]
+        return fixed + sum(self._stage_cost(s, modes[s], modes) for s in stages)
+
+    def plan(
+        self,
+        sizes: Dict[str, float],
+        free: Iterable[str] = (),
+        loaded: Iterable[str] = (),
+        unavailable: Iterable[str] = (),
+    ):
+        """Pick stage modes up front, degrading in DEGRADE_ORDER until the estimate fits.
+
+        `sizes` holds the units costs are counted in; `free` lists components
+        whose result is already cached, `loaded` the models already in memory.
+        Stages in `unavailable` run in their cheap mode and are not reported.
+        """
+        self.sizes = dict(sizes)
+        self.free = set(free)
+        self.loaded = set(loaded)
+        for stage in unavailable:
+            self.modes[stage] = MODES[stage][-1][0]
+        if self.deadline_ms is not None:
+            for stage in DEGRADE_ORDER:
+                if self._total(PIPELINE_ORDER, self.modes) <= self.remaining_ms() * DEADLINE_SAFETY:
+                    break
+                self._degrade(stage)
+        self.estimated_ms = self.elapsed_ms() + self._total(PIPELINE_ORDER, self.modes)
+
+    def mode(self, stage: str) -> str:
+        """Mode to run `stage` in, re-checked against the time left right now."""
+        mode = self.modes[stage]
+        if self.deadline_ms is not None and mode == MODES[stage][0][0]:
+            later = PIPELINE_ORDER[PIPELINE_ORDER.index(stage) + 1:]
+            cheapest = {**self.modes, **{s: MODES[s][-1][0] for s in later}}
+            needed = self._stage_cost(stage, mode, self.modes) + self._total(later, cheapest)
+            if needed > self.remaining_ms() * DEADLINE_SAFETY:
+                self._degrade(stage)
+        return self.modes[stage]
+
+    def _degrade(self, stage: str):
+        full, cheap = MODES[stage][0][0], MODES[stage][-1][0]
+        if self.modes[stage] == full:
+            self.modes[stage] = cheap
+            self.degraded[stage] = cheap
+
+    def report(self) -> Optional[Dict[str, object]]:
+        """The `metrics.deadline` block of a response (None without a deadline)."""
+        if self.deadline_ms is None:
+            return None
+        elapsed = self.elapsed_ms()
+        return {
+            "deadlineMs": self.deadline_ms,
+            "estimatedMs": round(elapsed if self.estimated_ms is None else self.estimated_ms, 1),
+            "elapsedMs": round(elapsed, 1),
+            "met": elapsed <= self.deadline_ms,
+            "degraded": dict(self.degraded),
+        }
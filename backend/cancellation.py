@@ -0,0 +1,125 @@
+"""Cooperative cancellation of request work running in worker threads.
+
+A handler that runs the pipeline through ``run_in_threadpool`` cannot stop
+the thread when its client goes away. Instead the handler gives the work a
+``CancelToken``, and the pipeline calls ``checkpoint(stage)`` between stages,
+abstractive chunks, MMR iterations, hierarchical sections and before each
+queued model call. Once the token is cancelled, the next checkpoint raises
+``Cancelled``, so work stops within one stage instead of running to the end
+and being thrown away.
+
+Tokens are cancelled by:
+
+- ``cancel_on_disconnect(request)``: waits for the connection's next ASGI
+  message while the handler awaits the work. The body has been read by then,
+  so that message is ``http.disconnect``. (``Request.is_disconnected`` can't
+  be used: behind ``BaseHTTPMiddleware`` it never reports a disconnect.)
+- a deadline: ``REQUEST_TIMEOUT`` seconds after the token was created
+  (0 turns it off);
+- the job worker, when a running job is cancelled or taken over.
+
+``Cancelled`` derives from ``BaseException``, as ``asyncio.CancelledError``
+does, so the pipeline's ``except Exception`` fallbacks do not turn it into a
+degraded result. A checkpoint inside a bare ``except:`` may be swallowed, but
+the token stays cancelled and the next checkpoint raises again.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
+
+from metrics import CANCELLED_REQUESTS, CANCEL_STOP_SECONDS
+
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "0"))
+
+_current: ContextVar[Optional["CancelToken"]] = ContextVar("sumrify_cancel", default=None)
+
+
+class Cancelled(BaseException):
+    """Raised at a checkpoint once the work's token is cancelled."""
+
+    def __init__(self, reason: str, stage: str):
+        super().__init__(f"Cancelled ({reason}) before {stage}")
+        self.reason = reason
+        self.stage = stage
+
+    @property
+    def status_code(self) -> int:
+        # 499: client closed request (nginx); nobody reads it, but logs and metrics do.
+        return 504 if self.reason == "timeout" else 499
+
+
+class CancelToken:
+    """Cancellation state shared by a handler and the work it started."""
+
+    def __init__(self, timeout: Optional[float] = None):
+        timeout = REQUEST_TIMEOUT if timeout is None else timeout
+        self.deadline = time.perf_counter() + timeout if timeout > 0 else None
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+            self.cancelled_at = time.perf_counter()
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.reason = "timeout"
+            self.cancelled_at = self.deadline
+        return self.reason is not None
+
+    def check(self, stage: str):
+        if self.cancelled:
+            raise Cancelled(self.reason, stage)
+
+
+def current() -> Optional[CancelToken]:
+    return _current.get()
+
+
+def checkpoint(stage: str):
+    """Raise Cancelled if the current work's token is cancelled; a no-op outside `scope`."""
+    token = _current.get()
+    if token is not None:
+        token.check(stage)
+
+
+@contextmanager
+def scope(token: Optional[CancelToken], pipeline: str) -> Iterator[Optional[CancelToken]]:
+    """Make `token` current for this block (and threads it hands work to) and count a cancellation."""
+    if token is None:
+        yield None
+        return
+    reset = _current.set(token)
+    try:
+        yield token
+    except Cancelled as e:
+        CANCELLED_REQUESTS.inc(pipeline=pipeline, reason=e.reason, stage=e.stage)
+        if token.cancelled_at is not None:
+            CANCEL_STOP_SECONDS.observe(time.perf_counter() - token.cancelled_at, pipeline=pipeline)
+        raise
+    finally:
+        _current.reset(reset)
+
+
+async def _watch(request, token: CancelToken):
+    while not token.cancelled:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            token.cancel("disconnect")
+            return
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(request, timeout: Optional[float] = None) -> AsyncIterator[CancelToken]:
+    """A token that is cancelled when `request`'s client disconnects or `timeout` passes (read after the body)."""
+    token = CancelToken(timeout)
+    watcher = asyncio.create_task(_watch(request, token))
+    try:
+        yield token
+    finally:
+        watcher.cancel()
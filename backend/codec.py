@@ -0,0 +1,305 @@
+"""Fast JSON responses and HTTP body compression.
+
+- ``FastJSONResponse`` serializes with orjson when installed (several times
+  faster than stdlib json on large results, and handles numpy values), and
+  falls back to ``json`` otherwise.
+- ``CompressionMiddleware`` compresses buffered responses larger than
+  ``COMPRESSION_MIN_BYTES`` with the best encoding the client accepts among
+  zstd, br and gzip (zstd/br only when ``zstandard``/``brotli`` are installed).
+- ``RequestDecompressionMiddleware`` accepts ``Content-Encoding: gzip`` (and
+  deflate/br/zstd when available) request bodies on the configured paths,
+  decompressing incrementally and refusing anything that would expand past
+  ``MAX_DECOMPRESSED_REQUEST_MB``.
+"""
+import gzip
+import io
+import json
+import os
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "2048"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+MAX_COMPRESSED_REQUEST_BYTES = int(os.getenv("MAX_COMPRESSED_REQUEST_MB", "50")) * 1024 * 1024
+MAX_DECOMPRESSED_REQUEST_BYTES = int(os.getenv("MAX_DECOMPRESSED_REQUEST_MB", "200")) * 1024 * 1024
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    available: Dict[str, Callable[[bytes], bytes]] = {}
+    if zstandard is not None:
+        available["zstd"] = lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if brotli is not None:
+        available["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+    available["gzip"] = lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL)
+    return available
+
+
+COMPRESSORS = _compressors()
+# Server preference when the client weights encodings equally.
+PREFERENCE = ["zstd", "br", "gzip"]
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header (honours q-values)."""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best: Optional[Tuple[float, int, str]] = None
+    for rank, name in enumerate(PREFERENCE):
+        if name not in COMPRESSORS:
+            continue
+        q = weights.get(name, weights.get("*", 0.0))
+        if q <= 0:
+            continue
+        candidate = (q, -rank, name)
+        if best is None or candidate > best:
+            best = candidate
+    return best[2] if best else None
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing single-chunk responses above a size threshold.
+
+    Streaming responses (more than one body chunk) and responses that already
+    carry a Content-Encoding pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Dict[str, Any]] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = {k.lower() for k, _ in message.get("headers", [])}
+                passthrough = b"content-encoding" in headers
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            if passthrough or message.get("more_body", False):
+                # Streaming or pre-encoded: forward as-is.
+                if start_message is not None:
+                    await send(start_message)
+                    start_message = None
+                    passthrough = True
+                await send(message)
+                return
+            body = message.get("body", b"")
+            headers: List[Tuple[bytes, bytes]] = list(start_message.get("headers", []))
+            if len(body) >= self.minimum_size:
+                if len(body) > 1024 * 1024:
+                    body = await run_in_threadpool(COMPRESSORS[encoding], body)
+                else:
+                    body = COMPRESSORS[encoding](body)
+                headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode("ascii")))
+                headers.append((b"content-length", str(len(body)).encode("ascii")))
+            headers.append((b"vary", b"Accept-Encoding"))
+            await send({**start_message, "headers": headers})
+            start_message = None
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+SUPPORTED_REQUEST_ENCODINGS = {"gzip", "x-gzip", "deflate"}
+if brotli is not None:
+    SUPPORTED_REQUEST_ENCODINGS.add("br")
+if zstandard is not None:
+    SUPPORTED_REQUEST_ENCODINGS.add("zstd")
+
+_CHUNK = 64 * 1024
+
+
+def _inflate(body: bytes, wbits: int, limit: int) -> bytearray:
+    dec = zlib.decompressobj(wbits)
+    out = bytearray()
+    for i in range(0, len(body), _CHUNK):
+        data = body[i:i + _CHUNK]
+        while data:
+            # max_length bounds each step, so a zip bomb never materializes past the limit.
+            out += dec.decompress(data, limit + 1 - len(out))
+            if len(out) > limit:
+                raise OverflowError
+            data = dec.unconsumed_tail
+    out += dec.flush()
+    if not dec.eof:
+        raise ValueError("truncated stream")
+    return out
+
+
+def _unbrotli(body: bytes, limit: int) -> bytearray:
+    # output_buffer_limit needs brotli >= 1.1.
+    dec = brotli.Decompressor()
+    out = bytearray()
+    for i in range(0, len(body), _CHUNK):
+        out += dec.process(body[i:i + _CHUNK], output_buffer_limit=limit + 1 - len(out))
+        while len(out) <= limit and not dec.can_accept_more_data():
+            out += dec.process(b"", output_buffer_limit=limit + 1 - len(out))
+        if len(out) > limit:
+            raise OverflowError
+    if not dec.is_finished():
+        raise ValueError("truncated stream")
+    return out
+
+
+def _unzstd(body: bytes, limit: int) -> bytes:
+    # A truncated zstd frame yields a short read rather than an error; the JSON body then fails validation.
+    with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as reader:
+        out = reader.read(limit + 1)
+    if len(out) > limit:
+        raise OverflowError
+    return out
+
+
+def decompress_body(body: bytes, encoding: str, limit: Optional[int] = None) -> bytes:
+    """Decompress a request body, raising OverflowError past `limit` and ValueError if corrupt."""
+    if limit is None:
+        limit = MAX_DECOMPRESSED_REQUEST_BYTES
+    if encoding not in SUPPORTED_REQUEST_ENCODINGS:
+        raise LookupError(encoding)
+    try:
+        if encoding in {"gzip", "x-gzip"}:
+            return bytes(_inflate(body, 16 + zlib.MAX_WBITS, limit))
+        if encoding == "deflate":
+            return bytes(_inflate(body, zlib.MAX_WBITS, limit))
+        if encoding == "br":
+            return bytes(_unbrotli(body, limit))
+        return _unzstd(body, limit)
+    except OverflowError:
+        raise
+    except Exception as e:
+        # zlib.error, brotli.error and zstandard.ZstdError share no common base.
+        raise ValueError(str(e)) from e
+
+
+class RequestDecompressionMiddleware:
+    """Transparently decompress Content-Encoded request bodies on selected paths."""
+
+    def __init__(self, app, paths: Tuple[str, ...] = ("/api/summarize", "/api/chat")):
+        self.app = app
+        self.paths = paths
+
+    async def _reject(self, send, status: int, detail: str):
+        body = dumps({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        for key, value in scope.get("headers", []):
+            if key == b"content-encoding":
+                encoding = value.decode("latin-1").strip().lower()
+        if not encoding or encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+        if encoding not in SUPPORTED_REQUEST_ENCODINGS:
+            await self._reject(send, 415, f"Unsupported Content-Encoding: {encoding}")
+            return
+
+        chunks = []
+        size = 0
+        more = True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_COMPRESSED_REQUEST_BYTES:
+                await self._reject(send, 413, "Compressed request body too large.")
+                return
+            chunks.append(chunk)
+            more = message.get("more_body", False)
+        try:
+            # Off the event loop: inflating tens of MB takes long enough to stall other requests.
+            body = await run_in_threadpool(decompress_body, b"".join(chunks), encoding)
+        except OverflowError:
+            await self._reject(send, 413, "Decompressed request body exceeds the size limit.")
+            return
+        except ValueError:
+            await self._reject(send, 400, "Malformed compressed request body.")
+            return
+
+        headers = [
+            (k, v) for k, v in scope["headers"] if k not in {b"content-encoding", b"content-length"}
+        ] + [(b"content-length", str(len(body)).encode("ascii"))]
+        sent = False
+
+        async def receive_wrapper():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app({**scope, "headers": headers}, receive_wrapper, send)
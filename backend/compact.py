@@ -0,0 +1,96 @@
+"""Compact, offset-based summarize responses.
+
+The default response repeats the document three times: `originalText`, every
+sentence in `sentenceScores`, and the highlight sentences. With
+``settings.responseFormat = "compact"`` sentences are sent as character
+offsets into `originalText` instead, and scores as a bare number array. The
+full text and paginated sentence objects can be fetched later from
+``/api/documents/{documentId}/...``, which is backed by the shared cache tier.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared_cache import make_key, shared_cache
+from summarizer import summary_key
+
+DOCUMENT_NAMESPACE = "document"
+
+
+def sentence_offsets(text: str, sentences: List[str]) -> List[Tuple[int, int]]:
+    """Character spans of `sentences` in `text`, searched in order (linear time)."""
+    spans: List[Tuple[int, int]] = []
+    pos = 0
+    for sentence in sentences:
+        start = text.find(sentence, pos)
+        if start < 0:
+            # Shouldn't happen for split_sentences output; fall back to a global search.
+            start = text.find(sentence)
+        if start < 0:
+            spans.append((-1, -1))
+            continue
+        end = start + len(sentence)
+        spans.append((start, end))
+        pos = end
+    return spans
+
+
+def document_id(result: Dict[str, Any], settings: Dict[str, Any]) -> str:
+    """Id of a result: the summarize cache key of its text and settings, plus the deadline that degraded it."""
+    return make_key(
+        DOCUMENT_NAMESPACE,
+        summary_key(
+            result.get("originalText", ""),
+            settings.get("speedMode", "balanced"),
+            settings.get("domain", "general"),
+            settings.get("useAbstractive", False),
+            settings.get("hierarchical"),
+        ),
+        settings.get("deadlineMs"),
+    )
+
+
+def store_document(doc_id: str, result: Dict[str, Any]):
+    """Keep the text and full sentence scores so clients can fetch them on demand."""
+    shared_cache.set_json(DOCUMENT_NAMESPACE, doc_id, {
+        "originalText": result.get("originalText", ""),
+        "sentenceScores": result.get("sentenceScores", []),
+    })
+
+
+def load_document(doc_id: str) -> Optional[Dict[str, Any]]:
+    return shared_cache.get_json(DOCUMENT_NAMESPACE, doc_id)
+
+
+def compact_result(result: Dict[str, Any], doc_id: str, include_text: bool = True) -> Dict[str, Any]:
+    """Replace sentence copies in a summarize result with offsets into originalText."""
+    text = result.get("originalText", "")
+    scores = result.get("sentenceScores", [])
+    spans = sentence_offsets(text, [s["sentence"] for s in scores])
+    flat: List[int] = []
+    for start, end in spans:
+        flat.append(start)
+        flat.append(end)
+
+    compact = {k: v for k, v in result.items() if k not in {"sentenceScores", "highlights", "originalText"}}
+    compact["responseFormat"] = "compact"
+    compact["documentId"] = doc_id
+    compact["sentences"] = {
+        # [start0, end0, start1, end1, ...] indexed like the sentence index.
+        "offsets": flat,
+        "scores": [round(s["score"], 6) for s in scores],
+    }
+    compact["highlights"] = [{"index": h["index"], "score": round(h["score"], 6)} for h in result.get("highlights", [])]
+    if include_text:
+        compact["originalText"] = text
+    return compact
+
+
+def sentence_page(doc: Dict[str, Any], offset: int, limit: int) -> Dict[str, Any]:
+    scores = doc.get("sentenceScores", [])
+    offset = max(0, offset)
+    limit = max(1, min(limit, 5000))
+    return {
+        "total": len(scores),
+        "offset": offset,
+        "limit": limit,
+        "items": scores[offset:offset + limit],
+    }
@@ -0,0 +1,208 @@
+"""Near-duplicate sentence groups (MinHash + LSH).
+
+PDF extractions repeat captions, legal boilerplate and running heads with a
+different page number on every page. ``clean_extracted_text`` only drops
+exact repeats of adjacent lines, so the rest reach the expensive stages. Here
+sentences are grouped when the Jaccard similarity of their word-bigram sets
+(lowercased, punctuation removed) is at least ``NEAR_DUPLICATE_THRESHOLD``
+(default 0.9; 0 disables grouping). Numbers are kept as words, so sentences
+that differ in their figures ("Q1 revenue was 10M" / "Q2 revenue was 12M")
+stay apart; only page numbers ("page 3", "3 of 40", "- 3 -") are normalized.
+
+Each sentence gets a MinHash signature of ``MINHASH_PERMUTATIONS`` values.
+The signature is cut into bands, and sentences sharing a band become
+candidates. Candidates whose signatures agree far less than the threshold
+are dropped. The rest are checked against the exact Jaccard similarity before
+joining a group, so LSH only saves comparisons and never adds false matches. With 8 bands of 4 values, pairs at 0.9 similarity are found with
+a probability above 99.9% (about 99% at 0.8).
+
+A group is identified by its first sentence. Embeddings are computed once per
+group, and MMR considers one sentence per group. The original indices are
+kept everywhere.
+"""
+import os
+import re
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Set
+
+import numpy as np
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Part of the cache keys of groups and of what depends on them; bump when the grouping changes.
+GROUPING_VERSION = 2
+MINHASH_PERMUTATIONS = 32
+MINHASH_BANDS = 8
+_PRIME = np.uint64(4294967311)  # first prime above 2**32
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 2 ** 31 - 1, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 31 - 1, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_CHUNK_ROWS = 1 << 17
+# About 3.5 standard deviations of the 32-value estimate around 0.8 similarity.
+_ESTIMATE_MARGIN = 0.25
+
+
+_PAGE_NUMBER = re.compile(r"\b(?:page|pg|p)\.?\s*\d+(?:\s*(?:of|/)\s*\d+)?\b|\b\d+\s*(?:of|/)\s*\d+\b|-\s*\d+\s*-")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def shingles(sentence: str) -> Set[str]:
+    """Word bigrams of a sentence with case, punctuation and page numbers ignored (single words if shorter)."""
+    words = _WORD.findall(_PAGE_NUMBER.sub(" page ", sentence.lower()))
+    if len(words) < 2:
+        return set(words)
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash_signatures(shingle_sets: List[Set[str]]) -> np.ndarray:
+    """(sentences, MINHASH_PERMUTATIONS) signatures; all rows must be non-empty."""
+    lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    hashes = np.fromiter(
+        (zlib.crc32(sh.encode("utf-8")) for s in shingle_sets for sh in s),
+        dtype=np.uint64,
+        count=int(lengths.sum()),
+    )
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    signatures = np.empty((len(shingle_sets), MINHASH_PERMUTATIONS), dtype=np.uint64)
+    # Whole sentences per chunk, to bound the (shingles x permutations) temporary.
+    first = 0
+    while first < len(shingle_sets):
+        last = int(np.searchsorted(starts, starts[first] + _CHUNK_ROWS, side="left"))
+        last = max(last, first + 1)
+        lo, hi = starts[first], starts[last - 1] + lengths[last - 1]
+        permuted = (hashes[lo:hi, None] * _A + _B) % _PRIME
+        signatures[first:last] = np.minimum.reduceat(permuted, starts[first:last] - lo, axis=0)
+        first = last
+    return signatures
+
+
+def near_duplicate_groups(sentences: List[str], threshold: Optional[float] = None) -> List[int]:
+    """Group id (index of the group's first sentence) for each sentence; i for a sentence without duplicates."""
+    threshold = NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+    n = len(sentences)
+    parent = list(range(n))
+    if threshold <= 0 or n < 2:
+        return parent
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    sets = [shingles(s) for s in sentences]
+    # Identical bigram sets (the usual boilerplate) are grouped directly; MinHash only sees distinct ones.
+    seen: Dict[FrozenSet[str], int] = {}
+    rows = []
+    for i, shingle_set in enumerate(sets):
+        if shingle_set:
+            first = seen.setdefault(frozenset(shingle_set), i)
+            if first == i:
+                rows.append(i)
+            else:
+                parent[i] = first
+    if len(rows) < 2:
+        return [find(i) for i in range(n)]
+    signatures = minhash_signatures([sets[i] for i in rows])
+    width = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    rejected = set()
+    for band in range(MINHASH_BANDS):
+        _, first_rows, bucket = np.unique(
+            signatures[:, band * width:(band + 1) * width], axis=0, return_index=True, return_inverse=True
+        )
+        firsts = first_rows[bucket.ravel()]
+        candidates = np.flatnonzero(firsts != np.arange(len(rows)))
+        # The share of equal signature values estimates the similarity; skip pairs far below the threshold.
+        agreement = (signatures[candidates] == signatures[firsts[candidates]]).mean(axis=1)
+        for row in candidates[agreement >= threshold - _ESTIMATE_MARGIN]:
+            first, i = rows[firsts[row]], rows[row]
+            a, b = find(first), find(i)
+            if a == b or (first, i) in rejected:
+                continue
+            if jaccard(sets[first], sets[i]) >= threshold:
+                parent[max(a, b)] = min(a, b)
+            else:
+                rejected.add((first, i))
+    return [find(i) for i in range(n)]
+
+
+class NearDuplicateIndex:
+    """`near_duplicate_groups` for a growing list of sentences: `add` shingles and hashes only the new ones.
+
+    The groups are the same as `near_duplicate_groups` over every sentence added so far.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+        self._parent: List[int] = []
+        self._sets: List[Set[str]] = []
+        self._seen: Dict[FrozenSet[str], int] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        # Per band: band values -> first row with them, as np.unique picks in the batch version.
+        self._buckets: List[Dict[bytes, int]] = [{} for _ in range(MINHASH_BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._parent)
+
+    def _find(self, i: int) -> int:
+        parent = self._parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def add(self, sentences: List[str]):
+        start = len(self._parent)
+        self._parent.extend(range(start, start + len(sentences)))
+        if self.threshold <= 0:
+            return
+        rows = []
+        for i, sentence in enumerate(sentences, start):
+            shingle_set = shingles(sentence)
+            self._sets.append(shingle_set)
+            if shingle_set:
+                first = self._seen.setdefault(frozenset(shingle_set), i)
+                if first == i:
+                    rows.append(i)
+                else:
+                    self._parent[i] = first
+        if not rows:
+            return
+        width = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        for i, signature in zip(rows, minhash_signatures([self._sets[i] for i in rows])):
+            self._signatures[i] = signature
+            rejected = set()
+            for band, buckets in enumerate(self._buckets):
+                first = buckets.setdefault(signature[band * width:(band + 1) * width].tobytes(), i)
+                if first == i or first in rejected:
+                    continue
+                a, b = self._find(first), self._find(i)
+                if a == b:
+                    continue
+                if (
+                    (self._signatures[first] == signature).mean() >= self.threshold - _ESTIMATE_MARGIN
+                    and jaccard(self._sets[first], self._sets[i]) >= self.threshold
+                ):
+                    self._parent[max(a, b)] = min(a, b)
+                else:
+                    rejected.add(first)
+
+    def group(self, i: int) -> int:
+        return self._find(i)
+
+    def groups(self) -> List[int]:
+        return [self._find(i) for i in range(len(self._parent))]
+
+
+def representatives(groups: List[int]) -> List[int]:
+    """Indices of the first sentence of every group, in document order."""
+    return [i for i, g in enumerate(groups) if g == i]
+
+
+def has_duplicates(groups: Optional[List[int]]) -> bool:
+    return groups is not None and any(g != i for i, g in enumerate(groups))
@@ -0,0 +1,127 @@
+"""Low-memory DOCX text extraction.
+
+python-docx builds a full object tree for the document and `doc.paragraphs`
+only covers top-level paragraphs, so table text was dropped. Here
+``word/document.xml`` is streamed straight out of the zip with
+``iterparse``. Paragraphs, including those in table cells and content
+controls, are yielded in document order, and each top-level block is cleared
+once it has been read, so memory does not grow with the document.
+Headers/footers and foot/endnotes can be appended. Results are cached by
+content hash in the shared cache.
+"""
+import hashlib
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Iterator, List, Union
+
+from shared_cache import make_key, shared_cache
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+P, T, TAB, BR, CR = W + "p", W + "t", W + "tab", W + "br", W + "cr"
+
+DOCX_INCLUDE_HEADERS = os.getenv("DOCX_INCLUDE_HEADERS", "False").lower() in {"1", "true", "yes"}
+DOCX_INCLUDE_NOTES = os.getenv("DOCX_INCLUDE_NOTES", "True").lower() in {"1", "true", "yes"}
+CACHE_NAMESPACE = "docx"
+
+
+def _numbered_parts(names: List[str], kind: str) -> List[str]:
+    pattern = re.compile(rf"^word/{kind}(\d*)\.xml$")
+    found = [(m, n) for n in names for m in [pattern.match(n)] if m]
+    return [n for m, n in sorted(found, key=lambda x: int(x[0].group(1) or 0))]
+
+
+def _paragraph_text(p: ET.Element) -> str:
+    parts: List[str] = []
+    for el in p.iter():
+        if el.tag == T:
+            parts.append(el.text or "")
+        elif el.tag == TAB:
+            parts.append("\t")
+        elif el.tag in (BR, CR):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _iter_part(zf: zipfile.ZipFile, name: str, block_depth: int) -> Iterator[str]:
+    """Yield paragraph text from one XML part.
+
+    Elements at `block_depth` (children of w:body, w:hdr, w:footnotes, ...) are
+    removed once they close; nested paragraphs (table cells) are yielded as
+    they close, so order follows the document.
+    """
+    depth = 0
+    parents: List[ET.Element] = []
+    with zf.open(name) as f:
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                parents.append(el)
+                continue
+            depth -= 1
+            parents.pop()
+            if el.tag == P:
+                text = _paragraph_text(el)
+                if text.strip():
+                    yield text
+            if depth == block_depth and parents:
+                # Drop finished blocks so the tree never holds more than one.
+                parents[-1].remove(el)
+
+
+def _note_parts(zf: zipfile.ZipFile, names: List[str]) -> Iterator[str]:
+    for name in ("word/footnotes.xml", "word/endnotes.xml"):
+        if name in names:
+            # w:footnotes > w:footnote > w:p: footnotes are the blocks.
+            yield from _iter_part(zf, name, block_depth=1)
+
+
+def iter_docx_text(
+    source: Union[str, BinaryIO],
+    include_headers: bool = DOCX_INCLUDE_HEADERS,
+    include_notes: bool = DOCX_INCLUDE_NOTES,
+) -> Iterator[str]:
+    """Yield paragraph and table-cell text of a .docx in document order."""
+    try:
+        zf = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Not a valid .docx file: {e}") from e
+    with zf:
+        names = zf.namelist()
+        if "word/document.xml" not in names:
+            raise ValueError("Not a valid .docx file: word/document.xml is missing")
+        if include_headers:
+            for name in _numbered_parts(names, "header"):
+                yield from _iter_part(zf, name, block_depth=1)
+        # w:document > w:body > block
+        yield from _iter_part(zf, "word/document.xml", block_depth=2)
+        if include_notes:
+            yield from _note_parts(zf, names)
+        if include_headers:
+            for name in _numbered_parts(names, "footer"):
+                yield from _iter_part(zf, name, block_depth=1)
+
+
+def content_hash(f: BinaryIO) -> str:
+    h = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        h.update(chunk)
+    f.seek(0)
+    return h.hexdigest()
+
+
+def extract_docx_text(
+    f: BinaryIO,
+    include_headers: bool = DOCX_INCLUDE_HEADERS,
+    include_notes: bool = DOCX_INCLUDE_NOTES,
+) -> str:
+    """Extract text from a seekable .docx file object, cached by content hash and options."""
+    key = make_key(content_hash(f), include_headers, include_notes)
+    cached = shared_cache.get_json(CACHE_NAMESPACE, key)
+    if cached is not None:
+        return cached
+    text = "\n".join(iter_docx_text(f, include_headers, include_notes))
+    shared_cache.set_json(CACHE_NAMESPACE, key, text)
+    return text
@@ -0,0 +1,418 @@
+"""Persistent sentence-embedding store shared by every process on the host.
+
+With ``EMBEDDING_STORE_DIR`` set, sentence embeddings outlive the process
+that computed them. Workers that start later, restarts and other servers
+sharing the directory then skip encoding sentences they have already seen,
+such as contract templates and report sections that recur across documents.
+The shared cache only helps when the whole sentence list repeats.
+
+Each embedding model has its own directory, named after the model id, with:
+
+- ``vectors-<gen>.f16``: an append-only float16 matrix, one row per sentence;
+- ``used-<gen>.u32``: the minute each row was last read or written, for eviction;
+- ``index-<gen>.bin``: an open-addressing hash table of (64-bit sentence hash,
+  row) pairs, kept at most half full;
+- ``meta.json``: the current file names, the dimension and the entry count.
+
+All files are memory-mapped, so processes share the pages instead of each
+holding a copy. Lookups probe the table for a whole batch of hashes at once
+without a lock. Writers take an exclusive ``flock`` on ``lock``. Each writer
+appends the vectors first and then publishes the index slots, writing the row
+before the key, so a reader never sees a key whose vector is missing.
+
+Growing the table and compaction write a new generation of files and then
+atomically replace ``meta.json``. Readers notice the change and remap; a
+process that still maps the old files keeps reading them until then. When
+the vectors exceed ``EMBEDDING_STORE_MAX_MB``, a compaction keeps the most
+recently used rows up to 80% of the cap.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per store directory
+    fcntl = None
+
+MB = 1024 * 1024
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR") or None
+EMBEDDING_STORE_MAX_BYTES = int(float(os.getenv("EMBEDDING_STORE_MAX_MB", "1024")) * MB)
+EVICT_TO = 0.8
+MAX_LOAD = 0.5
+INITIAL_CAPACITY = 1 << 14
+SLOT = np.dtype([("key", "<u8"), ("row", "<u8")])
+
+
+def sentence_hashes(sentences: List[str]) -> np.ndarray:
+    """64-bit hashes of sentences (0 is reserved for empty index slots)."""
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in sentences),
+        dtype=np.uint64,
+        count=len(sentences),
+    )
+    hashes[hashes == 0] = 1
+    return hashes
+
+
+def _minute() -> int:
+    return int(time.time() // 60)
+
+
+def _probe(table: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(row or -1, final slot) for each key, by linear probing from `key % capacity`."""
+    mask = np.uint64(len(table) - 1)
+    slots = keys & mask
+    rows = np.full(len(keys), -1, dtype=np.int64)
+    pending = np.arange(len(keys))
+    while len(pending):
+        found = table["key"][slots[pending]]
+        hit = found == keys[pending]
+        rows[pending[hit]] = table["row"][slots[pending[hit]]].astype(np.int64)
+        # Stop at a hit or an empty slot; move the rest one slot on.
+        pending = pending[~hit & (found != 0)]
+        slots[pending] = (slots[pending] + np.uint64(1)) & mask
+    return rows, slots
+
+
+class _ModelStore:
+    """The files of one embedding model; see the module docstring for the layout."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._meta_stat: Optional[Tuple[int, int]] = None
+        self.meta: Dict[str, Any] = {}
+        self._table: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._used: Optional[np.ndarray] = None
+
+    # -- files ----------------------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Writer lock across processes (and threads of this one)."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._file("lock"), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self) -> bool:
+        """Reload meta.json (and drop stale maps) if another process replaced it; False if there is no store yet."""
+        try:
+            st = os.stat(self._file("meta.json"))
+        except FileNotFoundError:
+            return False
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp != self._meta_stat:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("index") != self.meta.get("index"):
+                self._table = None
+            if meta.get("vectors") != self.meta.get("vectors"):
+                self._vectors = self._used = None
+            self.meta, self._meta_stat = meta, stamp
+        return True
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        tmp = self._file(f"meta.json.{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._refresh()
+
+    def _map_table(self) -> np.ndarray:
+        if self._table is None:
+            self._table = np.memmap(self._file(self.meta["index"]), dtype=SLOT, mode="r+")
+        return self._table
+
+    def _map_vectors(self, rows_needed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Vector and last-used maps covering at least `rows_needed` rows (remapped as the files grow)."""
+        if self._vectors is None or len(self._vectors) < rows_needed:
+            dim = self.meta["dim"]
+            # The last-used file is appended after the vectors; map only rows that have both.
+            rows = min(
+                os.path.getsize(self._file(self.meta["vectors"])) // (2 * dim),
+                os.path.getsize(self._file(self.meta["used"])) // 4,
+            )
+            if rows == 0:
+                self._vectors = np.zeros((0, dim), dtype=np.float16)
+                self._used = np.zeros(0, dtype=np.uint32)
+            else:
+                self._vectors = np.memmap(self._file(self.meta["vectors"]), dtype=np.float16, mode="r", shape=(rows, dim))
+                self._used = np.memmap(self._file(self.meta["used"]), dtype=np.uint32, mode="r+", shape=(rows,))
+        return self._vectors, self._used
+
+    def _new_table(self, gen: int, capacity: int, keys: np.ndarray, rows: np.ndarray) -> str:
+        name = f"index-{gen}.bin"
+        table = np.zeros(capacity, dtype=SLOT)
+        _insert(table, keys, rows)
+        table.tofile(self._file(name))
+        return name
+
+    # -- reads and writes -----------------------------------------------------
+
+    def get(self, keys: np.ndarray) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """(float32 vectors for the found keys, boolean found mask)."""
+        found = np.zeros(len(keys), dtype=bool)
+        with self._lock:
+            if not self._refresh():
+                return None, found
+            rows, _ = _probe(self._map_table(), keys)
+            found = rows >= 0
+            if not found.any():
+                return None, found
+            vectors, used = self._map_vectors(int(rows.max()) + 1)
+            out = np.asarray(vectors[rows[found]], dtype=np.float32)
+            used[rows[found]] = _minute()  # racy across processes, which is fine for an LRU hint
+        return out, found
+
+    def put(self, keys: np.ndarray, vectors: np.ndarray, max_bytes: int) -> int:
+        """Append vectors for keys not stored yet; returns how many were added."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float16)
+        with self._exclusive():
+            if not self._refresh():
+                open(self._file("vectors-0.f16"), "wb").close()
+                open(self._file("used-0.u32"), "wb").close()
+                self._write_meta({
+                    "dim": int(vectors.shape[1]),
+                    "count": 0,
+                    "gen": 0,
+                    "vectors": "vectors-0.f16",
+                    "used": "used-0.u32",
+                    "index": self._new_table(0, INITIAL_CAPACITY, np.zeros(0, np.uint64), np.zeros(0, np.uint64)),
+                })
+            meta = dict(self.meta)
+            if vectors.shape[1] != meta["dim"]:
+                raise ValueError(f"embedding dimension {vectors.shape[1]} does not match the store ({meta['dim']})")
+            # Skip keys stored by another process meanwhile, and repeats within this batch.
+            rows, _ = _probe(self._map_table(), keys)
+            _, first = np.unique(keys, return_index=True)
+            new = np.zeros(len(keys), dtype=bool)
+            new[first] = True
+            new &= rows < 0
+            if not new.any():
+                return 0
+            keys, vectors = keys[new], vectors[new]
+            start = os.path.getsize(self._file(meta["vectors"])) // (2 * meta["dim"])
+            with open(self._file(meta["vectors"]), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file(meta["used"]), "ab") as f:
+                f.write(np.full(len(keys), _minute(), dtype=np.uint32).tobytes())
+            new_rows = np.arange(start, start + len(keys), dtype=np.uint64)
+            meta["count"] += len(keys)
+            table = self._map_table()
+            if meta["count"] > len(table) * MAX_LOAD:
+                # Rebuild at the next power of two that keeps the table at most half full.
+                capacity = len(table)
+                while meta["count"] > capacity * MAX_LOAD:
+                    capacity *= 2
+                old = table[table["key"] != 0]
+                meta["gen"] += 1
+                old_index = meta["index"]
+                meta["index"] = self._new_table(
+                    meta["gen"], capacity, np.concatenate([old["key"], keys]), np.concatenate([old["row"], new_rows])
+                )
+                self._write_meta(meta)
+                _remove(self._file(old_index))
+            else:
+                _insert(table, keys, new_rows)
+                table.flush()
+                self._write_meta(meta)
+            self._vectors = None
+            added = len(keys)
+            if max_bytes > 0 and (start + added) * 2 * meta["dim"] > max_bytes:
+                self._compact(int(max_bytes * EVICT_TO))
+        return added
+
+    def compact(self, max_bytes: int = 0) -> Dict[str, int]:
+        with self._exclusive():
+            if not self._refresh():
+                return {"kept": 0, "evicted": 0}
+            return self._compact(max_bytes)
+
+    def _compact(self, max_bytes: int) -> Dict[str, int]:
+        """Rewrite live rows (most recently used first, within `max_bytes` if set). Caller holds the lock."""
+        meta = dict(self.meta)
+        table = self._map_table()
+        live = table[table["key"] != 0]
+        vectors, used = self._map_vectors(int(live["row"].max()) + 1 if len(live) else 0)
+        order = np.argsort(-used[live["row"].astype(np.int64)].astype(np.int64), kind="stable") if len(live) else []
+        keep = len(live)
+        if max_bytes > 0:
+            keep = min(keep, max_bytes // (2 * meta["dim"]))
+        kept = live[order[:keep]] if len(live) else live
+        rows = kept["row"].astype(np.int64)
+        # Keep rows in their previous order so reads stay mostly sequential.
+        rows_sorted = np.argsort(rows, kind="stable")
+        kept, rows = kept[rows_sorted], rows[rows_sorted]
+        gen = meta["gen"] + 1
+        old = [meta["vectors"], meta["used"], meta["index"]]
+        meta.update({
+            "gen": gen,
+            "count": int(len(kept)),
+            "vectors": f"vectors-{gen}.f16",
+            "used": f"used-{gen}.u32",
+        })
+        np.ascontiguousarray(vectors[rows]).tofile(self._file(meta["vectors"]))
+        np.ascontiguousarray(used[rows]).tofile(self._file(meta["used"]))
+        capacity = INITIAL_CAPACITY
+        while len(kept) > capacity * MAX_LOAD:
+            capacity *= 2
+        meta["index"] = self._new_table(gen, capacity, kept["key"], np.arange(len(kept), dtype=np.uint64))
+        self._write_meta(meta)
+        self._vectors = self._used = self._table = None
+        for name in old:
+            _remove(self._file(name))
+        evicted = len(live) - len(kept)
+        if evicted:
+            print(f"Embedding store {os.path.basename(self.path)}: evicted {evicted} least recently used vectors")
+        return {"kept": int(len(kept)), "evicted": int(evicted)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if not self._refresh():
+                return {"entries": 0, "bytes": 0}
+            vector_bytes = os.path.getsize(self._file(self.meta["vectors"]))
+            return {
+                "entries": self.meta["count"],
+                "dim": self.meta["dim"],
+                "bytes": vector_bytes + os.path.getsize(self._file(self.meta["index"])),
+                "vectorBytes": vector_bytes,
+                "generation": self.meta["gen"],
+            }
+
+
+def _insert(table: np.ndarray, keys: np.ndarray, rows: np.ndarray):
+    """Add keys that are not in `table` yet (caller holds the writer lock and keeps the table under MAX_LOAD).
+
+    Keys are placed in rounds: each round, every empty slot takes at most one
+    of the keys probing it, and the others move on to the next slot.
+    """
+    mask = np.uint64(len(table) - 1)
+    slots = keys & mask
+    pending = np.arange(len(keys))
+    while len(pending):
+        current = table["key"][slots[pending]]
+        # Already stored (by an earlier round for a repeated key, or before).
+        pending, current = pending[current != keys[pending]], current[current != keys[pending]]
+        candidates = pending[current == 0]
+        _, first = np.unique(slots[candidates], return_index=True)
+        placed = candidates[first]
+        table["row"][slots[placed]] = rows[placed]  # row before key: readers that see the key see its row
+        table["key"][slots[placed]] = keys[placed]
+        pending = np.setdiff1d(pending, placed, assume_unique=True)
+        slots[pending] = (slots[pending] + np.uint64(1)) & mask
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # still mapped elsewhere on Windows; removed by the next compaction
+
+
+class EmbeddingStore:
+    """Embeddings by (model id, sentence), one _ModelStore per model; inactive without a directory."""
+
+    def __init__(self, root: Optional[str] = EMBEDDING_STORE_DIR, max_bytes: int = EMBEDDING_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._models: Dict[str, _ModelStore] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None
+
+    def _model(self, model_id: str) -> _ModelStore:
+        with self._lock:
+            store = self._models.get(model_id)
+            if store is None:
+                slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_id)[-60:]
+                digest = hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:8]
+                store = self._models[model_id] = _ModelStore(os.path.join(self.root, f"{slug}-{digest}"))
+            return store
+
+    def get(self, model_id: str, sentences: List[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """(vectors of the stored sentences in order, indices of the sentences that are missing)."""
+        if not self.enabled or not sentences:
+            return None, list(range(len(sentences)))
+        try:
+            vectors, found = self._model(model_id).get(sentence_hashes(sentences))
+        except (OSError, ValueError, IndexError) as e:
+            print(f"Embedding store read failed: {e}")
+            return None, list(range(len(sentences)))
+        with self._lock:
+            self.hits += int(found.sum())
+            self.misses += int(len(found) - found.sum())
+        return vectors, np.flatnonzero(~found).tolist()
+
+    def put(self, model_id: str, sentences: List[str], vectors: np.ndarray) -> int:
+        if not self.enabled or not sentences:
+            return 0
+        try:
+            return self._model(model_id).put(sentence_hashes(sentences), np.asarray(vectors), self.max_bytes)
+        except (OSError, ValueError) as e:
+            print(f"Embedding store write failed: {e}")
+            return 0
+
+    def compact(self, max_bytes: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """Compact every model directory, evicting down to `max_bytes` each (default: none)."""
+        if not self.enabled or not os.path.isdir(self.root):
+            return {}
+        return {
+            name: _ModelStore(os.path.join(self.root, name)).compact(max_bytes or 0)
+            for name in sorted(os.listdir(self.root))
+            if os.path.isdir(os.path.join(self.root, name))
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            models = dict(self._models)
+            hits, misses = self.hits, self.misses
+        return {
+            "enabled": True,
+            "dir": self.root,
+            "maxBytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "models": {model_id: store.stats() for model_id, store in models.items()},
+        }
+
+
+embedding_store = EmbeddingStore()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact the sentence-embedding store in EMBEDDING_STORE_DIR.")
+    parser.add_argument("--dir", default=EMBEDDING_STORE_DIR, help="Store directory (default: EMBEDDING_STORE_DIR)")
+    parser.add_argument("--max-mb", type=float, default=None, help="Evict least recently used vectors down to this size per model")
+    args = parser.parse_args()
+    if not args.dir:
+        parser.error("set EMBEDDING_STORE_DIR or pass --dir")
+    store = EmbeddingStore(args.dir)
+    print(json.dumps(store.compact(int(args.max_mb * MB) if args.max_mb else None), indent=2))
@@ -0,0 +1,163 @@
+"""Map-reduce summarization for book-length documents.
+
+Instead of fitting TF-IDF, embedding and running MMR over every sentence at
+once, the sentence list is cut into sections (at heading-like sentences where
+possible). Each section is scored and summarized in its own worker process,
+so memory per task is bounded by the section size. The section summaries then
+go through a reduce pass; if there are still too many candidates the reduce
+pass is itself map-reduced, up to HIERARCHICAL_MAX_LEVELS levels.
+"""
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import profiling
+import summarizer
+from cancellation import checkpoint
+from metrics import timed
+from summarizer import (
+    compute_sentence_scores_advanced,
+    get_embedding_model,
+    maximal_marginal_relevance,
+    summary_length,
+)
+
+SECTION_SENTENCES = int(os.getenv("HIERARCHICAL_SECTION_SENTENCES", "2000"))
+MAX_LEVELS = int(os.getenv("HIERARCHICAL_MAX_LEVELS", "3"))
+WORKERS = int(os.getenv("HIERARCHICAL_WORKERS", "0")) or (os.cpu_count() or 1)
+# The pool is started from a request thread of a multithreaded server, where fork copies locks held
+# by other threads; forkserver children start from a clean single-threaded process instead. fork
+# shares already-loaded models with the workers and is still available as an opt-in.
+START_METHOD = os.getenv(
+    "HIERARCHICAL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+HEADING_RE = re.compile(
+    r"^(?:chapter|section|part|appendix)\b|^(?:\d+(?:\.\d+)*|[IVXLC]+)\.?\s+[A-Z][A-Za-z]",
+    re.IGNORECASE,
+)
+
+
+def segment_sections(sentences: List[str], target: int = SECTION_SENTENCES) -> List[Tuple[int, int, Optional[str]]]:
+    """Split sentence indices into (start, end, title) sections of about `target` sentences.
+
+    A section closes at the first heading-like sentence after reaching half the
+    target, and unconditionally at 1.5x the target.
+    """
+    target = max(1, target)
+    sections: List[Tuple[int, int, Optional[str]]] = []
+    start = 0
+    title: Optional[str] = None
+    for i, sentence in enumerate(sentences):
+        size = i - start
+        is_heading = bool(HEADING_RE.match(sentence))
+        if size and ((is_heading and size >= target // 2) or size >= int(target * 1.5)):
+            sections.append((start, i, title))
+            start = i
+            title = None
+        if i == start and is_heading:
+            title = sentence[:80]
+    sections.append((start, len(sentences), title))
+    return sections
+
+
+def _summarize_section(task: Tuple[int, List[str], str, str, int, bool, bool]) -> Tuple[int, List[float], List[int]]:
+    """Map step (runs in a worker): score one section and pick its summary sentences."""
+    section_id, sentences, speed_mode, domain, k, semantic, use_mmr = task
+    scores = compute_sentence_scores_advanced(sentences, domain, semantic=semantic)
+    picked = maximal_marginal_relevance(sentences, scores, k, lambda_param=0.6, use_embeddings=use_mmr)
+    return section_id, [s["score"] for s in scores], picked
+
+
+def _run_map(tasks, pool: Optional[ProcessPoolExecutor]) -> Iterator[Tuple[int, List[float], List[int]]]:
+    """Map results in task order, checking for cancellation between sections."""
+    results = map(_summarize_section, tasks) if pool is None else pool.map(_summarize_section, tasks, chunksize=1)
+    for _ in tasks:
+        checkpoint("section")
+        yield next(results)
+
+
+def select_hierarchical(
+    sentences: List[str], speed_mode: str, domain: str, semantic: bool = True, use_mmr: bool = True
+) -> Dict[str, Any]:
+    """Select summary sentences with map-reduce; returns scores, indices and provenance metrics.
+
+    `semantic` / `use_mmr` switch off embedding scoring and MMR (latency budgets).
+    """
+    n_sent = len(sentences)
+    sections = segment_sections(sentences)
+    final_k = summary_length(n_sent, speed_mode)
+    profiling.note("sections", len(sections))
+
+    if summarizer.ADVANCED_MODE and START_METHOD == "fork" and (semantic or use_mmr):
+        # Load the embedding model before forking so workers share it.
+        get_embedding_model()
+
+    workers = min(WORKERS, len(sections))
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD))
+    try:
+        # Map: each section gets its own summary budget from the same speed-mode rule.
+        tasks = [
+            (sid, sentences[start:end], speed_mode, domain, summary_length(end - start, speed_mode), semantic, use_mmr)
+            for sid, (start, end, _) in enumerate(sections)
+        ]
+        sentence_scores: List[Dict[str, Any]] = []
+        candidates: List[int] = []
+        section_of: Dict[int, int] = {}
+        with timed("summarize", "map"):
+            for sid, scores, picked in _run_map(tasks, pool):
+                start = sections[sid][0]
+                for local, score in enumerate(scores):
+                    sentence_scores.append({"sentence": sentences[start + local], "score": score, "index": start + local})
+                for local in picked:
+                    candidates.append(start + local)
+                    section_of[start + local] = sid
+        sentence_scores.sort(key=lambda s: s["index"])
+        candidates.sort()
+        keyword_text = " ".join(sentences[i] for i in candidates)
+
+        # Reduce: re-map groups of candidates while there are too many, then select.
+        level = 1
+        with timed("summarize", "reduce"):
+            while len(candidates) > SECTION_SENTENCES and level < MAX_LEVELS:
+                groups = [candidates[i:i + SECTION_SENTENCES] for i in range(0, len(candidates), SECTION_SENTENCES)]
+                tasks = [
+                    (gid, [sentences[i] for i in group], speed_mode, domain, summary_length(len(group), speed_mode),
+                     semantic, use_mmr)
+                    for gid, group in enumerate(groups)
+                ]
+                candidates = sorted(groups[gid][local] for gid, _, picked in _run_map(tasks, pool) for local in picked)
+                level += 1
+            cand_sentences = [sentences[i] for i in candidates]
+            cand_scores = compute_sentence_scores_advanced(cand_sentences, domain, semantic=semantic)
+            picked = maximal_marginal_relevance(
+                cand_sentences, cand_scores, min(final_k, len(candidates)), lambda_param=0.6, use_embeddings=use_mmr
+            )
+            indices = sorted(candidates[i] for i in picked)
+    finally:
+        if pool is not None:
+            # Sections not yet started are dropped if the request was cancelled.
+            pool.shutdown(cancel_futures=True)
+
+    profiling.note("reduceLevels", level)
+    return {
+        "sentenceScores": sentence_scores,
+        "indices": indices,
+        "keywordText": keyword_text,
+        "metrics": {
+            "sections": [
+                {"id": sid, "title": title, "startSentence": start, "endSentence": end}
+                for sid, (start, end, title) in enumerate(sections)
+            ],
+            "reduceLevels": level,
+            "workers": max(1, workers),
+            "sectionCandidates": len(section_of),
+            # Section each summary sentence came from, in summary order.
+            "summarySources": [{"index": i, "section": section_of.get(i)} for i in indices],
+        },
+    }
@@ -0,0 +1,272 @@
+"""Precomputed per-domain IDF tables for sentence scoring.
+
+Without tables, base scoring fits a ``TfidfVectorizer`` on each document's
+own sentences. That fit dominates scoring time on large inputs, and short
+documents give poor IDF weights: a term in 2 of 10 sentences looks rare.
+With ``IDF_TABLE_DIR`` set, scoring instead looks up corpus statistics for
+the request's domain (``academic``, ``legal``, ``journalistic``,
+``general``). A domain without its own table uses ``general``.
+
+Terms are hashed into ``N_FEATURES`` columns with sklearn's
+``HashingVectorizer`` (same tokenizer and English stop words as the per-document
+fit). The stored vocabulary is therefore the hash space itself, and
+vectorizing a request is transform-only. A table is two files:
+
+- ``<domain>.df``: sentence document frequencies, one uint32 per column,
+  memory-mapped by every worker;
+- ``<domain>.json``: sentence and document counts, and the build id that
+  base-score cache keys include.
+
+IDF uses sklearn's smoothed formula, ``ln((1 + n) / (1 + df)) + 1``, over
+sentences, as the per-document fit did. Scores stay the row sums of the
+L2-normalized TF-IDF rows.
+
+Build tables offline from a local corpus, in any format ``parsers.py`` reads::
+
+    python idf_tables.py build --domain legal contracts/ more/*.pdf
+    python idf_tables.py build --domain legal --update new_contracts/
+    python idf_tables.py stats
+
+With ``IDF_LEARN=True``, every document scored with a table is also added to
+it. Counts are updated in place under a file lock, and the build id, and with
+it cached scores, stays the same.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+try:
+    import fcntl
+except ImportError:  # Windows: learning from several processes is not serialized
+    fcntl = None
+
+IDF_TABLE_DIR = os.getenv("IDF_TABLE_DIR") or None
+IDF_LEARN = os.getenv("IDF_LEARN", "False").lower() in {"1", "true", "yes"}
+DOMAINS = ("academic", "legal", "journalistic", "general")
+N_FEATURES = 1 << 20
+
+_vectorizer = HashingVectorizer(
+    n_features=N_FEATURES, stop_words="english", alternate_sign=False, norm=None, dtype=np.float64
+)
+
+
+def term_counts(sentences: List[str]) -> sparse.csr_matrix:
+    """(sentences, N_FEATURES) term counts; transform-only, nothing is fitted."""
+    return _vectorizer.transform(sentences)
+
+
+def sentence_df(counts: sparse.csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+    """(columns, number of sentences containing each column's terms)."""
+    present = counts.tocsc()
+    df = np.diff(present.indptr)
+    columns = np.flatnonzero(df)
+    return columns, df[columns]
+
+
+class IdfTable:
+    """One domain's memory-mapped document frequencies."""
+
+    def __init__(self, root: str, domain: str):
+        self.domain = domain
+        self.df_path = os.path.join(root, f"{domain}.df")
+        self.meta_path = os.path.join(root, f"{domain}.json")
+        self._lock = threading.Lock()
+        self._meta_stat: Optional[Tuple[int, int]] = None
+        self.meta: Dict[str, Any] = {}
+        self.df = np.memmap(self.df_path, dtype=np.uint32, mode="r+", shape=(N_FEATURES,))
+        self._refresh()
+
+    def _refresh(self):
+        st = os.stat(self.meta_path)
+        if (st.st_ino, st.st_mtime_ns) != self._meta_stat:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if self.meta and meta["built"] != self.meta["built"]:
+                # Rebuilt: the .df file was replaced, so map the new one.
+                self.df = np.memmap(self.df_path, dtype=np.uint32, mode="r+", shape=(N_FEATURES,))
+            self.meta = meta
+            self._meta_stat = (st.st_ino, st.st_mtime_ns)
+
+    @property
+    def build_id(self) -> str:
+        return f"{self.domain}:{self.meta['built']}"
+
+    def idf(self, columns: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._refresh()
+            n = self.meta["sentences"]
+        return np.log((1.0 + n) / (1.0 + self.df[columns].astype(np.float64))) + 1.0
+
+    def sentence_scores(self, sentences: List[str], learn: bool = IDF_LEARN) -> np.ndarray:
+        """Row sums of the L2-normalized TF-IDF rows of `sentences` under this table."""
+        counts = term_counts(sentences)
+        weighted = counts.copy()
+        weighted.data = weighted.data * self.idf(weighted.indices)
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        sums = np.asarray(weighted.sum(axis=1)).ravel()
+        if learn:
+            self.add(counts, documents=1)
+        return np.divide(sums, norms, out=np.zeros_like(sums), where=norms > 0)
+
+    def add(self, counts: sparse.csr_matrix, documents: int = 1):
+        """Add the sentences behind `counts` to the table, in place."""
+        columns, df = sentence_df(counts)
+        self._add(columns, df, counts.shape[0], documents)
+
+    def _add(self, columns: np.ndarray, df: np.ndarray, sentences: int, documents: int):
+        with _file_lock(self.meta_path):
+            with self._lock:
+                self._refresh()
+                meta = dict(self.meta)
+                # uint32 saturates instead of wrapping.
+                self.df[columns] = np.minimum(self.df[columns].astype(np.int64) + df, np.iinfo(np.uint32).max)
+                self.df.flush()
+                meta["sentences"] += sentences
+                meta["documents"] += documents
+                meta["updated"] = time.time()
+                _write_json(self.meta_path, meta)
+                self._refresh()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {**self.meta, "terms": int(np.count_nonzero(self.df))}
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_json(path: str, value: Dict[str, Any]):
+    tmp = f"{path}.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+
+class IdfTables:
+    """The tables under `root`, mapped on first use (or by preload at startup)."""
+
+    def __init__(self, root: Optional[str] = IDF_TABLE_DIR):
+        self.root = root
+        self._tables: Dict[str, Optional[IdfTable]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, domain: str) -> Optional[IdfTable]:
+        with self._lock:
+            # Missing tables are looked for again, so a table built later is picked up without a restart.
+            if self._tables.get(domain) is None and os.path.exists(os.path.join(self.root, f"{domain}.json")):
+                try:
+                    self._tables[domain] = IdfTable(self.root, domain)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Could not load IDF table {domain}: {e}")
+            return self._tables.get(domain)
+
+    def get(self, domain: str) -> Optional[IdfTable]:
+        """The table for `domain`, else the general one, else None (fit per document)."""
+        if not self.root:
+            return None
+        return self._load((domain or "general").lower()) or self._load("general")
+
+    def preload(self):
+        if not self.root:
+            return
+        for domain in DOMAINS:
+            if self._load(domain) is not None:
+                print(f"✓ IDF table {domain} loaded ({self._tables[domain].meta['sentences']} sentences)")
+
+    def stats(self) -> Dict[str, Any]:
+        tables = {}
+        for domain in DOMAINS:
+            table = self._load(domain) if self.root else None
+            if table is not None:
+                tables[domain] = table.stats()
+        return tables
+
+
+idf_tables = IdfTables()
+
+
+def build(root: str, domain: str, documents: Iterable[Tuple[str, str]], update: bool = False) -> Dict[str, Any]:
+    """Create (or with `update`, extend) the table for `domain` from (name, text) documents."""
+    from summarizer import clean_extracted_text, split_sentences
+
+    os.makedirs(root, exist_ok=True)
+    df_path = os.path.join(root, f"{domain}.df")
+    meta_path = os.path.join(root, f"{domain}.json")
+    # Counted in memory, so workers score with the old table (or none) until the corpus is done.
+    df = np.zeros(N_FEATURES, dtype=np.int64)
+    n_sentences = n_documents = 0
+    for name, text in documents:
+        sentences = split_sentences(clean_extracted_text(text))
+        if sentences:
+            columns, counts = sentence_df(term_counts(sentences))
+            df[columns] += counts
+            n_sentences += len(sentences)
+            n_documents += 1
+            print(f"  {name}: {len(sentences)} sentences")
+    if update and os.path.exists(meta_path):
+        table = IdfTable(root, domain)
+        columns = np.flatnonzero(df)
+        table._add(columns, df[columns], n_sentences, n_documents)
+        return table.stats()
+    # .df first, then the .json with the new build id: a worker that sees the new id maps the new counts.
+    tmp_df = f"{df_path}.{os.getpid()}"
+    np.minimum(df, np.iinfo(np.uint32).max).astype(np.uint32).tofile(tmp_df)
+    os.replace(tmp_df, df_path)
+    now = time.time()
+    _write_json(meta_path, {"domain": domain, "sentences": n_sentences, "documents": n_documents, "built": now, "updated": now})
+    return IdfTable(root, domain).stats()
+
+
+def _read_corpus(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    from parsers import extract_text
+
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(d, f) for d, _, names in os.walk(path) for f in names)
+        for file_path in files:
+            try:
+                with open(file_path, "rb") as f:
+                    yield file_path, extract_text(f, os.path.basename(file_path))
+            except (OSError, ValueError) as e:
+                print(f"  skipped {file_path}: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build and inspect per-domain IDF tables.")
+    parser.add_argument("--dir", default=IDF_TABLE_DIR, help="Table directory (default: IDF_TABLE_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_cmd = commands.add_parser("build", help="Build a domain's table from files and directories")
+    build_cmd.add_argument("--domain", required=True, choices=DOMAINS)
+    build_cmd.add_argument("--update", action="store_true", help="Add to the existing table instead of replacing it")
+    build_cmd.add_argument("paths", nargs="+")
+    commands.add_parser("stats", help="Show the tables in the directory")
+    args = parser.parse_args()
+    if not args.dir:
+        parser.error("set IDF_TABLE_DIR or pass --dir")
+    if args.command == "build":
+        print(json.dumps(build(args.dir, args.domain, _read_corpus(args.paths), update=args.update), indent=2))
+    else:
+        json.dump(IdfTables(args.dir).stats(), sys.stdout, indent=2)
+        print()
@@ -0,0 +1,390 @@
+"""Append-only incremental summarization for growing documents (live transcripts, logs).
+
+Clients create a document and append text to it. Each append cleans, splits,
+tokenizes and embeds only the new sentences. Document frequencies, per-term
+totals and the embedding sum (centroid) are updated in place. Selection then
+reruns over the stored statistics, which is sparse/array arithmetic with no
+re-tokenizing or re-encoding of earlier text.
+
+Text after the last sentence boundary is held back as the pending tail until
+more text (or ``flush``) completes it.
+
+Scoring follows `summarizer.base_sentence_scores`: smoothed-IDF TF-IDF row
+sums (L2-normalized rows, English stop words), 60/40 blended with centroid
+similarity when embeddings are available, then position, length, numeric and
+domain weights. The vocabulary is not capped at 500 terms as in the batch
+path, because the cap would change as the document grows.
+
+Near-duplicate groups (see dedup.py) are kept the same way: each append
+shingles and hashes only its own sentences. Scores are recomputed for every
+sentence, but as a few array operations. MMR only considers the sentences
+added since the last summary with the same settings, that summary's
+selection and the top-scoring sentences, so its cost does not grow with the
+document. Responses carry the scores of those new sentences only
+(``metrics.incremental.scoresFrom``); ``fullScores`` asks for all of them.
+Selection runs under the document's lock, so an append cannot change the
+statistics halfway through a summary.
+
+With a shared cache path (``SHARED_CACHE_PATH``), every append is also
+written to the shared cache as a numbered chunk, so a worker that did not see
+an append (prefork) catches up by replaying only the chunks it is missing.
+Without one, documents live only in the worker that created them. A chunk
+that has aged out of the cache raises ``DocumentLost``: the document has to be
+uploaded again. Appends to one document are expected to be sequential.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import dedup
+import profiling
+import summarizer
+from cancellation import checkpoint
+from metrics import timed
+from shared_cache import shared_cache
+
+MAX_DOCUMENTS = int(os.getenv("INCREMENTAL_MAX_DOCUMENTS", "64"))
+NAMESPACE = "incremental"
+
+_analyzer = TfidfVectorizer(stop_words="english").build_analyzer()
+# A sentence is complete once its terminator is followed by whitespace.
+_BOUNDARY_RE = re.compile(r"[.!?][\"')\]]*\s+")
+
+
+class DocumentLost(LookupError):
+    """A chunk of the document is no longer in the shared cache."""
+
+
+def _split_complete(buffer: str, flush: bool) -> Tuple[str, str]:
+    """Split `buffer` into (complete text, pending tail)."""
+    if flush:
+        return buffer, ""
+    last = None
+    for last in _BOUNDARY_RE.finditer(buffer):
+        pass
+    if last is None:
+        return "", buffer
+    return buffer[:last.end()], buffer[last.end():]
+
+
+class IncrementalDocument:
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.sentences: List[str] = []
+        self.tail = ""
+        self.chunks = 0
+        self.created = time.time()
+        self.updated = self.created
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.df = np.zeros(0, dtype=np.int64)
+        self.term_totals = np.zeros(0, dtype=np.float64)
+        # Per-append CSR blocks of raw term counts; shapes grow with the vocabulary.
+        self.blocks: List[sparse.csr_matrix] = []
+        self.content_weights = np.zeros(0)
+        self.embeddings: Optional[np.ndarray] = None
+        self.embedding_sum: Optional[np.ndarray] = None
+        self.near_duplicates = dedup.NearDuplicateIndex()
+        self.words = 0
+        self._domain_weights: Dict[str, np.ndarray] = {}
+        # (speed mode, domain) -> (selected indices, sentences at the time)
+        self._selections: Dict[Tuple[str, str], Tuple[List[int], int]] = {}
+        self.lock = threading.Lock()
+
+    # -- ingest ------------------------------------------------------------
+
+    def _ingest(self, sentences: List[str], counts: List[Dict[str, int]], embeddings: Optional[np.ndarray]):
+        if not sentences:
+            return
+        indptr, indices, data = [0], [], []
+        new_df: Dict[int, int] = {}
+        for row in counts:
+            for term, count in row.items():
+                j = self.vocab.get(term)
+                if j is None:
+                    j = self.vocab[term] = len(self.terms)
+                    self.terms.append(term)
+                indices.append(j)
+                data.append(count)
+                new_df[j] = new_df.get(j, 0) + 1
+            indptr.append(len(indices))
+        grow = len(self.terms) - len(self.df)
+        if grow:
+            self.df = np.concatenate([self.df, np.zeros(grow, dtype=np.int64)])
+            self.term_totals = np.concatenate([self.term_totals, np.zeros(grow)])
+        block = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(sentences), len(self.terms)),
+        )
+        if new_df:
+            cols = np.fromiter(new_df.keys(), dtype=np.int64)
+            self.df[cols] += np.fromiter(new_df.values(), dtype=np.int64)
+        np.add.at(self.term_totals, block.indices, block.data)
+        self.blocks.append(block)
+        self.sentences.extend(sentences)
+        self.words += sum(len(s.split()) for s in sentences)
+        with timed("incremental", "dedup"):
+            self.near_duplicates.add(sentences)
+        self.content_weights = np.concatenate(
+            [self.content_weights, [summarizer.content_weight(s) for s in sentences]]
+        )
+        if embeddings is not None and (self.embeddings is not None or len(self.sentences) == len(sentences)):
+            self.embeddings = embeddings if self.embeddings is None else np.vstack([self.embeddings, embeddings])
+            total = embeddings.sum(axis=0)
+            self.embedding_sum = total if self.embedding_sum is None else self.embedding_sum + total
+        else:
+            # Embeddings must cover every sentence; drop them if an append came without.
+            self.embeddings = self.embedding_sum = None
+
+    def append(self, text: str, flush: bool = False) -> int:
+        """Add text; returns the number of new complete sentences."""
+        # State changes only after the last checkpoint, so a cancelled append leaves the document as it was.
+        complete, tail = _split_complete(self.tail + text, flush)
+        sentences: List[str] = []
+        if complete.strip():
+            with timed("incremental", "clean"):
+                cleaned = summarizer.clean_extracted_text(complete)
+            with timed("incremental", "split"):
+                sentences = summarizer.split_sentences(cleaned)
+        counts: List[Dict[str, int]] = []
+        embeddings = None
+        if sentences:
+            with timed("incremental", "vectorize"):
+                for sentence in sentences:
+                    row: Dict[str, int] = {}
+                    for term in _analyzer(sentence):
+                        row[term] = row.get(term, 0) + 1
+                    counts.append(row)
+            checkpoint("vectorize")
+            if summarizer.ADVANCED_MODE and (self.embeddings is not None or not self.sentences):
+                # New sentences only; the shared embedding cache is bypassed (keyed by whole lists),
+                # the per-sentence embedding store is not. Once embeddings were dropped (an append
+                # without them), encoding more would only be thrown away.
+                embeddings = summarizer.embed_texts(sentences, pipeline="incremental")
+        self.tail = tail
+        self._ingest(sentences, counts, embeddings)
+        self.updated = time.time()
+        self._persist(sentences, counts, embeddings)
+        profiling.note("appendedSentences", len(sentences))
+        return len(sentences)
+
+    # -- shared-cache persistence -------------------------------------------
+
+    def _persist(self, sentences, counts, embeddings):
+        key = f"{self.doc_id}:{self.chunks}"
+        self.chunks += 1
+        if not shared_cache.shared:
+            # No other worker could replay it, and it would only push other entries out of the in-memory cache.
+            return
+        shared_cache.set_json(NAMESPACE, key, {"sentences": sentences, "counts": counts})
+        if embeddings is not None:
+            shared_cache.set_array(NAMESPACE, key + ":embeddings", embeddings)
+        shared_cache.set_json(NAMESPACE, self.doc_id, self._head())
+
+    def _head(self) -> Dict[str, Any]:
+        return {"chunks": self.chunks, "tail": self.tail, "created": self.created, "updated": self.updated}
+
+    def sync(self) -> bool:
+        """Replay chunks written by other workers; False if the document is unknown."""
+        head = shared_cache.get_json(NAMESPACE, self.doc_id)
+        if head is None:
+            return self.chunks > 0
+        if head.get("deleted"):
+            return False
+        while self.chunks < head["chunks"]:
+            key = f"{self.doc_id}:{self.chunks}"
+            chunk = shared_cache.get_json(NAMESPACE, key)
+            if chunk is None:
+                raise DocumentLost(f"Incremental document {self.doc_id} lost chunk {self.chunks}")
+            self._ingest(chunk["sentences"], chunk["counts"], shared_cache.get_array(NAMESPACE, key + ":embeddings"))
+            self.chunks += 1
+        self.tail = head["tail"]
+        self.created = head["created"]
+        self.updated = head["updated"]
+        return True
+
+    # -- scoring / selection -------------------------------------------------
+
+    def base_scores(self) -> np.ndarray:
+        n = len(self.sentences)
+        if n == 0:
+            return np.zeros(0)
+        idf = np.log((1 + n) / (1 + self.df)) + 1.0
+        if len(self.blocks) > 16:
+            # Fold the per-append blocks together so scoring stays a few sparse ops.
+            width = len(self.terms)
+            self.blocks = [sparse.vstack([
+                sparse.csr_matrix((b.data, b.indices, b.indptr), shape=(b.shape[0], width)) for b in self.blocks
+            ], format="csr")]
+        parts = []
+        for block in self.blocks:
+            weighted = block.multiply(idf[:block.shape[1]]).tocsr()
+            sums = np.asarray(weighted.sum(axis=1)).ravel()
+            norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+            parts.append(np.divide(sums, norms, out=np.zeros_like(sums), where=norms > 0))
+        scores = np.concatenate(parts)
+        if self.embeddings is not None:
+            centroid = self.embedding_sum / n
+            sims = self.embeddings @ centroid
+            sims /= np.maximum(np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(centroid), 1e-12)
+            scores = scores * 0.6 + sims * 0.4
+        positions = np.ones(n)
+        positions[0] = summarizer.position_weight(0, n)
+        for i in range(1, min(3, n)):
+            positions[i] = summarizer.position_weight(i, n)
+        positions[n - 1] = summarizer.position_weight(n - 1, n)
+        return scores * positions * self.content_weights
+
+    def keywords(self, top_n: int) -> List[Dict[str, Any]]:
+        """Top terms by document-wide TF-IDF mass, from the running term totals."""
+        if not self.terms:
+            return []
+        n = len(self.sentences)
+        idf = np.log((1 + n) / (1 + self.df)) + 1.0
+        weights = self.term_totals * idf
+        total = weights.sum() or 1.0
+        keywords = []
+        for j in np.argsort(-weights):
+            if len(self.terms[j]) > 3:
+                keywords.append({"word": self.terms[j], "score": float(weights[j] / total)})
+                if len(keywords) >= top_n:
+                    break
+        return keywords
+
+    def domain_weights(self, domain: str) -> np.ndarray:
+        """summarizer.domain_weight of every sentence, computed for new sentences only."""
+        weights = self._domain_weights.get(domain, np.zeros(0))
+        if len(weights) < len(self.sentences):
+            start = len(weights)
+            weights = self._domain_weights[domain] = np.concatenate([weights, [
+                summarizer.domain_weight(s, i, domain) for i, s in enumerate(self.sentences[start:], start)
+            ]])
+        return weights
+
+    def summarize(self, speed_mode: str = "balanced", domain: str = "general", full_scores: bool = False) -> Dict[str, Any]:
+        with self.lock:
+            return self._summarize(speed_mode, domain, full_scores)
+
+    def _summarize(self, speed_mode: str, domain: str, full_scores: bool) -> Dict[str, Any]:
+        n_sent = len(self.sentences)
+        previous, last_n = self._selections.get((speed_mode, domain), ([], 0))
+        since = 0 if full_scores else last_n
+        if n_sent == 0:
+            summary = {
+                "summary": "",
+                "highlights": [],
+                "keywords": [],
+                "sentenceScores": [],
+                "metrics": {"compressionRatio": 0, "originalSentences": 0, "summarySentences": 0, "processingTime": 0},
+            }
+        else:
+            with timed("incremental", "score"):
+                scores = self.base_scores() * self.domain_weights(domain)
+            max_sents = summarizer.summary_length(n_sent, speed_mode)
+            # Candidates: new sentences, the last selection, and the best by score (which catches
+            # older sentences that rose as the statistics changed).
+            top = np.argpartition(-scores, max_sents - 1)[:max_sents] if max_sents < n_sent else np.arange(n_sent)
+            candidates = sorted(set(range(last_n, n_sent))
+                                | set(previous) | set(top.tolist()))
+            with timed("incremental", "mmr"):
+                chosen = summarizer.maximal_marginal_relevance(
+                    [self.sentences[i] for i in candidates],
+                    [{"sentence": self.sentences[i], "score": float(scores[i]), "index": k} for k, i in enumerate(candidates)],
+                    max_sents,
+                    lambda_param=0.6,
+                    embeddings=self.embeddings[candidates] if self.embeddings is not None else None,
+                    use_embeddings=self.embeddings is not None,
+                    groups=[self.near_duplicates.group(i) for i in candidates],
+                )
+            top_indices = sorted(candidates[k] for k in chosen)
+            self._selections[(speed_mode, domain)] = (top_indices, n_sent)
+            summary_text = " ".join(self.sentences[i] for i in top_indices)
+            highlights = [
+                {"sentence": self.sentences[i], "score": float(scores[i]), "index": int(i)}
+                for i in _highlight_indices(scores)
+            ]
+            summary_words = len(summary_text.split())
+            summary = {
+                "summary": summary_text,
+                "highlights": highlights,
+                "keywords": self.keywords(max(8, min(60, len(highlights) // 2))),
+                "sentenceScores": [
+                    {"sentence": self.sentences[i], "score": float(scores[i]), "index": i} for i in range(since, n_sent)
+                ],
+                "metrics": {
+                    "compressionRatio": int((1 - summary_words / self.words) * 100) if self.words else 0,
+                    "originalSentences": n_sent,
+                    "summarySentences": len(top_indices),
+                    "processingTime": 0,
+                },
+            }
+        summary["documentId"] = self.doc_id
+        summary["metrics"]["incremental"] = {
+            "chunks": self.chunks,
+            "pendingChars": len(self.tail),
+            "vocabulary": len(self.terms),
+            "embeddings": self.embeddings is not None,
+            "scoresFrom": since,
+        }
+        return summary
+
+
+def _highlight_indices(scores: np.ndarray) -> np.ndarray:
+    """summarizer.select_highlights on a score array: indices of the highlights, best first."""
+    n = len(scores)
+    order = np.argsort(-scores, kind="stable")
+    count = int(np.count_nonzero(scores >= scores.mean() + 0.5 * scores.std()))
+    count = min(max(count, min(3, n)), max(5, int(n * 0.5)))
+    return order[:count]
+
+
+_documents: "OrderedDict[str, IncrementalDocument]" = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def _remember(doc: IncrementalDocument):
+    with _registry_lock:
+        _documents[doc.doc_id] = doc
+        _documents.move_to_end(doc.doc_id)
+        while len(_documents) > MAX_DOCUMENTS:
+            _documents.popitem(last=False)
+
+
+def create_document(text: str = "") -> IncrementalDocument:
+    doc = IncrementalDocument(uuid.uuid4().hex)
+    with doc.lock:
+        doc.append(text)
+    _remember(doc)
+    return doc
+
+
+def get_document(doc_id: str) -> Optional[IncrementalDocument]:
+    """Local state for `doc_id`, brought up to date with appends made by other workers."""
+    with _registry_lock:
+        doc = _documents.get(doc_id)
+    if doc is None:
+        doc = IncrementalDocument(doc_id)
+    with doc.lock:
+        if not doc.sync():
+            return None
+    _remember(doc)
+    return doc
+
+
+def delete_document(doc_id: str) -> bool:
+    with _registry_lock:
+        local = _documents.pop(doc_id, None)
+    head = shared_cache.get_json(NAMESPACE, doc_id)
+    if local is None and (head is None or head.get("deleted")):
+        return False
+    # Orphaned chunks age out of the cache; the tombstone stops other workers serving their copy.
+    shared_cache.set_json(NAMESPACE, doc_id, {"deleted": True})
+    return True
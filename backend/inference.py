@@ -0,0 +1,276 @@
+"""CPU inference scheduler: thread settings, fixed slots per model, fair queueing.
+
+Model calls (sentence embeddings, KeyBERT, BART) go through ``run(pool, fn)``
+instead of running on the request thread. Each pool has a fixed number of
+slots (``INFERENCE_SLOTS``, e.g. ``embedding=2,summarization=1``), and each
+slot is a thread that runs one model call at a time. Torch and the BLAS
+libraries are limited to ``INFERENCE_THREADS_PER_SLOT`` threads (default:
+the available CPUs divided by the number of slots), so concurrent calls
+split the cores instead of oversubscribing them. With
+``INFERENCE_PIN_THREADS=True`` every slot is pinned to its own CPUs (taken in
+order from ``INFERENCE_CPUS`` or the process affinity) and the torch/OpenMP
+threads it starts inherit that set.
+
+Calls wait in one queue per traffic class (``summarize``, ``chat``,
+``batch``, ``jobs``). A free slot takes the next call from the class that has
+used the least slot time relative to its weight in ``INFERENCE_WEIGHTS``, so
+a long BART pass for a summary cannot hold back chat traffic on the same
+pool indefinitely.
+
+Torch's thread count is per process: with several workers (serve.py, job
+workers, hierarchical map processes) set ``INFERENCE_THREADS_PER_SLOT`` so
+that processes x slots x threads stays within the cores.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from cancellation import checkpoint
+from metrics import INFERENCE_BUSY_SECONDS, INFERENCE_QUEUED, INFERENCE_WAIT_SECONDS
+from models import parse_model_map
+
+INFERENCE_SCHEDULER = os.getenv("INFERENCE_SCHEDULER", "True").lower() in {"1", "true", "yes"}
+INFERENCE_PIN_THREADS = os.getenv("INFERENCE_PIN_THREADS", "False").lower() in {"1", "true", "yes"}
+DEFAULT_TRAFFIC = "summarize"
+
+
+def parse_cpus(spec: str) -> List[int]:
+    """"0-3,8" -> [0, 1, 2, 3, 8]."""
+    cpus: List[int] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+def available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+INFERENCE_CPUS = parse_cpus(os.getenv("INFERENCE_CPUS", "")) or available_cpus()
+INFERENCE_SLOTS = {
+    pool: max(1, int(n))
+    for pool, n in {"embedding": "2", "summarization": "1", **parse_model_map(os.getenv("INFERENCE_SLOTS", ""))}.items()
+}
+INFERENCE_THREADS_PER_SLOT = int(os.getenv("INFERENCE_THREADS_PER_SLOT", "0")) or max(
+    1, len(INFERENCE_CPUS) // sum(INFERENCE_SLOTS.values())
+)
+INFERENCE_WEIGHTS = {
+    traffic: float(weight)
+    for traffic, weight in {"summarize": "1", "chat": "1", "batch": "0.5", "jobs": "0.5", **parse_model_map(os.getenv("INFERENCE_WEIGHTS", ""))}.items()
+}
+
+_traffic: contextvars.ContextVar[str] = contextvars.ContextVar("sumrify_traffic", default=DEFAULT_TRAFFIC)
+# Set on slot threads: model calls made from inside a slot run inline instead of queueing behind themselves.
+_local = threading.local()
+
+
+@contextmanager
+def traffic(name: str) -> Iterator[None]:
+    """Attribute model calls made in this block (and threads it hands work to) to traffic class `name`."""
+    token = _traffic.set(name)
+    try:
+        yield
+    finally:
+        _traffic.reset(token)
+
+
+def configure_threads(threads: int = INFERENCE_THREADS_PER_SLOT):
+    """Limit torch and BLAS thread pools to `threads` per call (once per process, after torch is imported)."""
+    # Only read by libraries that have not started their thread pools yet.
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(var, str(threads))
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # only allowed before the first parallel torch op
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+
+def _checked(pool: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    checkpoint(pool)
+    return fn(*args, **kwargs)
+
+
+class _Slot:
+    def __init__(self, pool: str, index: int, cpus: List[int]):
+        self.pool = pool
+        self.index = index
+        self.cpus = cpus
+        self.busy_seconds = 0.0
+        self.runs = 0
+        self.running: Optional[str] = None
+        self.started = time.time()
+
+
+class SlotPool:
+    """Fixed slots for one model pool; free slots take calls from the least-served traffic class."""
+
+    def __init__(self, name: str, slots: int, cpus: List[List[int]]):
+        self.name = name
+        self.slots = [_Slot(name, i, cpus[i] if i < len(cpus) else []) for i in range(slots)]
+        self._queues: Dict[str, Deque[Tuple[Future, Callable[[], Any], float]]] = {}
+        # traffic class -> slot seconds used / weight
+        self._served: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def _start(self):
+        # Caller holds self._cond.
+        for slot in self.slots:
+            thread = threading.Thread(target=self._run, args=(slot,), name=f"inference-{self.name}-{slot.index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn: Callable[[], Any], traffic_class: str) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if not self._threads:
+                self._start()
+            queue = self._queues.setdefault(traffic_class, deque())
+            if not queue:
+                # A class that was idle starts level with the active ones instead of spending saved-up credit.
+                active = [self._served[t] for t, q in self._queues.items() if q and t in self._served]
+                self._served[traffic_class] = max(self._served.get(traffic_class, 0.0), min(active, default=0.0))
+            queue.append((future, fn, time.perf_counter()))
+            INFERENCE_QUEUED.inc(pool=self.name, traffic=traffic_class)
+            self._cond.notify()
+        return future
+
+    def _next(self) -> Tuple[str, Tuple[Future, Callable[[], Any], float]]:
+        # Caller holds self._cond and has checked that a queue is non-empty.
+        traffic_class = min(
+            (t for t, q in self._queues.items() if q),
+            key=lambda t: self._served.get(t, 0.0),
+        )
+        return traffic_class, self._queues[traffic_class].popleft()
+
+    def _run(self, slot: _Slot):
+        _local.in_slot = True
+        if INFERENCE_PIN_THREADS and slot.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, slot.cpus)  # this thread only; torch threads it starts inherit it
+            except OSError as e:
+                print(f"Could not pin inference slot {self.name}/{slot.index} to CPUs {slot.cpus}: {e}")
+        while True:
+            with self._cond:
+                while not any(self._queues.values()):
+                    self._cond.wait()
+                traffic_class, (future, fn, queued_at) = self._next()
+                INFERENCE_QUEUED.dec(pool=self.name, traffic=traffic_class)
+                slot.running = traffic_class
+            if not future.set_running_or_notify_cancel():
+                slot.running = None
+                continue
+            started = time.perf_counter()
+            INFERENCE_WAIT_SECONDS.observe(started - queued_at, pool=self.name, traffic=traffic_class)
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            elapsed = time.perf_counter() - started
+            INFERENCE_BUSY_SECONDS.inc(elapsed, pool=self.name, slot=str(slot.index), traffic=traffic_class)
+            with self._cond:
+                slot.busy_seconds += elapsed
+                slot.runs += 1
+                slot.running = None
+                self._served[traffic_class] = self._served.get(traffic_class, 0.0) + elapsed / INFERENCE_WEIGHTS.get(traffic_class, 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._cond:
+            return {
+                "slots": [
+                    {
+                        "slot": s.index,
+                        "cpus": s.cpus if INFERENCE_PIN_THREADS else None,
+                        "runs": s.runs,
+                        "busySeconds": round(s.busy_seconds, 3),
+                        "utilization": round(s.busy_seconds / max(now - s.started, 1e-9), 4) if self._threads else 0.0,
+                        "running": s.running,
+                    }
+                    for s in self.slots
+                ],
+                "queued": {t: len(q) for t, q in self._queues.items()},
+                "servedSeconds": {t: round(v * INFERENCE_WEIGHTS.get(t, 1.0), 3) for t, v in self._served.items()},
+            }
+
+
+class InferenceScheduler:
+    """Slot pools by name, created on first use with INFERENCE_SLOTS slots (1 for unlisted pools)."""
+
+    def __init__(self):
+        self._pools: Dict[str, SlotPool] = {}
+        self._lock = threading.Lock()
+        self._next_cpu = 0
+
+    def reset_after_fork(self):
+        """In a forked child: drop the parent's pools, whose slot threads do not exist here, and its locks."""
+        self._pools = {}
+        self._lock = threading.Lock()
+        _local.__dict__.clear()
+
+    def _pool(self, name: str) -> SlotPool:
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                slots = INFERENCE_SLOTS.get(name, 1)
+                cpus = []
+                for _ in range(slots):
+                    # Consecutive CPUs per slot, wrapping around when slots x threads exceeds the CPUs.
+                    cpus.append(sorted({
+                        INFERENCE_CPUS[(self._next_cpu + k) % len(INFERENCE_CPUS)]
+                        for k in range(INFERENCE_THREADS_PER_SLOT)
+                    }))
+                    self._next_cpu += INFERENCE_THREADS_PER_SLOT
+                pool = self._pools[name] = SlotPool(name, slots, cpus)
+            return pool
+
+    def run(self, pool: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on a slot of `pool` and return its result (blocks until done)."""
+        checkpoint(pool)
+        if not INFERENCE_SCHEDULER or getattr(_local, "in_slot", False):
+            return fn(*args, **kwargs)
+        # The slot runs the call in the caller's context so profiling, traffic labels and the
+        # cancellation token carry over; a call whose request was cancelled while queued is skipped.
+        context = contextvars.copy_context()
+        future = self._pool(pool).submit(lambda: context.run(_checked, pool, fn, *args, **kwargs), _traffic.get())
+        return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = dict(self._pools)
+        return {
+            "enabled": INFERENCE_SCHEDULER,
+            "threadsPerSlot": INFERENCE_THREADS_PER_SLOT,
+            "pinned": INFERENCE_PIN_THREADS,
+            "cpus": len(INFERENCE_CPUS),
+            "weights": dict(INFERENCE_WEIGHTS),
+            "pools": {name: pool.stats() for name, pool in pools.items()},
+        }
+
+
+scheduler = InferenceScheduler()
+if hasattr(os, "register_at_fork"):
+    # Forked processes (hierarchical map workers, job workers) start their own slots on first use.
+    os.register_at_fork(after_in_child=scheduler.reset_after_fork)
+run = scheduler.run
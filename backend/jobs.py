@@ -0,0 +1,572 @@
+"""Background jobs for long-running summarization.
+
+Abstractive and batch summaries of large uploads can outlive an HTTP request.
+Jobs are submitted to a persistent queue in a local SQLite database (WAL
+mode, like the shared cache tier) and run by separate worker processes with
+the existing ``summarize_document`` pipeline. Clients poll ``/api/jobs/{id}``
+or stream ``/api/jobs/{id}/events`` and fetch the result once it is done.
+
+- Ordering: higher ``priority`` first, then oldest first.
+- Per-user limit: a queued job is only claimed while its user has fewer than
+  ``JOB_USER_CONCURRENCY`` jobs running.
+- Retries: failed jobs are retried with exponential backoff, up to
+  ``JOB_MAX_ATTEMPTS`` attempts. ValueErrors (bad input) fail at once.
+- Crash safety: a running job holds a lease that its worker renews. When
+  the worker dies, the job is queued again, either when its lease runs out or
+  when the pool that started the worker (or serve.py) notices it is gone and
+  starts a replacement.
+- Retention: finished jobs and their results are removed after
+  ``JOB_RESULT_TTL_HOURS``. Uploaded batch files are removed once a job is
+  finished.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import inference
+from cancellation import CancelToken, Cancelled, scope
+from codec import dumps
+from parsers import extract_text
+from summarizer import summarize_document
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))
+JOB_DATA_DIR = os.getenv("JOB_DATA_DIR", os.path.join(".cache", "jobs"))
+# Job workers started by each app process. Off by default: every `uvicorn --workers` process
+# would start its own. serve.py starts them once for all workers (--job-workers, default 1).
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0"))
+JOB_USER_CONCURRENCY = int(os.getenv("JOB_USER_CONCURRENCY", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "5"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL_HOURS", "24")) * 3600
+JOB_LEASE = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_POLL = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+# Workers record that they are alive this often, so the API can tell whether anyone will run a job.
+JOB_WORKER_HEARTBEAT = 5.0
+# fork shares already-loaded models with the workers (see hierarchical.py).
+START_METHOD = os.getenv(
+    "JOB_START_METHOD",
+    "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+TERMINAL = ("succeeded", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised in a worker when its job was cancelled (or taken over) mid-run."""
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.utcfromtimestamp(ts).isoformat() if ts else None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """The SQLite-backed queue; safe to use from several processes at once."""
+
+    def __init__(self, path: str, data_dir: str = JOB_DATA_DIR):
+        self.path = path
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._last_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite handles must not cross a fork; reopen in every process.
+        pid = os.getpid()
+        if self._conn is None or self._conn_pid != pid:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, user_id TEXT NOT NULL, priority INTEGER NOT NULL, "
+                "status TEXT NOT NULL, payload TEXT NOT NULL, progress TEXT, result BLOB, error TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "created REAL NOT NULL, updated REAL NOT NULL, available REAL NOT NULL, "
+                "started REAL, finished REAL, expires REAL, lease_until REAL, worker_pid INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(status, priority DESC, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs(user_id, status)")
+            conn.execute("CREATE TABLE IF NOT EXISTS job_workers (pid INTEGER PRIMARY KEY, updated REAL NOT NULL)")
+            self._conn = conn
+            self._conn_pid = pid
+        return self._conn
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.data_dir, job_id)
+
+    def _remove_data(self, job_id: str):
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        user_id: str,
+        priority: int = 0,
+        job_id: Optional[str] = None,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+    ) -> Dict[str, Any]:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs (id, kind, user_id, priority, status, payload, progress, max_attempts, "
+                "created, updated, available) VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, user_id, int(priority), json.dumps(payload), json.dumps({"stage": "queued"}),
+                 max(1, max_attempts), now, now, now),
+            )
+        return self.get(job_id)
+
+    def _row(self, job_id: str, columns: str = "*") -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job (without its result), or None if unknown or expired."""
+        row = self._row(
+            job_id,
+            "id, kind, user_id, priority, status, progress, error, attempts, max_attempts, created, started, "
+            "finished, expires",
+        )
+        if row is None or (row["expires"] and row["expires"] < time.time()):
+            return None
+        return {
+            "jobId": row["id"],
+            "kind": row["kind"],
+            "userId": row["user_id"],
+            "priority": row["priority"],
+            "status": row["status"],
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "maxAttempts": row["max_attempts"],
+            "createdAt": _iso(row["created"]),
+            "startedAt": _iso(row["started"]),
+            "finishedAt": _iso(row["finished"]),
+            "expiresAt": _iso(row["expires"]),
+        }
+
+    def result(self, job_id: str) -> Tuple[Optional[str], Optional[bytes]]:
+        """(status, JSON-encoded result); the result is None unless the job succeeded."""
+        row = self._row(job_id, "status, result, expires")
+        if row is None or (row["expires"] and row["expires"] < time.time()):
+            return None, None
+        return row["status"], row["result"]
+
+    def list_jobs(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Recent jobs of one user; there is no listing across users, since it would expose their results."""
+        with self._lock:
+            ids = [r["id"] for r in self._connect().execute(
+                "SELECT id FROM jobs WHERE user_id = ? ORDER BY created DESC LIMIT ?", (user_id, limit)
+            )]
+        return [job for job in map(self.get, ids) if job is not None]
+
+    def report_worker(self, pid: int):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO job_workers (pid, updated) VALUES (?, ?)", (pid, time.time())
+            )
+
+    def remove_worker(self, pid: int):
+        with self._lock:
+            self._connect().execute("DELETE FROM job_workers WHERE pid = ?", (pid,))
+
+    def live_workers(self) -> int:
+        """Worker processes (from any pool or serve.py) that reported recently and still exist."""
+        since = time.time() - 3 * JOB_WORKER_HEARTBEAT
+        with self._lock:
+            pids = [r["pid"] for r in self._connect().execute("SELECT pid FROM job_workers WHERE updated >= ?", (since,))]
+        return sum(1 for pid in pids if _pid_alive(pid))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def claim(self, worker_pid: int, user_limit: int = JOB_USER_CONCURRENCY) -> Optional[Dict[str, Any]]:
+        """Atomically move the next eligible queued job to running and return it."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(conn, now)
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs AS j WHERE status = 'queued' AND available <= ? "
+                    "AND (SELECT COUNT(*) FROM jobs AS r WHERE r.status = 'running' AND r.user_id = j.user_id) < ? "
+                    "ORDER BY priority DESC, created LIMIT 1",
+                    (now, user_limit),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_pid = ?, "
+                        "lease_until = ?, started = ?, updated = ?, progress = ? WHERE id = ?",
+                        (worker_pid, now + JOB_LEASE, now, now, json.dumps({"stage": "running"}), row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row["id"], "kind": row["kind"], "payload": json.loads(row["payload"]), "attempt": row["attempts"] + 1}
+
+    def _requeue_expired(self, conn: sqlite3.Connection, now: float, where: str = "lease_until < ?", args=None):
+        """Queue running jobs whose worker is gone again, or fail them when out of attempts."""
+        args = (now,) if args is None else args
+        conn.execute(
+            f"UPDATE jobs SET status = 'queued', available = ?, updated = ?, worker_pid = NULL, "
+            f"error = 'worker lost' WHERE status = 'running' AND attempts < max_attempts AND {where}",
+            (now, now) + tuple(args),
+        )
+        lost = conn.execute(
+            f"SELECT id FROM jobs WHERE status = 'running' AND attempts >= max_attempts AND {where}", tuple(args)
+        ).fetchall()
+        for row in lost:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker lost', finished = ?, expires = ?, updated = ? "
+                "WHERE id = ?",
+                (now, now + JOB_RESULT_TTL, now, row["id"]),
+            )
+            self._remove_data(row["id"])
+
+    def recover(self):
+        """Requeue jobs whose worker process no longer exists (e.g. after a restart)."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            pids = [r["worker_pid"] for r in conn.execute(
+                "SELECT DISTINCT worker_pid FROM jobs WHERE status = 'running' AND worker_pid IS NOT NULL"
+            )]
+            dead = [pid for pid in pids if not _pid_alive(pid)]
+            if dead:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    marks = ",".join("?" * len(dead))
+                    self._requeue_expired(conn, now, f"worker_pid IN ({marks})", dead)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        return len(dead)
+
+    def heartbeat(self, job_id: str, worker_pid: int, progress: Optional[Dict[str, Any]] = None) -> bool:
+        """Renew the lease (and record progress); False if the job is no longer this worker's."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if progress is None:
+                cur = conn.execute(
+                    "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND status = 'running' AND worker_pid = ?",
+                    (now + JOB_LEASE, now, job_id, worker_pid),
+                )
+            else:
+                cur = conn.execute(
+                    "UPDATE jobs SET lease_until = ?, updated = ?, progress = ? "
+                    "WHERE id = ? AND status = 'running' AND worker_pid = ?",
+                    (now + JOB_LEASE, now, json.dumps(progress), job_id, worker_pid),
+                )
+            return cur.rowcount == 1
+
+    def finish(self, job_id: str, worker_pid: int, result: Any) -> bool:
+        now = time.time()
+        with self._lock:
+            cur = self._connect().execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, progress = ?, error = NULL, finished = ?, "
+                "expires = ?, updated = ?, lease_until = NULL WHERE id = ? AND status = 'running' AND worker_pid = ?",
+                (dumps(result), json.dumps({"stage": "done"}), now, now + JOB_RESULT_TTL, now, job_id, worker_pid),
+            )
+        self._remove_data(job_id)
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker_pid: int, error: str, retry: bool = True) -> str:
+        """Record a failed attempt; returns the new status (queued for a retry, or failed)."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'running' AND worker_pid = ?",
+                (job_id, worker_pid),
+            ).fetchone()
+            if row is None:
+                return "lost"
+            if retry and row["attempts"] < row["max_attempts"]:
+                delay = JOB_RETRY_DELAY * 2 ** (row["attempts"] - 1)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, available = ?, updated = ?, worker_pid = NULL, "
+                    "lease_until = NULL, progress = ? WHERE id = ?",
+                    (error, now + delay, now, json.dumps({"stage": "retrying", "retryInSeconds": delay}), job_id),
+                )
+                return "queued"
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ?, expires = ?, updated = ?, "
+                "lease_until = NULL, progress = ? WHERE id = ?",
+                (error, now, now + JOB_RESULT_TTL, now, json.dumps({"stage": "failed"}), job_id),
+            )
+        self._remove_data(job_id)
+        return "failed"
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; a running worker notices at its next progress report."""
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ?, expires = ?, updated = ?, lease_until = NULL "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (now, now + JOB_RESULT_TTL, now, job_id),
+            )
+        self._remove_data(job_id)
+        return self.get(job_id)
+
+    def purge(self, min_interval: float = 60.0) -> int:
+        """Delete finished jobs past their retention time (at most once per `min_interval`)."""
+        now = time.time()
+        if now - self._last_purge < min_interval:
+            return 0
+        self._last_purge = now
+        with self._lock:
+            conn = self._connect()
+            ids = [r["id"] for r in conn.execute("SELECT id FROM jobs WHERE expires IS NOT NULL AND expires < ?", (now,))]
+            conn.execute("DELETE FROM jobs WHERE expires IS NOT NULL AND expires < ?", (now,))
+        for job_id in ids:
+            self._remove_data(job_id)
+        return len(ids)
+
+
+job_store = JobStore(JOBS_DB_PATH)
+
+
+# Job handlers (run inside worker processes)
+def _summarize_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "speed_mode": settings.get('speedMode', 'balanced'),
+        "domain": settings.get('domain', 'general'),
+        "use_abstractive": settings.get('useAbstractive', False),
+        "hierarchical": settings.get('hierarchical'),
+    }
+
+
+def summarize_batch_documents(
+    named_texts: Iterable[Tuple[str, str]],
+    settings: Dict[str, Any],
+    on_document: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Any]:
+    """Summarize (file name, text) pairs separately or merged, as /api/summarize/batch returns them."""
+    start_time = time.time()
+    documents = []
+    for name, text in named_texts:
+        doc_result = summarize_document(text, **_summarize_settings(settings))
+        doc_result['fileName'] = name
+        doc_result['id'] = str(hash(name))
+        documents.append(doc_result)
+        if on_document:
+            on_document(len(documents))
+
+    # If merged mode, combine all documents
+    if settings.get('summaryMode') == 'merged':
+        combined_text = "\n\n".join([doc['originalText'] for doc in documents])
+        merged_result = summarize_document(combined_text, **_summarize_settings(settings))
+        merged_result['fileName'] = f"{len(documents)} Documents (Merged)"
+        merged_result['timestamp'] = datetime.utcnow().isoformat()
+        merged_result['settings'] = settings
+        merged_result['originalText'] = merged_result.get('originalText') or combined_text
+        merged_result['documents'] = documents
+        merged_result['isMerged'] = True
+        merged_result['metrics']['processingTime'] = round((time.time() - start_time) * 1000)
+        return merged_result
+    # Return separate summaries
+    for doc in documents:
+        doc['timestamp'] = datetime.utcnow().isoformat()
+        doc['settings'] = settings
+    return {"documents": documents, "isMerged": False}
+
+
+def _run_summarize(payload: Dict[str, Any], report: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    start_time = time.time()
+    settings = payload.get("settings") or {}
+    report({"stage": "summarizing"})
+    result = summarize_document(payload["text"], **_summarize_settings(settings))
+    result['fileName'] = payload.get("fileName") or "document.txt"
+    result['timestamp'] = datetime.utcnow().isoformat()
+    result['settings'] = settings
+    result['originalText'] = result.get('originalText') or payload["text"]
+    result['metrics']['processingTime'] = round((time.time() - start_time) * 1000)
+    return result
+
+
+def _run_batch(payload: Dict[str, Any], report: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    files = payload["files"]
+    total = len(files)
+
+    def parsed():
+        for i, item in enumerate(files):
+            report({"stage": "summarizing", "done": i, "total": total, "fileName": item["filename"]})
+            with open(item["path"], "rb") as f:
+                yield item["filename"], extract_text(f, item["filename"])
+
+    result = summarize_batch_documents(parsed(), payload.get("settings") or {})
+    report({"stage": "finishing", "done": total, "total": total})
+    return result
+
+
+HANDLERS: Dict[str, Callable[[Dict[str, Any], Callable[[Dict[str, Any]], None]], Any]] = {
+    "summarize": _run_summarize,
+    "batch": _run_batch,
+}
+
+
+def run_job(job: Dict[str, Any], store: JobStore = job_store):
+    """Run one claimed job, renewing its lease in the background until it ends."""
+    pid = os.getpid()
+    done = threading.Event()
+    # No timeout: a job runs as long as it holds the lease.
+    token = CancelToken(timeout=0)
+
+    def keep_lease():
+        while not done.wait(JOB_LEASE / 3):
+            if not store.heartbeat(job["id"], pid):
+                # Cancelled or taken over: stop at the pipeline's next checkpoint.
+                token.cancel("job_cancelled")
+                return
+
+    def report(progress: Dict[str, Any]):
+        if not store.heartbeat(job["id"], pid, {**progress, "attempt": job["attempt"]}):
+            raise JobCancelled(job["id"])
+
+    renewer = threading.Thread(target=keep_lease, daemon=True)
+    renewer.start()
+    try:
+        with inference.traffic("jobs"), scope(token, "jobs"):
+            result = HANDLERS[job["kind"]](job["payload"], report)
+        store.finish(job["id"], pid, result)
+    except (JobCancelled, Cancelled):
+        pass
+    except Exception as e:
+        # Bad input won't get better on a retry.
+        status = store.fail(job["id"], pid, str(e), retry=not isinstance(e, (ValueError, KeyError)))
+        print(f"Job {job['id']} attempt {job['attempt']} failed ({e}); now {status}")
+    finally:
+        done.set()
+
+
+def work(stop: Optional[Any] = None, store: JobStore = job_store, poll: float = JOB_POLL):
+    """Worker process loop: claim, run, repeat until `stop` (an Event) is set."""
+    # Die at once on shutdown; an interrupted job is queued again by recover().
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    stop = stop or threading.Event()
+    pid = os.getpid()
+
+    def keep_alive():
+        while True:
+            try:
+                store.report_worker(pid)
+            except sqlite3.Error as e:
+                print(f"Job queue unavailable: {e}")
+            if stop.wait(JOB_WORKER_HEARTBEAT):
+                return
+
+    threading.Thread(target=keep_alive, name="sumrify-job-heartbeat", daemon=True).start()
+    try:
+        _work(stop, store, poll, pid)
+    finally:
+        store.remove_worker(pid)
+
+
+def _work(stop: Any, store: JobStore, poll: float, pid: int):
+    while not stop.is_set():
+        try:
+            job = store.claim(pid)
+        except sqlite3.Error as e:
+            print(f"Job queue unavailable: {e}")
+            job = None
+        if job is None:
+            store.purge()
+            stop.wait(poll)
+            continue
+        run_job(job, store)
+
+
+class WorkerPool:
+    """Job worker processes started by the API process (see serve.py for pre-fork mode).
+
+    A supervisor thread replaces workers that die (OOM, a crash in native code) and
+    queues their jobs again, as serve.py does for the workers it forks.
+    """
+
+    def __init__(self, workers: int, store: JobStore = job_store, check_interval: float = 1.0):
+        self.workers = workers
+        self.store = store
+        self.check_interval = check_interval
+        self._ctx = multiprocessing.get_context(START_METHOD)
+        self._stop = self._ctx.Event()
+        self.processes: List[multiprocessing.Process] = []
+        self._started: Dict[int, float] = {}
+        self._supervisor: Optional[threading.Thread] = None
+
+    def _spawn(self) -> multiprocessing.Process:
+        # Not daemonic: hierarchical summaries start process pools of their own.
+        proc = self._ctx.Process(target=work, args=(self._stop,), name="sumrify-job-worker")
+        proc.start()
+        self._started[proc.pid] = time.time()
+        return proc
+
+    def start(self):
+        self.store.recover()
+        self.processes = [self._spawn() for _ in range(self.workers)]
+        self._supervisor = threading.Thread(target=self._supervise, name="sumrify-job-supervisor", daemon=True)
+        self._supervisor.start()
+        print(f"✓ Started {len(self.processes)} job worker(s)")
+
+    def _supervise(self):
+        while not self._stop.wait(self.check_interval):
+            for i, proc in enumerate(self.processes):
+                if proc.is_alive() or self._stop.is_set():
+                    continue
+                proc.join()  # reaped, so recover() sees its pid as gone
+                started = self._started.pop(proc.pid, 0.0)
+                print(f"Job worker {proc.pid} exited with code {proc.exitcode}; restarting")
+                try:
+                    self.store.recover()
+                except sqlite3.Error as e:
+                    print(f"Job queue unavailable: {e}")
+                # Avoid a tight crash loop if a worker dies right after starting.
+                if time.time() - started < 1:
+                    self._stop.wait(1)
+                if not self._stop.is_set():
+                    self.processes[i] = self._spawn()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+        deadline = time.time() + timeout
+        for proc in self.processes:
+            proc.join(max(0.0, deadline - time.time()))
+            if proc.is_alive():
+                # Interrupted jobs are queued again by the next recover().
+                proc.terminate()
+                proc.join()
+        self.processes = []
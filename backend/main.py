@@ -1,16 +1,36 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, Form, HTTPException, Body, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 import uvicorn
+import asyncio
+import json
 import os
 import io
+import shutil
 import time
+import uuid
 from datetime import datetime
-from parsers import parse_files
+from parsers import extract_text
 from summarizer import summarize_document
 from utils import cache, get_history, export_summary, chat_with_document
+from shared_cache import shared_cache
+import metrics
+from profiling import parse_profile_options, profile_request
+from compact import compact_result, document_id, load_document, sentence_page, store_document
+from uploads import receive_uploads
+from incremental import DocumentLost, create_document, delete_document, get_document
+from codec import CompressionMiddleware, FastJSONResponse, RequestDecompressionMiddleware
+from admission import admission, body_bytes, client_id, request_cost
+from cancellation import Cancelled, cancel_on_disconnect, checkpoint, scope as cancel_scope
+import inference
+import jobs
+from models import model_registry
+from embedding_store import embedding_store
+from idf_tables import idf_tables
+from jobs import job_store, summarize_batch_documents
 
 
 def _parse_cors_origins(value: str | None) -> list[str]:
@@ -25,7 +45,8 @@ def _parse_cors_origins(value: str | None) -> list[str]:
 app = FastAPI(
     title="Sumrify: AI Document Summarizer API",
     description="Backend API for AI-powered document summarization",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -35,6 +56,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestDecompressionMiddleware)
+app.add_middleware(CompressionMiddleware)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Per-endpoint latency, request size and in-progress gauge for /metrics."""
+    endpoint = request.url.path if request.url.path.startswith("/api/") else "other"
+    size = request.headers.get("content-length")
+    if size and size.isdigit():
+        metrics.REQUEST_BYTES.observe(int(size), endpoint=endpoint)
+    metrics.IN_PROGRESS.inc(endpoint=endpoint)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.IN_PROGRESS.dec(endpoint=endpoint)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=str(status))
+        # Publish worker metrics for cross-worker scrapes at most once per second.
+        shared_cache.report_worker(min_interval=1.0)
 
 # Pydantic models for request validation
 class SummarizeRequest(BaseModel):
@@ -46,6 +89,20 @@ class ChatRequest(BaseModel):
     message: str
     documentText: str
     conversationHistory: List[Dict[str, str]] = []
+    sessionId: Optional[str] = None
+    settings: Dict[str, Any] = {}
+
+class JobRequest(BaseModel):
+    text: str
+    settings: Dict[str, Any] = {}
+    fileName: Optional[str] = "document.txt"
+    priority: int = 0
+    userId: Optional[str] = None
+
+class IncrementalRequest(BaseModel):
+    text: str = ""
+    flush: bool = False
+    settings: Dict[str, Any] = {}
 
 class HistoryItem(BaseModel):
     id: str
@@ -69,6 +126,20 @@ def root():
             "GET /api/history": "Get summarization history",
             "POST /api/history": "Add to history",
             "POST /api/export": "Export summary",
+            "GET /api/documents/{id}/text": "Text of a compact summarize result",
+            "GET /api/documents/{id}/sentences": "Paginated sentence scores of a compact result",
+            "POST /api/incremental": "Start an append-only document",
+            "POST /api/incremental/{id}/append": "Append text and get the updated summary",
+            "GET /api/incremental/{id}": "Current summary of an append-only document",
+            "POST /api/jobs": "Queue a summarize job",
+            "POST /api/jobs/batch": "Queue a batch summarize job",
+            "GET /api/jobs/{id}": "Job status and progress",
+            "GET /api/jobs/{id}/events": "Job progress as server-sent events",
+            "GET /api/jobs/{id}/result": "Result of a finished job",
+            "GET /api/models": "Loaded models, their memory and the RAM budget",
+            "GET /api/admission": "Rate limits, slots and queued requests per client",
+            "GET /api/workers": "Per-worker memory and cache hit rate",
+            "GET /metrics": "Prometheus metrics",
             "GET /health": "Health check"
         }
     }
@@ -78,25 +149,56 @@ def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 # Main summarization endpoint
+def _profiled(profile_options, pipeline: str, fn, *args, cancel=None, **kwargs):
+    """Run `fn` for a `pipeline` request (also its inference traffic class) under optional profiling.
+
+    Called through run_in_threadpool: the stack sampler watches the thread that does the work.
+    With a `cancel` token, `fn` stops at its next checkpoint once the token is cancelled.
+    """
+    with profile_request(profile_options, pipeline) as prof, inference.traffic(pipeline), cancel_scope(cancel, pipeline):
+        return fn(*args, **kwargs), prof
+
 @app.post("/api/summarize")
-async def summarize(request: SummarizeRequest):
+async def summarize(request: SummarizeRequest, http_request: Request):
     """
     Summarize a single document using extractive + optional abstractive methods.
     Compatible with the frontend's SummarizationResult type.
+    Set `settings.profile` or the X-Sumrify-Profile header for a stage breakdown.
+    Set `settings.deadlineMs` to degrade stages as needed to answer within a latency budget.
     """
     start_time = time.time()
+    deadline_ms = request.settings.get('deadlineMs')
+    if deadline_ms is not None and (
+        isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0
+    ):
+        raise HTTPException(status_code=400, detail="settings.deadlineMs must be a positive number of milliseconds.")
+    if not request.text or len(request.text.strip()) == 0:
+        raise HTTPException(status_code=400, detail="No text provided.")
+    client = client_id(http_request)
+    cost = request_cost(len(request.text), request.settings)
+    admission.charge(client, cost)
     try:
-        if not request.text or len(request.text.strip()) == 0:
-            raise HTTPException(status_code=400, detail="No text provided.")
-        
         settings = request.settings
+        profile_options = parse_profile_options(http_request.headers.get("x-sumrify-profile"), settings.get('profile'))
         # Summarize using backend logic
-        result = summarize_document(
-            request.text,
-            speed_mode=settings.get('speedMode', 'balanced'),
-            domain=settings.get('domain', 'general'),
-            use_abstractive=settings.get('useAbstractive', False)
-        )
+        # Off the event loop so chat and other requests keep flowing; model calls queue in inference.py.
+        # The work stops between stages if the client disconnects or REQUEST_TIMEOUT passes.
+        async with cancel_on_disconnect(http_request) as cancel, admission.slot(client, cost):
+            result, prof = await run_in_threadpool(
+                _profiled,
+                profile_options,
+                "summarize",
+                summarize_document,
+                request.text,
+                speed_mode=settings.get('speedMode', 'balanced'),
+                domain=settings.get('domain', 'general'),
+                use_abstractive=settings.get('useAbstractive', False),
+                hierarchical=settings.get('hierarchical'),
+                deadline_ms=deadline_ms,
+                cancel=cancel
+            )
+        if prof is not None:
+            result['metrics']['profile'] = prof.to_dict()
         
         # Add metadata to match frontend types
         result['fileName'] = request.fileName
@@ -109,97 +211,403 @@ async def summarize(request: SummarizeRequest):
         # Cache result
         cache.add(result)
         
-        return JSONResponse(result)
+        if settings.get('responseFormat') == 'compact':
+            # Offsets instead of sentence copies; text/sentences fetchable via /api/documents.
+            doc_id = document_id(result, settings)
+            store_document(doc_id, result)
+            include_text = settings.get('includeText', True) is not False
+            return FastJSONResponse(compact_result(result, doc_id, include_text=include_text))
+        return FastJSONResponse(result)
+    except HTTPException:
+        raise
+    except Cancelled as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Batch summarization for multiple documents
-@app.post("/api/summarize/batch")
-async def summarize_batch(
-    files: List[UploadFile] = File(...),
-    settings: str = Form(...)
-):
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files", "settings"],
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                        "settings": {"type": "string", "description": "JSON-encoded settings"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+def _batch_settings(uploads) -> Dict[str, Any]:
+    """The settings of a batch upload form, or 422."""
+    if not uploads.files:
+        raise HTTPException(status_code=422, detail="At least one file is required.")
+    if "settings" not in uploads.fields:
+        raise HTTPException(status_code=422, detail="Missing settings form field.")
+    try:
+        settings_dict = json.loads(uploads.fields["settings"])
+    except ValueError:
+        settings_dict = None
+    if not isinstance(settings_dict, dict):
+        raise HTTPException(status_code=422, detail="Invalid settings field.")
+    return settings_dict
+
+@app.post("/api/summarize/batch", openapi_extra=BATCH_UPLOAD_OPENAPI)
+async def summarize_batch(request: Request):
     """
     Summarize multiple documents. Can return separate or merged summaries.
+    Uploads are streamed to spooled temp files with the limits from uploads.py.
     """
-    import json
-    settings_dict = json.loads(settings)
-    
-    start_time = time.time()
-    try:
-        documents = []
-        for file in files:
-            text = await parse_files([file], None)
-            doc_result = summarize_document(
-                text,
-                speed_mode=settings_dict.get('speedMode', 'balanced'),
-                domain=settings_dict.get('domain', 'general'),
-                use_abstractive=settings_dict.get('useAbstractive', False)
-            )
-            doc_result['fileName'] = file.filename
-            doc_result['id'] = str(hash(file.filename))
-            documents.append(doc_result)
-        
-        # If merged mode, combine all documents
-        if settings_dict.get('summaryMode') == 'merged':
-            combined_text = "\n\n".join([doc['originalText'] for doc in documents])
-            merged_result = summarize_document(
-                combined_text,
-                speed_mode=settings_dict.get('speedMode', 'balanced'),
-                domain=settings_dict.get('domain', 'general'),
-                use_abstractive=settings_dict.get('useAbstractive', False)
-            )
-            merged_result['fileName'] = f"{len(files)} Documents (Merged)"
-            merged_result['timestamp'] = datetime.utcnow().isoformat()
-            merged_result['settings'] = settings_dict
-            merged_result['originalText'] = merged_result.get('originalText') or combined_text
-            merged_result['documents'] = documents
-            merged_result['isMerged'] = True
-            merged_result['metrics']['processingTime'] = round((time.time() - start_time) * 1000)
-            return JSONResponse(merged_result)
-        else:
-            # Return separate summaries
-            for doc in documents:
-                doc['timestamp'] = datetime.utcnow().isoformat()
-                doc['settings'] = settings_dict
-            return JSONResponse({"documents": documents, "isMerged": False})
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Charged before the upload is read, and again once the settings are known.
+    client, nbytes = client_id(request), body_bytes(request)
+    cost = request_cost(nbytes)
+    admission.charge(client, cost, "batch")
+    with await receive_uploads(request) as uploads:
+        files = uploads.files
+        try:
+            settings_dict = _batch_settings(uploads)
+        except HTTPException:
+            # Rejected before any work: give the charge back.
+            admission.refund(client, cost)
+            raise
+        extra = request_cost(nbytes, settings_dict) - cost
+        if extra > 0:
+            admission.charge(client, extra, "batch", force=True)
+            cost += extra
+
+        def parsed():
+            for file in files:
+                checkpoint("parse")
+                text = extract_text(file.file, file.filename or "")
+                # Release each upload (and its temp file) as soon as it is parsed.
+                file.close()
+                yield file.filename, text
+
+        try:
+            async with cancel_on_disconnect(request) as cancel, admission.slot(client, cost, "batch"):
+                result, _ = await run_in_threadpool(
+                    _profiled, None, "batch", summarize_batch_documents, parsed(), settings_dict, cancel=cancel
+                )
+            return FastJSONResponse(result)
+        except HTTPException:
+            raise
+        except Cancelled as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 # Chat with document
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Interactive chat about the document content.
     Uses simple keyword extraction and similarity matching.
     """
+    client = client_id(http_request)
+    cost = request_cost(len(request.documentText) + len(request.message))
+    admission.charge(client, cost)
     try:
-        response = chat_with_document(
-            request.message,
-            request.documentText,
-            request.conversationHistory
+        profile_options = parse_profile_options(
+            http_request.headers.get("x-sumrify-profile"), request.settings.get('profile')
         )
-        return JSONResponse({
+        async with admission.slot(client, cost):
+            response, prof = await run_in_threadpool(
+                _profiled,
+                profile_options,
+                "chat",
+                chat_with_document,
+                request.message,
+                request.documentText,
+                request.conversationHistory,
+                request.sessionId or http_request.headers.get("x-session-id")
+            )
+        payload = {
             "role": "assistant",
-            "content": response,
+            "content": response["content"],
+            "provider": response["provider"],
+            "usage": response["usage"],
             "timestamp": datetime.utcnow().isoformat()
-        })
+        }
+        if prof is not None:
+            payload["metrics"] = {"profile": prof.to_dict()}
+        return FastJSONResponse(payload)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# On-demand parts of compact summarize responses
+@app.get("/api/documents/{doc_id}/text")
+def document_text(doc_id: str):
+    """Cleaned text that compact responses' sentence offsets point into."""
+    doc = load_document(doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired.")
+    return PlainTextResponse(doc["originalText"])
+
+@app.get("/api/documents/{doc_id}/sentences")
+def document_sentences(doc_id: str, offset: int = 0, limit: int = 500):
+    """Paginated sentenceScores (sentence, score, index) for a compact response."""
+    doc = load_document(doc_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired.")
+    return FastJSONResponse(sentence_page(doc, offset, limit))
+
+# Incremental documents (live transcripts, logs)
+def _incremental_document(doc_id: str):
+    try:
+        doc = get_document(doc_id)
+    except DocumentLost:
+        raise HTTPException(status_code=410, detail="Incremental document is no longer complete in the cache; re-upload the document.")
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Incremental document not found or expired.")
+    return doc
+
+def _incremental_summary(doc, settings: Dict[str, Any]) -> Dict[str, Any]:
+    return doc.summarize(
+        speed_mode=settings.get('speedMode', 'balanced'),
+        domain=settings.get('domain', 'general'),
+        full_scores=bool(settings.get('fullScores', False)),
+    )
+
+def _incremental_create(text: str, flush: bool, settings: Dict[str, Any]) -> Dict[str, Any]:
+    doc = create_document(text)
+    if flush:
+        with doc.lock:
+            doc.append("", flush=True)
+    return _incremental_summary(doc, settings)
+
+def _incremental_append(doc_id: str, text: str, flush: bool, settings: Dict[str, Any]) -> Dict[str, Any]:
+    doc = _incremental_document(doc_id)
+    with doc.lock:
+        doc.append(text, flush=flush)
+    return _incremental_summary(doc, settings)
+
+def _incremental_current(doc_id: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    return _incremental_summary(_incremental_document(doc_id), settings)
+
+async def _incremental_call(http_request: Request, nbytes: int, settings: Dict[str, Any], fn, *args):
+    """Run incremental work the way /api/summarize runs: charged, in an admission slot, stopped on disconnect."""
+    start_time = time.time()
+    client = client_id(http_request)
+    cost = request_cost(nbytes, settings)
+    admission.charge(client, cost)
+    try:
+        async with cancel_on_disconnect(http_request) as cancel, admission.slot(client, cost):
+            result, _ = await run_in_threadpool(_profiled, None, "incremental", fn, *args, cancel=cancel)
+    except Cancelled as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    result['metrics']['processingTime'] = round((time.time() - start_time) * 1000)
+    return FastJSONResponse(result)
+
+@app.post("/api/incremental")
+async def incremental_create(request: IncrementalRequest, http_request: Request):
+    """Start an append-only document; optional initial text. Returns its documentId and summary."""
+    return await _incremental_call(
+        http_request, len(request.text), request.settings,
+        _incremental_create, request.text, request.flush, request.settings,
+    )
+
+@app.post("/api/incremental/{doc_id}/append")
+async def incremental_append(doc_id: str, request: IncrementalRequest, http_request: Request):
+    """Append text (only new sentences are processed) and return the current summary."""
+    return await _incremental_call(
+        http_request, len(request.text), request.settings,
+        _incremental_append, doc_id, request.text, request.flush, request.settings,
+    )
+
+@app.get("/api/incremental/{doc_id}")
+async def incremental_summary(http_request: Request, doc_id: str, speedMode: str = "balanced", domain: str = "general", fullScores: bool = False):
+    """Current summary of an incremental document."""
+    settings = {"speedMode": speedMode, "domain": domain, "fullScores": fullScores}
+    return await _incremental_call(http_request, 0, settings, _incremental_current, doc_id, settings)
+
+@app.delete("/api/incremental/{doc_id}")
+def incremental_delete(doc_id: str):
+    if not delete_document(doc_id):
+        raise HTTPException(status_code=404, detail="Incremental document not found or expired.")
+    return {"status": "success", "id": doc_id}
+
+# Worker stats (memory and shared cache tier)
+@app.get("/api/workers")
+def workers_endpoint():
+    """Report RSS/PSS and cache hit rate for every worker sharing the cache tier."""
+    return FastJSONResponse({"workers": shared_cache.worker_stats()})
+
+# Background jobs (see jobs.py)
+job_pool: Optional[jobs.WorkerPool] = None
+
+@app.on_event("startup")
+def start_job_workers():
+    """Start JOB_WORKERS worker processes in this app process (default 0; serve.py runs them itself)."""
+    global job_pool
+    if jobs.JOB_WORKERS > 0:
+        job_pool = jobs.WorkerPool(jobs.JOB_WORKERS)
+        job_pool.start()
+    elif not job_store.live_workers():
+        # serve.py's job workers may still be starting; under plain uvicorn nobody runs jobs.
+        print("⚠ No job workers running yet (JOB_WORKERS=0); /api/jobs returns 503 until one reports in")
+
+@app.on_event("startup")
+def load_idf_tables():
+    """Map the IDF tables (see idf_tables.py) before the first request."""
+    idf_tables.preload()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    if job_pool is not None:
+        job_pool.stop()
+
+def _job_user(user_id: Optional[str], http_request: Request) -> str:
+    return user_id or http_request.headers.get("x-user-id") or (http_request.client.host if http_request.client else "anonymous")
+
+def _require_job_workers():
+    """503 instead of queueing jobs that no worker process would ever run."""
+    if job_pool is None and not job_store.live_workers():
+        raise HTTPException(
+            status_code=503,
+            detail="No job workers are running; start the server with serve.py or set JOB_WORKERS.",
+        )
+
+def _job_or_404(job_id: str) -> Dict[str, Any]:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    return job
+
+@app.post("/api/jobs", status_code=202)
+def submit_job(request: JobRequest, http_request: Request):
+    """Queue a summarize job; poll /api/jobs/{jobId} and fetch /api/jobs/{jobId}/result."""
+    if not request.text or len(request.text.strip()) == 0:
+        raise HTTPException(status_code=400, detail="No text provided.")
+    _require_job_workers()
+    admission.charge(client_id(http_request, request.userId), request_cost(len(request.text), request.settings), "batch")
+    payload = {"text": request.text, "settings": request.settings, "fileName": request.fileName}
+    job = job_store.submit("summarize", payload, _job_user(request.userId, http_request), request.priority)
+    return FastJSONResponse(job, status_code=202)
+
+@app.post("/api/jobs/batch", status_code=202, openapi_extra=BATCH_UPLOAD_OPENAPI)
+async def submit_batch_job(request: Request):
+    """Queue a batch job; takes the /api/summarize/batch form plus optional `priority` and `userId` fields."""
+    _require_job_workers()
+    client, nbytes = client_id(request), body_bytes(request)
+    admission.charge(client, request_cost(nbytes), "batch")
+    with await receive_uploads(request) as uploads:
+        try:
+            settings_dict = _batch_settings(uploads)
+            try:
+                priority = int(uploads.fields.get("priority", 0))
+            except ValueError:
+                raise HTTPException(status_code=422, detail="Invalid priority field.")
+        except HTTPException:
+            admission.refund(client, request_cost(nbytes))
+            raise
+        extra = request_cost(nbytes, settings_dict) - request_cost(nbytes)
+        if extra > 0:
+            admission.charge(client, extra, "batch", force=True)
+        # Workers run in other processes (and maybe after a restart), so keep the uploads on disk.
+        job_id = uuid.uuid4().hex
+        job_dir = job_store.job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        files = []
+        for i, upload in enumerate(uploads.files):
+            path = os.path.join(job_dir, str(i))
+            upload.file.seek(0)
+            with open(path, "wb") as out:
+                await run_in_threadpool(shutil.copyfileobj, upload.file, out, 1024 * 1024)
+            files.append({"path": path, "filename": upload.filename})
+    user = _job_user(uploads.fields.get("userId"), request)
+    job = job_store.submit("batch", {"files": files, "settings": settings_dict}, user, priority, job_id=job_id)
+    return FastJSONResponse(job, status_code=202)
+
+@app.get("/api/jobs")
+def list_jobs(http_request: Request, userId: Optional[str] = None, limit: int = 50):
+    """The caller's recent jobs (`userId`, else as for submission), plus queue counts by status."""
+    user = _job_user(userId, http_request)
+    return FastJSONResponse({"jobs": job_store.list_jobs(user, min(max(limit, 1), 500)), "counts": job_store.stats()})
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status, progress, attempts and error of a job."""
+    return FastJSONResponse(_job_or_404(job_id))
+
+@app.get("/api/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """The summarize/batch response of a succeeded job (409 while it is not finished)."""
+    status, result = job_store.result(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired.")
+    if status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {status}.")
+    # Stored as encoded JSON; no need to decode and re-encode it.
+    return Response(content=result, media_type="application/json")
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events with the job status on every change, ending when the job finishes."""
+    _job_or_404(job_id)
+
+    async def stream():
+        last = None
+        while not await request.is_disconnected():
+            job = await run_in_threadpool(job_store.get, job_id)
+            if job is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            if job != last:
+                yield f"data: {json.dumps(job)}\n\n"
+                last = job
+            if job["status"] in jobs.TERMINAL:
+                return
+            await asyncio.sleep(jobs.JOB_POLL)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job (a running one stops at its next progress update)."""
+    _job_or_404(job_id)
+    return FastJSONResponse(job_store.cancel(job_id))
+
+@app.get("/api/models")
+def models_endpoint():
+    """Models loaded in this worker, their resident size, the model RAM budget, the embedding store and the IDF tables."""
+    return FastJSONResponse({**model_registry.stats(), "embeddingStore": embedding_store.stats(), "idfTables": idf_tables.stats()})
+
+@app.get("/api/admission")
+def admission_endpoint():
+    """Admission control in this worker: slots per priority class, queued requests and client buckets."""
+    return FastJSONResponse(admission.stats())
+
+@app.get("/api/inference")
+def inference_endpoint():
+    """Inference slots in this worker: utilization per slot and queued calls per traffic class."""
+    return FastJSONResponse(inference.scheduler.stats())
+
+# Prometheus metrics (merged across workers when the cache tier is shared)
+@app.get("/metrics")
+def metrics_endpoint():
+    snapshots = [w.get("metrics") for w in shared_cache.worker_stats()]
+    return PlainTextResponse(metrics.render(metrics.merge(snapshots)), media_type="text/plain; version=0.0.4")
+
 # History management
 @app.get("/api/history")
 def get_history_endpoint(userId: Optional[str] = None):
     """Get summarization history, optionally filtered by userId."""
     history_items = get_history(userId)
-    return JSONResponse(history_items)
+    return FastJSONResponse(history_items)
 
 @app.post("/api/history")
 async def add_history(item: HistoryItem):
     """Add an item to history."""
     cache.add_to_history(item.dict())
-    return JSONResponse({"status": "success", "id": item.id})
+    return FastJSONResponse({"status": "success", "id": item.id})
 
 # Export functionality
 @app.post("/api/export")
@@ -0,0 +1,277 @@
+"""Lightweight Prometheus metrics for the API (no client library needed).
+
+Counters, gauges and histograms are plain dicts guarded by a lock, so an
+observation costs about a microsecond and instrumentation can stay on in
+production. ``render()`` produces the Prometheus text exposition format; when
+several pre-forked workers share the cache tier, their snapshots are merged so
+one scrape of ``/metrics`` covers the whole host.
+"""
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import profiling
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+COUNT_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = {json.dumps(list(k)): (list(v) if isinstance(v, list) else v) for k, v in self._values.items()}
+        return {"type": self.type_name, "help": self.documentation, "labels": list(self.labelnames), "samples": samples}
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Layout: one count per bucket (non-cumulative), then +Inf, sum, count.
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = [0] * (len(self.buckets) + 1) + [0.0, 0]
+                self._values[key] = row
+            row[idx] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        snap = super().snapshot()
+        snap["buckets"] = list(self.buckets)
+        return snap
+
+
+REGISTRY: List[_Metric] = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+STAGE_SECONDS = _register(Histogram(
+    "sumrify_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    ("pipeline", "stage"),
+))
+REQUEST_SECONDS = _register(Histogram(
+    "sumrify_request_duration_seconds",
+    "End-to-end HTTP request latency.",
+    ("endpoint", "status"),
+))
+REQUEST_BYTES = _register(Histogram(
+    "sumrify_request_bytes",
+    "Request body size in bytes.",
+    ("endpoint",),
+    buckets=SIZE_BUCKETS,
+))
+DOCUMENT_SENTENCES = _register(Histogram(
+    "sumrify_document_sentences",
+    "Sentences per summarized document after cleaning.",
+    buckets=COUNT_BUCKETS,
+))
+CACHE_REQUESTS = _register(Counter(
+    "sumrify_cache_requests_total",
+    "Cache lookups by namespace and result (hit/miss).",
+    ("namespace", "result"),
+))
+FALLBACKS = _register(Counter(
+    "sumrify_fallbacks_total",
+    "Times a stage fell back to a cheaper or local path.",
+    ("component", "reason"),
+))
+IN_PROGRESS = _register(Gauge(
+    "sumrify_requests_in_progress",
+    "Requests currently queued or running, per endpoint.",
+    ("endpoint",),
+))
+MODELS_LOADED = _register(Gauge(
+    "sumrify_models_loaded",
+    "Models resident in memory (summed across workers).",
+    ("model",),
+))
+INFERENCE_WAIT_SECONDS = _register(Histogram(
+    "sumrify_inference_wait_seconds",
+    "Time model calls waited for an inference slot.",
+    ("pool", "traffic"),
+))
+INFERENCE_BUSY_SECONDS = _register(Counter(
+    "sumrify_inference_busy_seconds_total",
+    "Time each inference slot spent running model calls.",
+    ("pool", "slot", "traffic"),
+))
+INFERENCE_QUEUED = _register(Gauge(
+    "sumrify_inference_queued",
+    "Model calls waiting for an inference slot.",
+    ("pool", "traffic"),
+))
+
+ADMISSION_DECISIONS = _register(Counter(
+    "sumrify_admission_decisions_total",
+    "Admission decisions (admitted, queued, rate_limited, queue_timeout) per priority class.",
+    ("class", "decision"),
+))
+ADMISSION_WAIT_SECONDS = _register(Histogram(
+    "sumrify_admission_wait_seconds",
+    "Time admitted requests waited for a slot.",
+    ("class",),
+))
+ADMISSION_QUEUED = _register(Gauge(
+    "sumrify_admission_queued",
+    "Requests waiting for a slot, per priority class.",
+    ("class",),
+))
+ADMISSION_RUNNING = _register(Gauge(
+    "sumrify_admission_running",
+    "Requests holding a slot, per priority class.",
+    ("class",),
+))
+CLIENT_REQUESTS = _register(Counter(
+    "sumrify_client_requests_total",
+    "Requests per client and rate-limit decision.",
+    ("client", "decision"),
+))
+CLIENT_COST = _register(Counter(
+    "sumrify_client_cost_units_total",
+    "Estimated cost units charged per client and priority class.",
+    ("client", "class"),
+))
+
+CANCELLED_REQUESTS = _register(Counter(
+    "sumrify_cancelled_requests_total",
+    "Requests and jobs stopped at a cancellation checkpoint, by reason and the stage they did not start.",
+    ("pipeline", "reason", "stage"),
+))
+CANCEL_STOP_SECONDS = _register(Histogram(
+    "sumrify_cancel_stop_seconds",
+    "Time from cancellation to the work stopping at its next checkpoint.",
+    ("pipeline",),
+))
+
+
+@contextmanager
+def timed(pipeline: str, stage: str):
+    """Observe the duration of a block into ``sumrify_stage_duration_seconds``.
+
+    When the current request is profiled the stage is also recorded there.
+    """
+    prof = profiling.current()
+    started = time.perf_counter()
+    try:
+        if prof is None:
+            yield
+        else:
+            with prof.stage(pipeline, stage):
+                yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, pipeline=pipeline, stage=stage)
+
+
+def snapshot() -> Dict[str, Any]:
+    """JSON-serializable state of every metric in this process."""
+    return {m.name: m.snapshot() for m in REGISTRY}
+
+
+def merge(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum samples of the same metric and labels across worker snapshots."""
+    merged: Dict[str, Any] = {}
+    for snap in snapshots:
+        for name, metric in (snap or {}).items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for key, value in metric.get("samples", {}).items():
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] = current + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: List[str], values: List[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render(state: Optional[Dict[str, Any]] = None) -> str:
+    """Render a (possibly merged) snapshot in Prometheus text format."""
+    state = state if state is not None else snapshot()
+    lines: List[str] = []
+    for name, metric in state.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labels"]
+        for key, value in sorted(metric["samples"].items()):
+            values = json.loads(key)
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_fmt(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ["+Inf"], value[:-2]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _fmt(bound)
+                lines.append(f"{name}_bucket{_labels(names, values, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_fmt(value[-2])}")
+            lines.append(f"{name}_count{_labels(names, values)} {value[-1]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,250 @@
+"""Model registry: local model directories, per-mode models and a RAM budget.
+
+Models are loaded on first use through a loader registered per kind
+(embedding, summarization, keybert) and kept in an LRU. Each entry records
+its resident size: parameter and buffer bytes for torch models, otherwise
+the growth of process RSS while it loaded. When ``MODEL_RAM_BUDGET_MB`` is
+exceeded, the least recently used models are dropped. A model is only
+dropped while no request holds it through ``use()``, so the budget can be
+exceeded briefly while every loaded model is in use.
+
+Names are resolved against ``MODEL_DIR`` first: ``<dir>/<name>``, then
+``<dir>/<org>__<model>``, then ``<dir>/<model>``. With
+``MODEL_LOCAL_ONLY=True`` a name that is not found there is an error instead
+of a Hub download. ``SUMMARIZATION_MODELS`` maps speed modes and domains to
+summarization models, for example
+``fast=sshleifer/distilbart-cnn-6-6,balanced=sshleifer/distilbart-cnn-12-6,legal/thorough=nsi319/legal-pegasus``.
+Lookup order is ``domain/mode``, ``domain``, ``mode``, then ``HF_MODEL``.
+"""
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from metrics import MODELS_LOADED
+from shared_cache import process_memory
+
+MB = 1024 * 1024
+MODEL_DIR = os.getenv("MODEL_DIR") or None
+MODEL_LOCAL_ONLY = os.getenv("MODEL_LOCAL_ONLY", "False").lower() in {"1", "true", "yes"}
+MODEL_RAM_BUDGET_BYTES = int(float(os.getenv("MODEL_RAM_BUDGET_MB", "0")) * MB)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+SUMMARIZATION_MODEL = os.getenv("HF_MODEL", "facebook/bart-large-cnn")
+
+Key = Tuple[str, str]
+# loader(name, local path or hub id, required models) -> model
+Loader = Callable[[str, str, List[Any]], Any]
+
+
+def parse_model_map(spec: str) -> Dict[str, str]:
+    """"fast=a,legal/thorough=b" -> {"fast": "a", "legal/thorough": "b"}."""
+    mapping: Dict[str, str] = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            selector, name = item.split("=", 1)
+            if selector.strip() and name.strip():
+                mapping[selector.strip().lower()] = name.strip()
+    return mapping
+
+
+SUMMARIZATION_MODELS = parse_model_map(os.getenv("SUMMARIZATION_MODELS", ""))
+
+
+def summarization_model_for(speed_mode: str = "balanced", domain: str = "general") -> str:
+    speed_mode, domain = (speed_mode or "").lower(), (domain or "").lower()
+    for selector in (f"{domain}/{speed_mode}", domain, speed_mode):
+        if selector in SUMMARIZATION_MODELS:
+            return SUMMARIZATION_MODELS[selector]
+    return SUMMARIZATION_MODEL
+
+
+def resolve_path(name: str) -> str:
+    """Local directory for `name` under MODEL_DIR, else `name` itself (a Hub id)."""
+    if os.path.isdir(name):
+        return name
+    if MODEL_DIR:
+        for candidate in (name, name.replace("/", "__"), name.rsplit("/", 1)[-1]):
+            path = os.path.join(MODEL_DIR, candidate)
+            if os.path.isdir(path):
+                return path
+    if MODEL_LOCAL_ONLY:
+        raise FileNotFoundError(f"Model {name!r} not found under MODEL_DIR={MODEL_DIR!r} (MODEL_LOCAL_ONLY is set)")
+    return name
+
+
+def model_bytes(model: Any) -> Optional[int]:
+    """Parameter + buffer bytes of a torch model, a pipeline's model, or None."""
+    for candidate in (model, getattr(model, "model", None)):
+        if candidate is not None and hasattr(candidate, "parameters") and hasattr(candidate, "buffers"):
+            tensors = list(candidate.parameters()) + list(candidate.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+    return None
+
+
+class _Entry:
+    def __init__(self, kind: str, name: str, model: Any, size: int, requires: List["_Entry"]):
+        self.kind = kind
+        self.name = name
+        self.model = model
+        self.bytes = size
+        self.requires = requires
+        self.refs = 0
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+
+
+class ModelRegistry:
+    """Loaded models by (kind, name), evicted least recently used first beyond `budget_bytes`."""
+
+    def __init__(self, budget_bytes: int = MODEL_RAM_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self._loaders: Dict[str, Tuple[Loader, Callable[[str], List[Key]]]] = {}
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Key, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+        self.failures = 0
+
+    def register(self, kind: str, loader: Loader, requires: Optional[Callable[[str], List[Key]]] = None):
+        """Add the loader for a model kind; `requires(name)` lists models it is built on (kept loaded with it)."""
+        self._loaders[kind] = (loader, requires or (lambda name: []))
+
+    def is_loaded(self, kind: str, name: str) -> bool:
+        with self._lock:
+            return (kind, name) in self._entries
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(e.bytes for e in self._entries.values())
+
+    def _pin(self, key: Key) -> Optional[_Entry]:
+        # Caller holds self._lock.
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.refs += 1
+            entry.uses += 1
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+        return entry
+
+    def _acquire(self, kind: str, name: str) -> Optional[_Entry]:
+        """Pin (loading if needed) a model; None if it has no loader or failed to load."""
+        key = (kind, name)
+        with self._lock:
+            entry = self._pin(key)
+            if entry is not None:
+                return entry
+            if kind not in self._loaders:
+                return None
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        # One loader per model; concurrent requests for it wait here instead of loading it twice.
+        with load_lock:
+            with self._lock:
+                entry = self._pin(key)
+                if entry is not None:
+                    return entry
+            loader, requires = self._loaders[kind]
+            deps: List[_Entry] = []
+            try:
+                for dep_kind, dep_name in requires(name):
+                    dep = self._acquire(dep_kind, dep_name)
+                    if dep is None:
+                        raise RuntimeError(f"required model {dep_kind}:{dep_name} is unavailable")
+                    deps.append(dep)
+                rss_before = process_memory()["rss"]
+                print(f"Loading {kind} model {name}...")
+                model = loader(name, resolve_path(name), [d.model for d in deps])
+                # Models built on another one (KeyBERT on the embedding model) only add their own overhead.
+                size = (None if deps else model_bytes(model))
+                if size is None:
+                    size = max(0, process_memory()["rss"] - rss_before)
+                print(f"✓ {kind} model {name} loaded ({size / MB:.0f} MB)")
+            except Exception as e:
+                for dep in deps:
+                    self._release(dep)
+                with self._lock:
+                    self.failures += 1
+                print(f"Could not load {kind} model {name}: {e}")
+                return None
+            entry = _Entry(kind, name, model, size, deps)
+            with self._lock:
+                self._entries[key] = entry
+                self.loads += 1
+                self._pin(key)
+                MODELS_LOADED.set(1, model=name if kind != "keybert" else "keybert")
+                evicted = self._evict()
+            if evicted:
+                gc.collect()
+            return entry
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.refs -= 1
+            evicted = self._evict()
+        if evicted:
+            gc.collect()
+
+    def _evict(self) -> int:
+        """Drop idle models, oldest use first, until within budget. Caller holds self._lock."""
+        if self.budget_bytes <= 0:
+            return 0
+        evicted = 0
+        while sum(e.bytes for e in self._entries.values()) > self.budget_bytes:
+            victim = next((e for e in self._entries.values() if e.refs == 0), None)
+            if victim is None:
+                break  # everything is in use; over budget until a request finishes
+            del self._entries[(victim.kind, victim.name)]
+            for dep in victim.requires:
+                dep.refs -= 1
+            MODELS_LOADED.set(0, model=victim.name if victim.kind != "keybert" else "keybert")
+            print(f"Evicted {victim.kind} model {victim.name} ({victim.bytes / MB:.0f} MB) to stay within the model RAM budget")
+            self.evictions += 1
+            evicted += 1
+        return evicted
+
+    @contextmanager
+    def use(self, kind: str, name: str) -> Iterator[Optional[Any]]:
+        """Hold a model for the duration of the block so it cannot be evicted; yields None if unavailable."""
+        entry = self._acquire(kind, name)
+        try:
+            yield entry.model if entry is not None else None
+        finally:
+            if entry is not None:
+                self._release(entry)
+
+    def get(self, kind: str, name: str) -> Optional[Any]:
+        """Load (or touch) a model without holding it; prefer `use()` while running inference."""
+        with self.use(kind, name) as model:
+            return model
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = [
+                {
+                    "kind": e.kind,
+                    "name": e.name,
+                    "bytes": e.bytes,
+                    "inUse": e.refs,
+                    "uses": e.uses,
+                    "loadedAt": e.loaded_at,
+                    "lastUsed": e.last_used,
+                }
+                for e in reversed(self._entries.values())
+            ]
+            return {
+                "budgetBytes": self.budget_bytes,
+                "residentBytes": sum(m["bytes"] for m in models),
+                "models": models,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "failures": self.failures,
+                "summarizationModels": {"default": SUMMARIZATION_MODEL, **SUMMARIZATION_MODELS},
+            }
+
+
+model_registry = ModelRegistry()
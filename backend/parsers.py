@@ -1,34 +1,226 @@
-import io
-from typing import List, Optional
+"""Document text extraction with content-based format detection.
+
+The format comes from magic bytes (``%PDF-``, a zip holding
+``word/document.xml``), not the file name; anything else that decodes as text
+is treated as plain text, with its encoding detected from the BOM, strict
+UTF-8, or charset-normalizer when installed. Each format has a registry of
+extractor backends; ``PDF_EXTRACTOR`` / ``DOCX_EXTRACTOR`` pick one, and
+``auto`` tries the available backends in preference order, falling back to
+the next one if a backend fails on a file.
+"""
+import codecs
+import mmap
+import os
+import zipfile
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
 from fastapi import UploadFile
 from PyPDF2 import PdfReader
-import docx
+from docx_stream import extract_docx_text
+from metrics import timed, FALLBACKS
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+try:
+    from pdfminer.high_level import extract_text as pdfminer_extract_text
+except ImportError:
+    pdfminer_extract_text = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError:
+    detect_charset = None
+
+Extractor = Callable[[BinaryIO], str]
+
+# format -> backend name -> extractor, in "auto" preference order
+EXTRACTORS: Dict[str, Dict[str, Extractor]] = {"pdf": {}, "docx": {}, "txt": {}}
+EXTRACTOR_SETTINGS = {
+    "pdf": os.getenv("PDF_EXTRACTOR", "auto"),
+    "docx": os.getenv("DOCX_EXTRACTOR", "auto"),
+    "txt": "auto",
+}
+SNIFF_BYTES = 8192
+
+
+def register(fmt: str, name: str, available: bool = True):
+    """Decorator adding an extractor backend for `fmt` (skipped if its dependency is missing)."""
+    def wrap(fn: Extractor) -> Extractor:
+        if available:
+            EXTRACTORS.setdefault(fmt, {})[name] = fn
+        return fn
+    return wrap
+
+
+def backends_for(fmt: str, setting: Optional[str] = None) -> List[Tuple[str, Extractor]]:
+    """Backends to try for `fmt`: the configured one, or every available one for "auto"."""
+    available = EXTRACTORS.get(fmt, {})
+    setting = setting or EXTRACTOR_SETTINGS.get(fmt, "auto")
+    if setting == "auto":
+        return list(available.items())
+    if setting not in available:
+        raise ValueError(
+            f"{fmt} extractor {setting!r} is not available; installed: {', '.join(available) or 'none'}"
+        )
+    return [(setting, available[setting])]
+
+
+def detect_format(head: bytes, f: BinaryIO, filename: str = "") -> Optional[str]:
+    """Identify pdf/docx/txt from the first bytes (and zip directory) of a file."""
+    if head.lstrip(b"\x00\t\r\n ").startswith(b"%PDF-"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            f.seek(0)
+            with zipfile.ZipFile(f) as zf:
+                if "word/document.xml" in zf.namelist():
+                    return "docx"
+        except zipfile.BadZipFile:
+            pass
+        finally:
+            f.seek(0)
+        return None
+    if b"\x00" in head and not head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return None
+    if detect_encoding(head, sample=True) is not None:
+        return "txt"
+    # Undetectable sample; trust an explicit .txt name.
+    return "txt" if filename.lower().endswith(".txt") else None
+
+
+def detect_encoding(data: bytes, sample: bool = False) -> Optional[str]:
+    """Encoding of `data` (bytes or a memory map): BOM, then strict UTF-8, then charset-normalizer, then cp1252."""
+    for bom, name in (
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16"),
+    ):
+        if data[:len(bom)] == bom:
+            return name
+    try:
+        codecs.decode(data, "utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A sample may end mid-character; only the tail failing still means UTF-8.
+        if sample and e.start >= len(data) - 3:
+            return "utf-8"
+    if detect_charset is not None:
+        matches = list(detect_charset(data[:SNIFF_BYTES * 8]))
+        if matches:
+            best = matches[0]
+            # Latin code pages often tie; break ties toward cp1252, by far the most common.
+            for match in matches:
+                if match.encoding == "cp1252" and (match.chaos, match.coherence) == (best.chaos, best.coherence):
+                    return "cp1252"
+            return best.encoding
+    try:
+        codecs.decode(data, "cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return None
+
+
+def _disk_path(f: BinaryIO) -> Optional[str]:
+    """Path of `f` if it is a named file on disk (job uploads, corpus files); None for spooled uploads."""
+    name = getattr(f, "name", None)
+    return name if isinstance(name, str) and os.path.isfile(name) else None
+
+
+@register("pdf", "pymupdf", available=pymupdf is not None)
+def _pdf_pymupdf(f: BinaryIO) -> str:
+    """MuPDF (C): fastest, good for plain-text PDFs."""
+    path = _disk_path(f)
+    if path is not None:
+        # MuPDF reads pages from the file as needed instead of from a copy of it in memory.
+        doc = pymupdf.open(path, filetype="pdf")
+    else:
+        f.seek(0)
+        doc = pymupdf.open(stream=f.read(), filetype="pdf")
+    with doc:
+        return "\n".join(page.get_text() for page in doc)
+
+
+@register("pdf", "pypdf2")
+def _pdf_pypdf2(f: BinaryIO) -> str:
+    # PdfReader seeks within the (possibly disk-spooled) file instead of copying it into memory.
+    f.seek(0)
+    reader = PdfReader(f)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+@register("pdf", "pdfminer", available=pdfminer_extract_text is not None)
+def _pdf_pdfminer(f: BinaryIO) -> str:
+    """pdfminer.six layout analysis: slowest, most careful with columns and odd layouts."""
+    f.seek(0)
+    return pdfminer_extract_text(f)
+
+
+@register("docx", "stream")
+def _docx_stream(f: BinaryIO) -> str:
+    # Streams word/document.xml (tables included) instead of building python-docx's object tree.
+    return extract_docx_text(f)
+
+
+@register("docx", "python-docx", available=docx is not None)
+def _docx_python_docx(f: BinaryIO) -> str:
+    f.seek(0)
+    doc = docx.Document(f)
+    parts = [p.text for p in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            parts.extend(cell.text for cell in row.cells)
+    return "\n".join(parts)
+
+
+@register("txt", "text")
+def _txt(f: BinaryIO) -> str:
+    path = _disk_path(f)
+    if path is not None and os.path.getsize(path):
+        # Decoded from a memory map of the file: only the text is allocated, not a bytes copy as well.
+        with open(path, "rb") as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return codecs.decode(data, detect_encoding(data) or "latin-1", "replace")
+    f.seek(0)
+    data = f.read()
+    return data.decode(detect_encoding(data) or "latin-1", errors="replace")
+
+
+def extract_text(f: BinaryIO, filename: str = "") -> str:
+    """Detect the format of a seekable binary file and extract its text."""
+    f.seek(0)
+    head = f.read(SNIFF_BYTES)
+    f.seek(0)
+    fmt = detect_format(head, f, filename)
+    if fmt is None:
+        raise ValueError(f"Unsupported file type: {filename}")
+    backends = backends_for(fmt)
+    with timed("parse", fmt):
+        for i, (name, extractor) in enumerate(backends):
+            try:
+                return extractor(f)
+            except Exception as e:
+                if i == len(backends) - 1:
+                    raise ValueError(f"Could not extract text from {filename}: {e}") from e
+                FALLBACKS.inc(component=f"parse_{fmt}", reason=f"{name}_error")
+                print(f"{name} failed on {filename} ({e}); trying {backends[i + 1][0]}")
+    raise ValueError(f"No {fmt} extractor available for {filename}")
+
 
 async def parse_files(files: Optional[List[UploadFile]], text: Optional[str]) -> str:
+    """Extract text from uploads (UploadFile or uploads.SpooledUpload), reading from `file.file`."""
     contents = []
     if files:
         for file in files:
-            if file.filename.endswith('.pdf'):
-                contents.append(await parse_pdf(file))
-            elif file.filename.endswith('.docx'):
-                contents.append(await parse_docx(file))
-            elif file.filename.endswith('.txt'):
-                contents.append((await file.read()).decode('utf-8'))
-            else:
-                raise ValueError(f"Unsupported file type: {file.filename}")
+            contents.append(extract_text(file.file, file.filename or ""))
     if text:
         contents.append(text)
     return "\n".join(contents)
-
-async def parse_pdf(file: UploadFile) -> str:
-    pdf_bytes = await file.read()
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    text = []
-    for page in reader.pages:
-        text.append(page.extract_text() or "")
-    return "\n".join(text)
-
-async def parse_docx(file: UploadFile) -> str:
-    docx_bytes = await file.read()
-    doc = docx.Document(io.BytesIO(docx_bytes))
-    return "\n".join([para.text for para in doc.paragraphs])
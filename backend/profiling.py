@@ -0,0 +1,245 @@
+"""Opt-in per-request profiling.
+
+A request opts in with the ``X-Sumrify-Profile`` header or ``settings.profile``.
+The value is ``true`` (stage timings + allocations) or a comma-separated list
+of ``stages``, ``alloc``, ``sample`` and ``dump``:
+
+- ``stages``: wall time of every pipeline stage plus counters such as sentence
+  count, tokens, encode batch sizes and MMR iterations.
+- ``alloc``: bytes allocated and peak per stage via ``tracemalloc``. This slows
+  the request down and is process-wide, so concurrent requests blur together.
+- ``sample``: a sampling profiler that records the request thread's stack
+  every ``PROFILE_SAMPLE_INTERVAL_MS`` and returns the hottest stacks.
+- ``dump``: write the breakdown and collapsed stacks (flamegraph.pl / speedscope
+  format) to ``PROFILE_DUMP_DIR``. Ignored unless that directory is configured.
+
+Only the options in ``PROFILE_ALLOW`` (default ``stages``) are honoured; the
+others are operator tools and have to be enabled there.
+
+Instrumented code calls the module-level helpers (``count``, ``note``,
+``append``); they are no-ops when the current request isn't profiled.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set
+
+PROFILE_OPTIONS = {"stages", "alloc", "sample", "dump"}
+# Options a request may turn on. alloc, sample and dump cost the whole process (tracemalloc
+# traces every thread; dumps write to disk), so by default clients only get stage timings.
+PROFILE_ALLOW = {"stages"} | {
+    o for o in os.getenv("PROFILE_ALLOW", "stages").lower().replace(" ", "").split(",") if o in PROFILE_OPTIONS
+}
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("sumrify_profile", default=None)
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+_tracemalloc_lock = threading.Lock()
+
+
+def parse_profile_options(header: Optional[str] = None, setting: Any = None) -> Set[str]:
+    """Merge the header and settings flag into a set of profile options, keeping those in PROFILE_ALLOW."""
+    options: Set[str] = set()
+    for value in (header, setting):
+        if value is None or value is False:
+            continue
+        if value is True:
+            options |= {"stages", "alloc"}
+            continue
+        for part in str(value).lower().replace(" ", "").split(","):
+            if part in {"1", "true", "yes", "on"}:
+                options |= {"stages", "alloc"}
+            elif part in PROFILE_OPTIONS:
+                options.add(part)
+    if options:
+        options.add("stages")
+    return options & PROFILE_ALLOW
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sumrify-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            parts: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common())
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        total = self.samples or 1
+        return [
+            {"stack": stack.split(";")[-8:], "samples": n, "share": round(n / total, 4)}
+            for stack, n in self.stacks.most_common(limit)
+        ]
+
+
+class RequestProfile:
+    """Stage timings, allocation deltas and counters for one request."""
+
+    def __init__(self, options: Set[str], name: str = "request"):
+        self.options = options
+        self.name = name
+        self.id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.counters: Dict[str, Any] = {}
+        self.sampler: Optional[StackSampler] = None
+        # Highest absolute traced memory seen at the end of any stage.
+        self.peak_bytes = 0
+
+    @property
+    def alloc(self) -> bool:
+        return "alloc" in self.options
+
+    @contextmanager
+    def stage(self, pipeline: str, stage: str):
+        before = 0
+        if self.alloc and tracemalloc.is_tracing():
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry: Dict[str, Any] = {
+                "stage": f"{pipeline}.{stage}",
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            if self.alloc and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                self.peak_bytes = max(self.peak_bytes, peak)
+                entry["allocatedKb"] = round((current - before) / 1024, 1)
+                entry["peakKb"] = round(max(0, peak - before) / 1024, 1)
+            self.stages.append(entry)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "id": self.id,
+            "options": sorted(self.options),
+            "totalMs": round((time.perf_counter() - self.started) * 1000, 3),
+            "stages": self.stages,
+            "counters": self.counters,
+        }
+        if self.alloc:
+            out["peakTracedKb"] = round(self.peak_bytes / 1024, 1)
+        if self.sampler is not None:
+            out["sample"] = {
+                "intervalMs": round(self.sampler.interval * 1000, 3),
+                "samples": self.sampler.samples,
+                "top": self.sampler.top(),
+            }
+        return out
+
+    def dump(self, directory: str) -> Optional[str]:
+        """Write ``<id>.json`` (and ``<id>.collapsed`` when sampled); returns the JSON path."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.name}-{self.id}")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        if self.sampler is not None:
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                f.write(self.sampler.collapsed())
+        return base + ".json"
+
+
+def current() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def count(key: str, amount: int = 1):
+    prof = _current.get()
+    if prof is not None:
+        prof.counters[key] = prof.counters.get(key, 0) + amount
+
+
+def note(key: str, value: Any):
+    prof = _current.get()
+    if prof is not None:
+        prof.counters[key] = value
+
+
+def append(key: str, value: Any):
+    prof = _current.get()
+    if prof is not None:
+        prof.counters.setdefault(key, []).append(value)
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        # Leave tracing alone if someone else (e.g. a benchmark) started it.
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+@contextmanager
+def profile_request(options: Set[str], name: str = "request"):
+    """Activate profiling for the enclosed block; yields None when not requested."""
+    if not options:
+        yield None
+        return
+    prof = RequestProfile(options, name)
+    token = _current.set(prof)
+    if prof.alloc:
+        _start_tracemalloc()
+    if "sample" in options:
+        interval = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+        prof.sampler = StackSampler(threading.get_ident(), max(interval, 0.001))
+        prof.sampler.start()
+    try:
+        yield prof
+    finally:
+        if prof.sampler is not None:
+            prof.sampler.stop()
+        if prof.alloc:
+            _stop_tracemalloc()
+        _current.reset(token)
+        dump_dir = os.getenv("PROFILE_DUMP_DIR")
+        if "dump" in options and dump_dir:
+            try:
+                prof.counters["dumpFile"] = os.path.basename(prof.dump(dump_dir))
+            except OSError as e:
+                print(f"Profile dump failed: {e}")
@@ -0,0 +1,169 @@
+"""Pre-fork server for running the API with several workers on one host.
+
+`uvicorn --workers N` spawns fresh interpreters, so every worker downloads and
+loads its own MiniLM/KeyBERT/BART copy. This launcher instead binds the socket
+and loads the models once in the parent, then forks the workers: model weights
+stay shared copy-on-write and only pages a worker actually writes get copied.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 4 --preload-abstractive   # also share BART
+
+The shared cache tier defaults to ``./.cache/shared_cache.sqlite3`` here so
+workers also share summary and embedding cache hits (see shared_cache.py).
+Background job workers (see jobs.py) are forked from the same parent and
+restarted like HTTP workers; the HTTP workers then start none of their own.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def preload_models(include_abstractive: bool = False):
+    """Load models in the parent so forked workers inherit them."""
+    import summarizer
+
+    summarizer.get_embedding_model()
+    summarizer.get_keybert_model()
+    if include_abstractive:
+        summarizer.get_summarization_model()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, args: argparse.Namespace):
+    """Child process: serve the already-imported app on the inherited socket."""
+    import uvicorn
+    from main import app
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def run_job_worker():
+    """Child process: run background jobs until terminated."""
+    import jobs
+
+    jobs.work()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork Sumrify API server")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", os.getenv("API_PORT", "8000"))))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PREFORK_WORKERS", "2")))
+    parser.add_argument(
+        "--preload-abstractive",
+        action="store_true",
+        default=os.getenv("PREFORK_PRELOAD_ABSTRACTIVE", "False").lower() in {"1", "true", "yes"},
+        help="Also load BART in the parent (about 1.6 GB, shared by all workers)",
+    )
+    parser.add_argument(
+        "--job-workers",
+        type=int,
+        default=int(os.getenv("JOB_WORKERS", "1")),
+        help="Background job worker processes (jobs.py)",
+    )
+    parser.add_argument("--no-preload", action="store_true", help="Load models lazily in each worker (baseline)")
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(os.getcwd(), ".cache", "shared_cache.sqlite3"))
+
+    # Importing main pulls in summarizer and the shared cache with the path above.
+    import main as _main  # noqa: F401
+    import jobs
+    from shared_cache import shared_cache
+
+    # Job workers are forked below; HTTP workers must not start pools of their own.
+    jobs.JOB_WORKERS = 0
+    jobs.job_store.recover()
+
+    shared_cache.reset_workers()
+    if not args.no_preload:
+        started = time.time()
+        preload_models(args.preload_abstractive)
+        print(f"✓ Models preloaded in parent in {time.time() - started:.1f}s")
+
+    sock = bind_socket(args.host, args.port)
+
+    # Move everything allocated so far out of the GC's generations so collections
+    # in the workers don't touch (and thereby copy) the shared pages.
+    gc.collect()
+    gc.freeze()
+
+    children: dict = {}
+    stopping = False
+
+    def spawn(role: str = "http"):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                if role == "jobs":
+                    run_job_worker()
+                else:
+                    run_worker(sock, args)
+            finally:
+                os._exit(0)
+        children[pid] = (time.time(), role)
+
+    def shutdown(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(max(1, args.workers)):
+        spawn()
+    for _ in range(max(0, args.job_workers)):
+        spawn("jobs")
+    print(f"✓ Serving on {args.host}:{args.port} with {args.workers} pre-forked workers "
+          f"and {args.job_workers} job workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        child = children.pop(pid, None)
+        if child is None or stopping:
+            continue
+        started, role = child
+        print(f"Worker {pid} ({role}) exited with status {status}; restarting")
+        if role == "jobs":
+            # Requeue whatever the dead worker was running.
+            jobs.job_store.recover()
+        # Avoid a tight crash loop if a worker dies right after starting.
+        if time.time() - started < 1:
+            time.sleep(1)
+        spawn(role)
+
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""Cross-process cache tier for summaries and sentence embeddings.
+
+When ``SHARED_CACHE_PATH`` points at a file, entries live in a local SQLite
+database (WAL mode) that every uvicorn worker on the host reads and writes, so
+a document summarized by one worker is a cache hit for all the others. Without
+a path the cache falls back to a per-process in-memory LRU with the same API.
+"""
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import metrics
+
+
+def make_key(*parts: Any) -> str:
+    """Build a stable cache key from arbitrary parts (text, settings, model ids)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8", errors="ignore"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+def process_memory() -> Dict[str, int]:
+    """Return resident (RSS) and proportional (PSS) set size of this process in bytes.
+
+    PSS splits copy-on-write pages shared with the pre-fork parent between the
+    processes that map them, so it is the number to compare across workers.
+    """
+    mem: Dict[str, int] = {"rss": 0, "pss": 0}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    mem["rss"] = int(line.split()[1]) * 1024
+                elif line.startswith("Pss:"):
+                    mem["pss"] = int(line.split()[1]) * 1024
+        return mem
+    except OSError:
+        pass
+    try:
+        import resource
+
+        # ru_maxrss is the peak, in KiB on Linux; good enough where /proc is missing.
+        mem["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        pass
+    return mem
+
+
+class SharedCache:
+    """Namespaced key-value cache shared between worker processes."""
+
+    def __init__(self, path: Optional[str], max_entries: int = 2000, max_value_bytes: int = 64 * 1024 * 1024):
+        self.path = path or None
+        # Benchmarks switch this off so every run exercises the full pipeline.
+        self.enabled = True
+        self.max_entries = max_entries
+        self.max_value_bytes = max_value_bytes
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._writes = 0
+        self._last_report = 0.0
+
+    def reset_after_fork(self):
+        """In a forked child: a fresh lock (the parent's may have been held by another thread) and connection."""
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    @property
+    def shared(self) -> bool:
+        return self.path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite handles must not cross a fork; reopen in every worker process.
+        pid = os.getpid()
+        if self._conn is None or self._conn_pid != pid:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries(created)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers (pid INTEGER PRIMARY KEY, stats TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn = conn
+            self._conn_pid = pid
+        return self._conn
+
+    def _count(self, counter: Dict[str, int], namespace: str):
+        counter[namespace] = counter.get(namespace, 0) + 1
+        metrics.CACHE_REQUESTS.inc(namespace=namespace, result="hit" if counter is self.hits else "miss")
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        """Return the raw bytes stored under (namespace, key), or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            value: Optional[bytes] = None
+            try:
+                if self.shared:
+                    row = self._connect().execute(
+                        "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                    ).fetchone()
+                    value = row[0] if row else None
+                else:
+                    mem_key = namespace + ":" + key
+                    value = self._memory.get(mem_key)
+                    if value is not None:
+                        self._memory.move_to_end(mem_key)
+            except sqlite3.Error as e:
+                print(f"Shared cache read failed: {e}")
+            self._count(self.hits if value is not None else self.misses, namespace)
+            return value
+
+    def set(self, namespace: str, key: str, value: bytes):
+        """Store raw bytes; oversized values are skipped rather than evicting everything."""
+        if not self.enabled or len(value) > self.max_value_bytes:
+            return
+        with self._lock:
+            try:
+                if self.shared:
+                    conn = self._connect()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (namespace, key, value, created) VALUES (?, ?, ?, ?)",
+                        (namespace, key, value, time.time()),
+                    )
+                    self._writes += 1
+                    # Trim occasionally instead of on every write; oldest entries go first.
+                    if self._writes % 50 == 0:
+                        conn.execute(
+                            "DELETE FROM entries WHERE rowid IN ("
+                            "SELECT rowid FROM entries ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                            (self.max_entries,),
+                        )
+                else:
+                    mem_key = namespace + ":" + key
+                    self._memory[mem_key] = value
+                    self._memory.move_to_end(mem_key)
+                    while len(self._memory) > self.max_entries:
+                        self._memory.popitem(last=False)
+            except sqlite3.Error as e:
+                print(f"Shared cache write failed: {e}")
+
+    def get_json(self, namespace: str, key: str) -> Optional[Any]:
+        raw = self.get(namespace, key)
+        return json.loads(raw) if raw is not None else None
+
+    def set_json(self, namespace: str, key: str, value: Any):
+        self.set(namespace, key, json.dumps(value).encode("utf-8"))
+
+    def get_array(self, namespace: str, key: str) -> Optional[np.ndarray]:
+        raw = self.get(namespace, key)
+        if raw is None:
+            return None
+        return np.load(io.BytesIO(raw), allow_pickle=False)
+
+    def set_array(self, namespace: str, key: str, value: np.ndarray):
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(value), allow_pickle=False)
+        self.set(namespace, key, buf.getvalue())
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-namespace hit/miss counters for this process."""
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        out: Dict[str, Any] = {}
+        for ns in namespaces:
+            hits = self.hits.get(ns, 0)
+            misses = self.misses.get(ns, 0)
+            total = hits + misses
+            out[ns] = {"hits": hits, "misses": misses, "hitRate": round(hits / total, 4) if total else 0.0}
+        return out
+
+    def report_worker(self, min_interval: float = 0.0):
+        """Publish this worker's memory, cache counters and metrics so any worker can list them."""
+        if not self.shared or time.time() - self._last_report < min_interval:
+            return
+        self._last_report = time.time()
+        stats = {
+            "pid": os.getpid(),
+            "memory": process_memory(),
+            "cache": self.stats(),
+            "shared": self.shared,
+            "metrics": metrics.snapshot(),
+        }
+        with self._lock:
+            try:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO workers (pid, stats, updated) VALUES (?, ?, ?)",
+                    (stats["pid"], json.dumps(stats), time.time()),
+                )
+            except sqlite3.Error as e:
+                print(f"Shared cache worker report failed: {e}")
+
+    def reset_workers(self):
+        """Forget worker reports from earlier runs (called by the pre-fork parent)."""
+        if not self.shared:
+            return
+        with self._lock:
+            self._connect().execute("DELETE FROM workers")
+
+    def worker_stats(self) -> List[Dict[str, Any]]:
+        """Stats of every worker that has reported (only this process without a shared path)."""
+        if not self.shared:
+            return [{
+                "pid": os.getpid(),
+                "memory": process_memory(),
+                "cache": self.stats(),
+                "shared": False,
+                "metrics": metrics.snapshot(),
+            }]
+        self.report_worker()
+        with self._lock:
+            rows = self._connect().execute("SELECT stats FROM workers ORDER BY pid").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+shared_cache = SharedCache(
+    os.getenv("SHARED_CACHE_PATH"),
+    max_entries=int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "2000")),
+    max_value_bytes=int(os.getenv("SHARED_CACHE_MAX_VALUE_MB", "64")) * 1024 * 1024,
+)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=shared_cache.reset_after_fork)
@@ -1,10 +1,22 @@
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+import os
 import re
+import time
 from collections import Counter
 import warnings
+from shared_cache import shared_cache, make_key
+from metrics import timed, FALLBACKS, DOCUMENT_SENTENCES
+import profiling
+from budget import LatencyBudget, measured, observe, observe_load
+from models import EMBEDDING_MODEL, SUMMARIZATION_MODEL, model_registry, summarization_model_for
+import dedup
+from embedding_store import embedding_store
+import inference
+from idf_tables import IdfTable, idf_tables
+from cancellation import checkpoint
 warnings.filterwarnings('ignore')
 
 # Advanced NLP libraries
@@ -13,63 +25,126 @@ try:
     from transformers import pipeline, AutoTokenizer, AutoModel
     from keybert import KeyBERT
     ADVANCED_MODE = True
+    inference.configure_threads()
 except ImportError:
     ADVANCED_MODE = False
     print("Warning: Advanced libraries not installed. Using basic mode.")
 
-# Initialize models globally for reuse (singleton pattern)
-_embedding_model = None
-_summarization_model = None
-_keybert_model = None
+# Models are loaded lazily and shared through the registry (see models.py)
+EMBEDDING_MODEL_NAME = EMBEDDING_MODEL
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "32"))
+
+def _timed_load(kind: str, load: Callable[[], Any]) -> Any:
+    started = time.perf_counter()
+    model = load()
+    observe_load(kind, time.perf_counter() - started)
+    return model
+
+if ADVANCED_MODE:
+    # Uses all-MiniLM-L6-v2 by default: fast, accurate, 384-dimensional embeddings.
+    model_registry.register(
+        "embedding",
+        lambda name, path, deps: _timed_load("embedding", lambda: SentenceTransformer(path)),
+    )
+    # BART (or a distilled variant per speed mode/domain): seq2seq summarization.
+    model_registry.register(
+        "summarization",
+        lambda name, path, deps: _timed_load(
+            "summarization", lambda: pipeline("summarization", model=path, device=-1)  # CPU mode, use 0 for GPU
+        ),
+    )
+    # KeyBERT on top of the already-loaded embedding model instead of a second copy.
+    model_registry.register(
+        "keybert",
+        lambda name, path, deps: _timed_load("keybert", lambda: KeyBERT(model=deps[0])),
+        requires=lambda name: [("embedding", name)],
+    )
 
 def get_embedding_model():
+    """Get (loading if needed) the sentence embedding model, or None in basic mode."""
+    if not ADVANCED_MODE:
+        return None
+    return model_registry.get("embedding", EMBEDDING_MODEL_NAME)
+
+def get_summarization_model(name: Optional[str] = None):
+    """Get (loading if needed) an abstractive summarization pipeline; the default is HF_MODEL."""
+    if not ADVANCED_MODE:
+        return None
+    return model_registry.get("summarization", name or SUMMARIZATION_MODEL)
+
+def get_keybert_model():
+    """Get (loading if needed) KeyBERT for context-aware keyword extraction."""
+    if not ADVANCED_MODE:
+        return None
+    return model_registry.get("keybert", EMBEDDING_MODEL_NAME)
+
+def sentence_groups(sentences: List[str]) -> List[int]:
+    """Near-duplicate group of each sentence (see dedup.py), cached by content."""
+    key = make_key(dedup.GROUPING_VERSION, dedup.NEAR_DUPLICATE_THRESHOLD, *sentences)
+    groups = shared_cache.get_json("near_duplicates", key)
+    if groups is None:
+        with timed("summarize", "dedup"):
+            groups = dedup.near_duplicate_groups(sentences)
+        shared_cache.set_json("near_duplicates", key, groups)
+    return groups
+
+def embed_texts(texts: List[str], pipeline: str = "summarize") -> Optional[np.ndarray]:
     """
-    Get or initialize the sentence embedding model.
-    Uses all-MiniLM-L6-v2: Fast, accurate, 384-dimensional embeddings.
-    """
-    global _embedding_model
-    if _embedding_model is None and ADVANCED_MODE:
-        try:
-            print("Loading sentence embedding model...")
-            _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            print("✓ Embedding model loaded")
-        except Exception as e:
-            print(f"Could not load embedding model: {e}")
-    return _embedding_model
-
-def get_summarization_model():
-    """
-    Get or initialize the abstractive summarization model.
-    Uses BART: State-of-the-art seq2seq summarization.
+    Embeddings for `texts`, taken from the persistent embedding store where
+    present (see embedding_store.py); only the rest are encoded, then stored.
     """
-    global _summarization_model
-    if _summarization_model is None and ADVANCED_MODE:
-        try:
-            print("Loading BART summarization model (this may take a moment)...")
-            _summarization_model = pipeline(
-                "summarization", 
-                model="facebook/bart-large-cnn",
-                device=-1  # CPU mode, use 0 for GPU
-            )
-            print("✓ BART model loaded")
-        except Exception as e:
-            print(f"Could not load summarization model: {e}")
-    return _summarization_model
+    stored, missing = embedding_store.get(EMBEDDING_MODEL_NAME, texts)
+    if missing:
+        # Held for the encode so the registry can't evict it mid-request.
+        with model_registry.use("embedding", EMBEDDING_MODEL_NAME) as embedding_model:
+            if embedding_model is None:
+                return None
+            with measured("encode", len(missing), pipeline):
+                encoded = np.asarray(
+                    inference.run(
+                        "embedding", embedding_model.encode, [texts[i] for i in missing], batch_size=ENCODE_BATCH_SIZE
+                    ),
+                    dtype=np.float32,
+                )
+        embedding_store.put(EMBEDDING_MODEL_NAME, [texts[i] for i in missing], encoded)
+    profiling.append("encodeCalls", {
+        "sentences": len(missing), "fromStore": len(texts) - len(missing), "batchSize": ENCODE_BATCH_SIZE
+    })
+    if not missing:
+        return stored
+    if stored is None:
+        return encoded
+    embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+    is_missing = np.zeros(len(texts), dtype=bool)
+    is_missing[missing] = True
+    embeddings[is_missing] = encoded
+    embeddings[~is_missing] = stored
+    return embeddings
 
-def get_keybert_model():
+def encode_sentences(sentences: List[str]):
     """
-    Get or initialize KeyBERT for advanced keyword extraction.
-    Uses BERT embeddings for context-aware keywords.
+    Encode sentences with the embedding model, consulting the shared cache first.
+    Scoring and MMR both call this, so a document is encoded at most once.
+    Near-duplicates are encoded once and share their group's embedding.
     """
-    global _keybert_model
-    if _keybert_model is None and ADVANCED_MODE:
-        try:
-            print("Loading KeyBERT model...")
-            _keybert_model = KeyBERT(model='all-MiniLM-L6-v2')
-            print("✓ KeyBERT model loaded")
-        except Exception as e:
-            print(f"Could not load KeyBERT: {e}")
-    return _keybert_model
+    if not ADVANCED_MODE:
+        return None
+    key = make_key(EMBEDDING_MODEL_NAME, dedup.GROUPING_VERSION, dedup.NEAR_DUPLICATE_THRESHOLD, *sentences)
+    embeddings = shared_cache.get_array("embedding", key)
+    if embeddings is None:
+        groups = sentence_groups(sentences)
+        unique = dedup.representatives(groups)
+        embeddings = embed_texts([sentences[i] for i in unique])
+        if embeddings is None:
+            return None
+        profiling.count("nearDuplicates", len(sentences) - len(unique))
+        if len(unique) < len(sentences):
+            # Group ids are the representatives' indices, and `unique` is sorted.
+            embeddings = embeddings[np.searchsorted(unique, groups)]
+        shared_cache.set_array("embedding", key, embeddings)
+    else:
+        profiling.count("embeddingCacheHits")
+    return embeddings
 
 def split_sentences(text: str) -> List[str]:
     """Split text into sentences."""
@@ -175,32 +250,44 @@ def clean_extracted_text(text: str) -> str:
     cleaned = re.sub(r"[ ]{2,}", " ", cleaned)
     return cleaned.strip()
 
-def extract_keywords(text: str, top_n: int = 20) -> List[Dict[str, Any]]:
+def extract_keywords(text: str, top_n: int = 20, use_keybert: bool = True) -> List[Dict[str, Any]]:
     """
     Extract keywords using hybrid approach:
     1. KeyBERT (BERT-based, context-aware) - PRIMARY
-    2. TF-IDF + frequency - FALLBACK
+    2. TF-IDF + frequency - FALLBACK (or when `use_keybert` is False)
     """
     # Try KeyBERT first for best semantic understanding
-    if ADVANCED_MODE:
-        keybert = get_keybert_model()
-        if keybert is not None:
-            try:
-                # Extract with diversity for comprehensive coverage
-                keywords_raw = keybert.extract_keywords(
-                    text,
-                    keyphrase_ngram_range=(1, 2),  # Single + bigrams
-                    stop_words='english',
-                    use_maxsum=True,  # Maximal diversity
-                    nr_candidates=50,
-                    top_n=top_n
-                )
-                # Format as list of dicts
-                return [{"word": kw[0], "score": float(kw[1])} for kw in keywords_raw]
-            except Exception as e:
-                print(f"KeyBERT failed, using TF-IDF fallback: {e}")
+    if ADVANCED_MODE and use_keybert:
+        with model_registry.use("keybert", EMBEDDING_MODEL_NAME) as keybert:
+            if keybert is not None:
+                try:
+                    # Extract with diversity for comprehensive coverage
+                    with measured("keybert", len(text)):
+                        # KeyBERT runs the embedding model, so it shares the embedding slots.
+                        keywords_raw = inference.run(
+                            "embedding",
+                            keybert.extract_keywords,
+                            text,
+                            keyphrase_ngram_range=(1, 2),  # Single + bigrams
+                            stop_words='english',
+                            use_maxsum=True,  # Maximal diversity
+                            nr_candidates=50,
+                            top_n=top_n
+                        )
+                    # Format as list of dicts
+                    return [{"word": kw[0], "score": float(kw[1])} for kw in keywords_raw]
+                except Exception as e:
+                    FALLBACKS.inc(component="keywords", reason="keybert_error")
+                    print(f"KeyBERT failed, using TF-IDF fallback: {e}")
+            else:
+                FALLBACKS.inc(component="keywords", reason="keybert_unavailable")
     
     # Fallback to TF-IDF approach
+    with measured("keywords_tfidf", len(text)):
+        return _extract_keywords_tfidf(text, top_n)
+
+def _extract_keywords_tfidf(text: str, top_n: int) -> List[Dict[str, Any]]:
+    """TF-IDF + frequency keyword extraction used when KeyBERT is unavailable."""
     try:
         # Split into sentences for better TF-IDF
         sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
@@ -219,12 +306,7 @@ def extract_keywords(text: str, top_n: int = 20) -> List[Dict[str, Any]]:
         feature_names = tfidf.get_feature_names_out()
         
         # Aggregate scores across all sentences
-        word_scores = {}
-        for sent_idx in range(X.shape[0]):
-            for word_idx in X[sent_idx].nonzero()[1]:
-                word = feature_names[word_idx]
-                score = X[sent_idx, word_idx]
-                word_scores[word] = word_scores.get(word, 0) + score
+        word_scores = dict(zip(feature_names, np.asarray(X.sum(axis=0)).ravel()))
         
         # Calculate word frequencies for boosting
         words = text.lower().split()
@@ -246,122 +328,258 @@ def extract_keywords(text: str, top_n: int = 20) -> List[Dict[str, Any]]:
         print(f"Keyword extraction error: {e}")
         return []
 
-def compute_sentence_scores_advanced(sentences: List[str], domain: str) -> List[Dict[str, Any]]:
+ACADEMIC_KEYWORDS = ['research', 'study', 'analysis', 'results', 'conclusion',
+                     'findings', 'methodology', 'hypothesis', 'data', 'significant']
+LEGAL_KEYWORDS = ['shall', 'hereby', 'pursuant', 'agreement', 'party', 'rights',
+                  'contract', 'liability', 'obligation', 'terms']
+JOURNALISTIC_KEYWORDS = ['said', 'according', 'reported', 'announced', 'stated']
+
+def domain_weight(sentence: str, i: int, domain: str) -> float:
+    """Domain-specific multiplier for sentence `i`; the only domain-dependent part of scoring."""
+    lower_sent = sentence.lower()
+    weight = 1.0
+    if domain == 'academic':
+        if any(kw in lower_sent for kw in ACADEMIC_KEYWORDS):
+            weight *= 1.3
+    elif domain == 'legal':
+        if any(kw in lower_sent for kw in LEGAL_KEYWORDS):
+            weight *= 1.3
+    elif domain == 'journalistic':
+        if i < 3:
+            weight *= 1.4
+        if any(kw in lower_sent for kw in JOURNALISTIC_KEYWORDS):
+            weight *= 1.1
+    return weight
+
+def position_weight(i: int, n_sent: int) -> float:
+    """Position importance (first and last sentences often important)."""
+    weight = 1.0
+    if i == 0:
+        weight *= 1.2
+    elif i < 3:
+        weight *= 1.1
+    if i == n_sent - 1:
+        weight *= 1.1
+    return weight
+
+def content_weight(sentence: str) -> float:
+    """Length normalization (prefer medium-length sentences) and numeric data bonus."""
+    weight = 1.0
+    words = len(sentence.split())
+    if 10 <= words <= 30:
+        weight *= 1.1
+    elif words < 5 or words > 50:
+        weight *= 0.8
+    # Statistics, dates often important
+    if re.search(r'\d+', sentence):
+        weight *= 1.05
+    return weight
+
+def scoring_variant(semantic: bool = True) -> str:
+    """Identifies how base scores are computed, so cached scores from another setup aren't reused."""
+    if semantic and ADVANCED_MODE and get_embedding_model() is not None:
+        return EMBEDDING_MODEL_NAME
+    return "tfidf"
+
+def base_sentence_scores(
+    sentences: List[str], semantic: bool = True, idf: Optional[IdfTable] = None
+) -> Optional[List[float]]:
     """
-    Advanced sentence scoring using semantic embeddings + TF-IDF.
-    This provides GPT-like understanding of content importance.
+    Settings-independent sentence scores: TF-IDF + semantic centroid similarity,
+    position, length and numeric bonuses. Returns None if scoring failed.
+    `semantic=False` leaves out the embeddings (TF-IDF only).
+    With an `idf` table, TF-IDF uses its corpus statistics instead of a per-document fit.
     """
-    if not sentences:
-        return []
-    
-    embedding_model = get_embedding_model()
+    embedding_model = get_embedding_model() if semantic else None
     
     try:
         # TF-IDF scores
-        vectorizer = TfidfVectorizer(stop_words='english', max_features=500)
-        tfidf_matrix = vectorizer.fit_transform(sentences)
+        with measured("tfidf", len(sentences)):
+            if idf is not None:
+                tfidf_scores = idf.sentence_scores(sentences)
+            else:
+                vectorizer = TfidfVectorizer(stop_words='english', max_features=500)
+                tfidf_matrix = vectorizer.fit_transform(sentences)
+                tfidf_scores = np.asarray(tfidf_matrix.sum(axis=1)).ravel()
         
         # Semantic embeddings for better understanding
         semantic_scores = None
         if embedding_model and ADVANCED_MODE:
             try:
-                embeddings = embedding_model.encode(sentences)
+                embeddings = encode_sentences(sentences)
                 # Document centroid (average of all sentence embeddings)
-                doc_centroid = np.mean(embeddings, axis=0)
-                # Similarity to centroid = importance
-                semantic_scores = [
-                    float(cosine_similarity([emb], [doc_centroid])[0][0])
-                    for emb in embeddings
-                ]
+                with timed("summarize", "centroid"):
+                    doc_centroid = np.mean(embeddings, axis=0)
+                    # Similarity to centroid = importance
+                    semantic_scores = [
+                        float(cosine_similarity([emb], [doc_centroid])[0][0])
+                        for emb in embeddings
+                    ]
             except:
-                pass
+                FALLBACKS.inc(component="scoring", reason="embedding_error")
         
-        sentence_scores = []
+        scores = []
         for i, sentence in enumerate(sentences):
             # Base TF-IDF score
-            tfidf_score = float(np.sum(tfidf_matrix[i].toarray()))
-            
-            # Semantic score (if available)
-            semantic_score = semantic_scores[i] if semantic_scores else 0.5
+            tfidf_score = float(tfidf_scores[i])
             
             # Combine scores: 60% TF-IDF, 40% semantic
             if semantic_scores:
-                score = (tfidf_score * 0.6) + (semantic_score * 0.4)
+                score = (tfidf_score * 0.6) + (semantic_scores[i] * 0.4)
             else:
                 score = tfidf_score
             
-            # Position importance (first and last sentences often important)
-            if i == 0:
-                score *= 1.2
-            elif i < 3:
-                score *= 1.1
-            if i == len(sentences) - 1:
-                score *= 1.1
-            
-            # Domain-specific weighting
-            lower_sent = sentence.lower()
-            if domain == 'academic':
-                academic_keywords = ['research', 'study', 'analysis', 'results', 'conclusion', 
-                                   'findings', 'methodology', 'hypothesis', 'data', 'significant']
-                if any(kw in lower_sent for kw in academic_keywords):
-                    score *= 1.3
-            elif domain == 'legal':
-                legal_keywords = ['shall', 'hereby', 'pursuant', 'agreement', 'party', 'rights',
-                                'contract', 'liability', 'obligation', 'terms']
-                if any(kw in lower_sent for kw in legal_keywords):
-                    score *= 1.3
-            elif domain == 'journalistic':
-                if i < 3:
-                    score *= 1.4
-                journalistic_keywords = ['said', 'according', 'reported', 'announced', 'stated']
-                if any(kw in lower_sent for kw in journalistic_keywords):
-                    score *= 1.1
-            
-            # Length normalization (prefer medium-length sentences)
-            words = len(sentence.split())
-            if 10 <= words <= 30:
-                score *= 1.1
-            elif words < 5 or words > 50:
-                score *= 0.8
-            
-            # Numeric data bonus (statistics, dates often important)
-            if re.search(r'\d+', sentence):
-                score *= 1.05
-            
-            sentence_scores.append({
-                "sentence": sentence,
-                "score": float(score),
-                "index": i
-            })
+            score *= position_weight(i, len(sentences)) * content_weight(sentence)
+            scores.append(float(score))
         
-        return sentence_scores
+        return scores
     except:
+        FALLBACKS.inc(component="scoring", reason="error")
+        return None
+
+def compute_sentence_scores_advanced(
+    sentences: List[str],
+    domain: str,
+    base_scores: Optional[List[float]] = None,
+    semantic: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Advanced sentence scoring using semantic embeddings + TF-IDF.
+    This provides GPT-like understanding of content importance.
+    Pass precomputed `base_scores` to only apply the domain weighting.
+    """
+    if not sentences:
+        return []
+    
+    if base_scores is None:
+        base_scores = base_sentence_scores(sentences, semantic=semantic, idf=idf_tables.get(domain))
+    if base_scores is None:
         return [{"sentence": s, "score": 1.0, "index": i} for i, s in enumerate(sentences)]
+    
+    return [
+        {
+            "sentence": sentence,
+            "score": float(base_scores[i] * domain_weight(sentence, i, domain)),
+            "index": i
+        }
+        for i, sentence in enumerate(sentences)
+    ]
+
+ANALYSIS_VERSION = 1
+
+def analyze_document(text: str) -> Dict[str, Any]:
+    """
+    Settings-independent artifacts of a document (cleaned text, sentences),
+    cached by content hash so re-runs with other settings skip cleaning and splitting.
+    """
+    key = make_key("analysis", ANALYSIS_VERSION, text)
+    analysis = shared_cache.get_json("analysis", key)
+    profiling.note("analysisCacheHit", analysis is not None)
+    if analysis is not None:
+        analysis["key"] = key
+        return analysis
+
+    with timed("summarize", "clean"):
+        cleaned_text = clean_extracted_text(text)
+
+    with timed("summarize", "split"):
+        sentences = split_sentences(cleaned_text)
+
+    analysis = {"cleanedText": cleaned_text, "sentences": sentences}
+    shared_cache.set_json("analysis", key, analysis)
+    analysis["key"] = key
+    return analysis
+
+def cached_base_scores(
+    analysis: Dict[str, Any],
+    semantic: bool = True,
+    compute: bool = True,
+    domain: str = "general"
+) -> Optional[List[float]]:
+    """
+    Base sentence scores for an analyzed document, cached alongside the analysis.
+    With `compute=False` only the cache is consulted.
+    Scores depend on the domain only through its IDF table, if one is configured.
+    """
+    # A cache-only peek must not load the embedding model just to name the variant.
+    variant = scoring_variant(semantic) if compute else (EMBEDDING_MODEL_NAME if semantic and ADVANCED_MODE else "tfidf")
+    idf = idf_tables.get(domain)
+    # Semantic scores come from the near-duplicate representatives' embeddings (see encode_sentences).
+    key = make_key(
+        analysis["key"], variant, dedup.GROUPING_VERSION, dedup.NEAR_DUPLICATE_THRESHOLD,
+        *([idf.build_id] if idf is not None else []),
+    )
+    scores = shared_cache.get_json("base_scores", key)
+    if scores is None and compute:
+        scores = base_sentence_scores(analysis["sentences"], semantic=semantic, idf=idf)
+        if scores is not None:
+            shared_cache.set_json("base_scores", key, scores)
+    elif scores is not None:
+        profiling.count("baseScoreCacheHits")
+    return scores
+
+def cached_keywords(text: str, top_n: int, use_keybert: bool = True) -> List[Dict[str, Any]]:
+    """extract_keywords, cached by text and count (the count varies with the highlights)."""
+    key = make_key(text, top_n, "keybert" if ADVANCED_MODE and use_keybert else "tfidf")
+    keywords = shared_cache.get_json("keywords", key)
+    if keywords is None:
+        keywords = extract_keywords(text, top_n=top_n, use_keybert=use_keybert)
+        shared_cache.set_json("keywords", key, keywords)
+    else:
+        profiling.count("keywordCacheHits")
+    return keywords
 
 def maximal_marginal_relevance(
     sentences: List[str],
     sentence_scores: List[Dict[str, Any]],
     num_sentences: int,
-    lambda_param: float = 0.6
+    lambda_param: float = 0.6,
+    embeddings: Optional[np.ndarray] = None,
+    use_embeddings: bool = True,
+    groups: Optional[List[int]] = None
 ) -> List[int]:
     """
     MMR: Maximum coverage with diversity - no information loss.
+    Pass `embeddings` when they are already at hand to skip encode_sentences,
+    and near-duplicate `groups` to skip sentence_groups.
+    `use_embeddings=False` selects the top sentences by score only.
     """
+    if not use_embeddings:
+        sorted_scores = sorted(sentence_scores, key=lambda x: x['score'], reverse=True)
+        return sorted([s['index'] for s in sorted_scores[:num_sentences]])
+    
     embedding_model = get_embedding_model()
     
     if not embedding_model or not ADVANCED_MODE:
+        FALLBACKS.inc(component="mmr", reason="no_embedding_model")
         sorted_scores = sorted(sentence_scores, key=lambda x: x['score'], reverse=True)
         return sorted([s['index'] for s in sorted_scores[:num_sentences]])
     
     try:
-        embeddings = embedding_model.encode(sentences)
+        if embeddings is None:
+            embeddings = encode_sentences(sentences)
         sorted_scores = sorted(sentence_scores, key=lambda x: x['score'], reverse=True)
+        started = time.perf_counter()
+        # Only the best-scoring sentence of each near-duplicate group is a candidate.
+        if groups is None:
+            groups = sentence_groups(sentences)
+        seen_groups = set()
+        candidates = []
+        for item in sorted_scores:
+            group = groups[item['index']]
+            if group not in seen_groups:
+                seen_groups.add(group)
+                candidates.append(item)
+        profiling.note("mmrCandidates", len(candidates))
         
-        selected_indices = [sorted_scores[0]['index']]
-        selected_embeddings = [embeddings[sorted_scores[0]['index']]]
-        remaining = [s for s in sorted_scores[1:]]
+        selected_indices = [candidates[0]['index']]
+        selected_embeddings = [embeddings[candidates[0]['index']]]
+        remaining = candidates[1:]
         
         while len(selected_indices) < num_sentences and remaining:
+            checkpoint("mmr")
+            profiling.count("mmrIterations")
+            profiling.count("mmrComparisons", len(remaining) * len(selected_embeddings))
             best_score = -float('inf')
             best_idx = None
             best_item = None
@@ -389,27 +607,162 @@ def maximal_marginal_relevance(
             else:
                 break
         
+        # Fewer distinct groups than requested: fill up with the best remaining group members.
+        if len(selected_indices) < num_sentences:
+            chosen = set(selected_indices)
+            extra = [item['index'] for item in sorted_scores if item['index'] not in chosen]
+            selected_indices.extend(extra[:num_sentences - len(selected_indices)])
+        
+        # Cost per (candidate, selected) comparison, for deadline planning.
+        observe("mmr", len(candidates) * len(selected_indices) ** 2 / 2, time.perf_counter() - started)
         return sorted(selected_indices)
     except Exception as e:
+        FALLBACKS.inc(component="mmr", reason="error")
         print(f"MMR failed: {e}")
         sorted_scores = sorted(sentence_scores, key=lambda x: x['score'], reverse=True)
         return sorted([s['index'] for s in sorted_scores[:num_sentences]])
 
+def select_highlights(sentence_scores: List[Dict[str, Any]], n_sent: int) -> List[Dict[str, Any]]:
+    """Pick highlight sentences above an adaptive quality threshold (mean + 0.5 * std)."""
+    sorted_scores = sorted(sentence_scores, key=lambda x: x['score'], reverse=True)
+    
+    # Calculate statistics for adaptive threshold
+    all_scores = [s['score'] for s in sentence_scores]
+    avg_score = np.mean(all_scores)
+    std_dev = np.std(all_scores)
+    
+    # Dynamic threshold: mean + 0.5 * std_dev (captures top ~30-40%)
+    # This adapts to document - more highlights for documents with many important sentences
+    quality_threshold = avg_score + (0.5 * std_dev)
+    
+    # Select all above threshold
+    quality_highlights = [s for s in sorted_scores if s['score'] >= quality_threshold]
+    
+    # Ensure reasonable bounds: min 3, max 50% of document
+    min_highlights = min(3, n_sent)
+    max_highlights = max(5, int(n_sent * 0.5))
+    
+    if len(quality_highlights) < min_highlights:
+        quality_highlights = sorted_scores[:min_highlights]
+    elif len(quality_highlights) > max_highlights:
+        quality_highlights = sorted_scores[:max_highlights]
+    
+    return [
+        {
+            "sentence": s['sentence'],
+            "score": s['score'],
+            "index": s['index']
+        }
+        for s in quality_highlights
+    ]
+
+def abstractive_refine(summary: str, model_name: Optional[str] = None) -> str:
+    """
+    Rewrite an extractive summary with a summarization model (default HF_MODEL);
+    returns the input unchanged on failure.
+    """
+    try:
+        with model_registry.use("summarization", model_name or SUMMARIZATION_MODEL) as summarizer_model:
+            if not summarizer_model:
+                FALLBACKS.inc(component="abstractive", reason="model_unavailable")
+                return summary
+            # Split into chunks if too long
+            max_chunk_words = 800
+            summary_words = summary.split()
+            
+            if len(summary_words) > max_chunk_words:
+                # Process in chunks
+                chunks = []
+                for i in range(0, len(summary_words), max_chunk_words):
+                    checkpoint("abstractive")
+                    chunk = " ".join(summary_words[i:i+max_chunk_words])
+                    if len(chunk.split()) > 50:  # Only summarize substantial chunks
+                        result = inference.run(
+                            "summarization", summarizer_model, chunk, max_length=200, min_length=50, do_sample=False
+                        )
+                        chunks.append(result[0]['summary_text'])
+                return " ".join(chunks)
+            result = inference.run(
+                "summarization", summarizer_model, summary, max_length=250, min_length=60, do_sample=False
+            )
+            return result[0]['summary_text']
+    except Exception as e:
+        FALLBACKS.inc(component="abstractive", reason="error")
+        print(f"Abstractive summarization: {e}")
+        return summary
+
+HIERARCHICAL_MIN_SENTENCES = int(os.getenv("HIERARCHICAL_MIN_SENTENCES", "5000"))
+
+def summary_length(n_sent: int, speed_mode: str) -> int:
+    """Number of sentences to select for a document of `n_sent` sentences."""
+    if speed_mode == "fast":
+        max_sents = max(5, min(12, int(n_sent * 0.35)))
+    elif speed_mode == "thorough":
+        max_sents = max(10, min(50, int(n_sent * 0.70)))  # 70% coverage!
+    else:  # balanced
+        max_sents = max(8, min(25, int(n_sent * 0.50)))  # 50% coverage
+    return min(max_sents, n_sent)
+
+def use_hierarchical(n_sent: int, hierarchical: Optional[bool] = None) -> bool:
+    """Map-reduce mode is used above HIERARCHICAL_MIN_SENTENCES unless forced either way."""
+    if hierarchical is not None:
+        return bool(hierarchical)
+    return HIERARCHICAL_MIN_SENTENCES > 0 and n_sent >= HIERARCHICAL_MIN_SENTENCES
+
+def summary_key(
+    text: str,
+    speed_mode: str = "balanced",
+    domain: str = "general",
+    use_abstractive: bool = False,
+    hierarchical: Optional[bool] = None
+) -> str:
+    """Cache key of a summarize_document result for `text` with these settings."""
+    # Everything configurable that changes the result: the abstractive model, the IDF table and the grouping.
+    idf = idf_tables.get(domain)
+    return make_key(
+        text, speed_mode, domain, bool(use_abstractive), hierarchical,
+        summarization_model_for(speed_mode, domain) if use_abstractive else None,
+        idf.build_id if idf is not None else None,
+        dedup.GROUPING_VERSION, dedup.NEAR_DUPLICATE_THRESHOLD,
+    )
+
 def summarize_document(
     text: str,
     speed_mode: str = "balanced",
     domain: str = "general",
-    use_abstractive: bool = False
+    use_abstractive: bool = False,
+    hierarchical: Optional[bool] = None,
+    deadline_ms: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Perform extractive (and optionally abstractive) summarization.
     Returns a result compatible with frontend SummarizationResult type.
+    Results are cached by content and settings in the shared cache tier.
+    `hierarchical` forces map-reduce mode on/off; None picks it by size.
+    `deadline_ms` downgrades stages to fit a latency budget (see budget.py);
+    `metrics.deadline` then reports what was degraded.
     """
-    cleaned_text = clean_extracted_text(text)
+    budget = LatencyBudget(deadline_ms)
+    cache_key = summary_key(text, speed_mode, domain, use_abstractive, hierarchical)
+    cached = shared_cache.get_json("summary", cache_key)
+    profiling.note("summaryCacheHit", cached is not None)
+    if cached is not None:
+        if budget.deadline_ms is not None:
+            cached["metrics"]["deadline"] = budget.report()
+        return cached
 
-    # 1. Split into sentences
-    sentences = split_sentences(cleaned_text)
+    # 1. Clean and split into sentences (settings-independent, cached by content)
+    # Checkpoints stop the work once the client is gone or the request timed out (see cancellation.py).
+    checkpoint("analysis")
+    analysis = analyze_document(text)
+    cleaned_text = analysis["cleanedText"]
+    sentences = analysis["sentences"]
     n_sent = len(sentences)
+    DOCUMENT_SENTENCES.observe(n_sent)
+    if profiling.current() is not None:
+        profiling.note("inputChars", len(text))
+        profiling.note("sentences", n_sent)
+        profiling.note("tokens", len(cleaned_text.split()))
     
     if n_sent == 0:
         return {
@@ -425,84 +778,73 @@ def summarize_document(
             }
         }
     
-    # 2. MAXIMUM COVERAGE - ensure no information loss
-    if speed_mode == "fast":
-        max_sents = max(5, min(12, int(n_sent * 0.35)))
-    elif speed_mode == "thorough":
-        max_sents = max(10, min(50, int(n_sent * 0.70)))  # 70% coverage!
-    else:  # balanced
-        max_sents = max(8, min(25, int(n_sent * 0.50)))  # 50% coverage
-    
-    max_sents = min(max_sents, n_sent)
-    
-    # 3. Compute ADVANCED sentence scores with semantic understanding
-    sentence_scores = compute_sentence_scores_advanced(sentences, domain)
+    # Plan the remaining stages against the deadline (without one, everything runs in full).
+    max_sents = summary_length(n_sent, speed_mode)
+    abstractive_model = summarization_model_for(speed_mode, domain)
+    semantic_cached = ADVANCED_MODE and cached_base_scores(analysis, compute=False, domain=domain) is not None
+    budget.plan(
+        {
+            "sentences": n_sent,
+            "chars": len(cleaned_text),
+            "mmrPairs": n_sent * max_sents ** 2 / 2,
+            "summaryWords": len(cleaned_text.split()) * max_sents / n_sent,
+        },
+        free=("tfidf", "encode") if semantic_cached else (),
+        loaded=[kind for kind, name in (
+            ("embedding", EMBEDDING_MODEL_NAME), ("keybert", EMBEDDING_MODEL_NAME), ("summarization", abstractive_model)
+        ) if model_registry.is_loaded(kind, name)],
+        unavailable=(() if ADVANCED_MODE else ("scoring", "selection", "keywords"))
+        + (() if use_abstractive else ("abstractive",)),
+    )
+    semantic = budget.mode("scoring") == "semantic"
     
-    # 4. Use MMR for diverse, comprehensive coverage
-    top_indices = maximal_marginal_relevance(sentences, sentence_scores, max_sents, lambda_param=0.6)
+    checkpoint("scoring")
+    hierarchical_metrics = None
+    if use_hierarchical(n_sent, hierarchical):
+        # Book-length input: summarize sections in parallel, then reduce.
+        from hierarchical import select_hierarchical
+        selection = select_hierarchical(
+            sentences, speed_mode, domain, semantic=semantic, use_mmr=budget.mode("selection") == "mmr"
+        )
+        sentence_scores = selection["sentenceScores"]
+        top_indices = selection["indices"]
+        hierarchical_metrics = selection["metrics"]
+        keyword_text = selection["keywordText"]
+    else:
+        # 2. MAXIMUM COVERAGE - ensure no information loss
+        profiling.note("maxSentences", max_sents)
+        
+        # 3. Compute ADVANCED sentence scores with semantic understanding
+        # Base scores are reused across settings; only the domain weighting is redone.
+        sentence_scores = compute_sentence_scores_advanced(
+            sentences, domain, cached_base_scores(analysis, semantic=semantic, domain=domain), semantic=semantic
+        )
+        
+        # 4. Use MMR for diverse, comprehensive coverage
+        checkpoint("selection")
+        use_mmr = budget.mode("selection") == "mmr"
+        with timed("summarize", "mmr"):
+            top_indices = maximal_marginal_relevance(
+                sentences, sentence_scores, max_sents, lambda_param=0.6, use_embeddings=use_mmr
+            )
+        keyword_text = cleaned_text
     summary_sentences = [sentences[i] for i in top_indices]
     
     # 5. Build summary text
     summary = " ".join(summary_sentences)
     
     # 6. Advanced abstractive refinement with pre-trained transformer
-    if use_abstractive and len(summary_sentences) > 3:
-        try:
-            summarizer_model = get_summarization_model()
-            if summarizer_model:
-                # Split into chunks if too long
-                max_chunk_words = 800
-                summary_words = summary.split()
-                
-                if len(summary_words) > max_chunk_words:
-                    # Process in chunks
-                    chunks = []
-                    for i in range(0, len(summary_words), max_chunk_words):
-                        chunk = " ".join(summary_words[i:i+max_chunk_words])
-                        if len(chunk.split()) > 50:  # Only summarize substantial chunks
-                            result = summarizer_model(chunk, max_length=200, min_length=50, do_sample=False)
-                            chunks.append(result[0]['summary_text'])
-                    summary = " ".join(chunks)
-                else:
-                    result = summarizer_model(summary, max_length=250, min_length=60, do_sample=False)
-                    summary = result[0]['summary_text']
-        except Exception as e:
-            print(f"Abstractive summarization: {e}")
-            pass
+    if use_abstractive and len(summary_sentences) > 3 and budget.mode("abstractive") == "model":
+        checkpoint("abstractive")
+        # Held (and loaded) outside the measured block, so load time isn't counted as per-word cost.
+        with model_registry.use("summarization", abstractive_model):
+            with measured("abstractive", len(summary.split())):
+                summary = abstractive_refine(summary, abstractive_model)
     
     # 7. Extract highlights - QUALITY-BASED THRESHOLD (not fixed count)
     # Select all sentences above a quality threshold based on score distribution
-    sorted_scores = sorted(sentence_scores, key=lambda x: x['score'], reverse=True)
-    
-    # Calculate statistics for adaptive threshold
-    all_scores = [s['score'] for s in sentence_scores]
-    avg_score = np.mean(all_scores)
-    std_dev = np.std(all_scores)
-    
-    # Dynamic threshold: mean + 0.5 * std_dev (captures top ~30-40%)
-    # This adapts to document - more highlights for documents with many important sentences
-    quality_threshold = avg_score + (0.5 * std_dev)
-    
-    # Select all above threshold
-    quality_highlights = [s for s in sorted_scores if s['score'] >= quality_threshold]
-    
-    # Ensure reasonable bounds: min 3, max 50% of document
-    min_highlights = min(3, n_sent)
-    max_highlights = max(5, int(n_sent * 0.5))
-    
-    if len(quality_highlights) < min_highlights:
-        quality_highlights = sorted_scores[:min_highlights]
-    elif len(quality_highlights) > max_highlights:
-        quality_highlights = sorted_scores[:max_highlights]
-    
-    highlights = [
-        {
-            "sentence": s['sentence'],
-            "score": s['score'],
-            "index": s['index']
-        }
-        for s in quality_highlights
-    ]
+    with timed("summarize", "highlights"):
+        highlights = select_highlights(sentence_scores, n_sent)
     
     # 8. Extract keywords - scale with highlights and document complexity
     # More highlights = more topics covered = more keywords needed
@@ -515,7 +857,10 @@ def summarize_document(
     dynamic_keyword_count = int(base_keywords * (1.0 + document_complexity * 0.8))
     dynamic_keyword_count = max(8, min(60, dynamic_keyword_count))  # Bounds: 8-60
     
-    keywords = extract_keywords(cleaned_text, top_n=dynamic_keyword_count)
+    use_keybert = budget.mode("keywords") == "keybert"
+    checkpoint("keywords")
+    with timed("summarize", "keywords"):
+        keywords = cached_keywords(keyword_text, dynamic_keyword_count, use_keybert=use_keybert)
     
     # 9. Calculate metrics
     orig_words = len(cleaned_text.split())
@@ -528,6 +873,8 @@ def summarize_document(
         "summarySentences": len(summary_sentences),
         "processingTime": 0  # Will be set by caller
     }
+    if hierarchical_metrics:
+        metrics["hierarchical"] = hierarchical_metrics
     
     # 10. Return result matching frontend types
     result = {
@@ -539,4 +886,9 @@ def summarize_document(
         "originalText": cleaned_text
     }
     
+    # Degraded results are not cached: a later request may have the time for the full pipeline.
+    if not budget.degraded:
+        shared_cache.set_json("summary", cache_key, result)
+    if budget.deadline_ms is not None:
+        metrics["deadline"] = budget.report()
     return result
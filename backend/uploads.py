@@ -0,0 +1,204 @@
+"""Streaming multipart uploads with size limits and disk spooling.
+
+Starlette's form parser accepts uploads of any size and the parsers then read
+each one fully into memory. ``receive_uploads`` instead consumes the request
+body chunk by chunk, enforces per-file, per-request and file-count limits as
+bytes arrive (413 as soon as one is exceeded), and writes each file to a
+``SpooledTemporaryFile`` that moves to disk above ``UPLOAD_SPOOL_MB`` (or once
+the request's files together hold ``UPLOAD_MEMORY_MB``). Chunks that may go to
+disk are parsed in the threadpool, so disk writes never block the event loop.
+The parsers read from ``upload.file``, so memory stays flat however large the
+batch is.
+"""
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+MB = 1024 * 1024
+UPLOAD_MAX_FILE_BYTES = int(float(os.getenv("UPLOAD_MAX_FILE_MB", "50")) * MB)
+UPLOAD_MAX_REQUEST_BYTES = int(float(os.getenv("UPLOAD_MAX_REQUEST_MB", "200")) * MB)
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "20"))
+UPLOAD_SPOOL_BYTES = int(float(os.getenv("UPLOAD_SPOOL_MB", "1")) * MB)
+# Total bytes a request may keep in memory across all its files before new data goes to disk.
+UPLOAD_MEMORY_BYTES = int(float(os.getenv("UPLOAD_MEMORY_MB", "4")) * MB)
+UPLOAD_MAX_FIELD_BYTES = 1 * MB
+UPLOAD_DIR = os.getenv("UPLOAD_DIR") or None
+
+
+@dataclass
+class SpooledUpload:
+    """An uploaded file; quacks like UploadFile for the parsers (`filename`, `file`)."""
+
+    filename: str
+    content_type: str
+    file: tempfile.SpooledTemporaryFile
+    size: int = 0
+
+    @property
+    def on_disk(self) -> bool:
+        return bool(getattr(self.file, "_rolled", False))
+
+    def close(self):
+        self.file.close()
+
+
+@dataclass
+class Uploads:
+    files: List[SpooledUpload] = field(default_factory=list)
+    fields: Dict[str, str] = field(default_factory=dict)
+
+    def close(self):
+        for upload in self.files:
+            upload.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _mb(n: int) -> str:
+    return f"{n / MB:g} MB"
+
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=detail)
+
+
+class _Collector:
+    """python-multipart callbacks that route part data to spooled files or field buffers."""
+
+    def __init__(self, uploads: Uploads, max_file_bytes: int, max_files: int):
+        self.uploads = uploads
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.headers: Dict[bytes, bytes] = {}
+        self.header_field = b""
+        self.header_value = b""
+        self.current: Optional[SpooledUpload] = None
+        self.field_name: Optional[str] = None
+        self.field_data = bytearray()
+
+    def _in_memory(self) -> int:
+        return sum(u.size for u in self.uploads.files if not u.on_disk)
+
+    def may_write_to_disk(self, size: int) -> bool:
+        """Whether `size` more bytes of body could end up written to (or roll a file over to) disk."""
+        if self.current is not None and (self.current.on_disk or self.current.size + size > UPLOAD_SPOOL_BYTES):
+            return True
+        return self._in_memory() + size > UPLOAD_MEMORY_BYTES
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        filename = options.get(b"filename")
+        if filename is None:
+            self.current = None
+            self.field_name = name
+            self.field_data = bytearray()
+            return
+        if len(self.uploads.files) >= self.max_files:
+            raise _too_large(f"Too many files; the limit is {self.max_files}.")
+        self.current = SpooledUpload(
+            filename=os.path.basename(filename.decode("utf-8", errors="replace")),
+            content_type=self.headers.get(b"content-type", b"application/octet-stream").decode("latin-1"),
+            file=tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, dir=UPLOAD_DIR),
+        )
+        self.uploads.files.append(self.current)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        size = end - start
+        if self.current is not None:
+            self.current.size += size
+            if self.current.size > self.max_file_bytes:
+                raise _too_large(
+                    f"{self.current.filename} exceeds the {_mb(self.max_file_bytes)} per-file limit."
+                )
+            if not self.current.on_disk and self._in_memory() > UPLOAD_MEMORY_BYTES:
+                self.current.file.rollover()
+            self.current.file.write(data[start:end])
+            return
+        if len(self.field_data) + size > UPLOAD_MAX_FIELD_BYTES:
+            raise _too_large(f"Form field {self.field_name!r} is too large.")
+        self.field_data += data[start:end]
+
+    def on_part_end(self):
+        if self.current is not None:
+            self.current.file.seek(0)
+            self.current = None
+        elif self.field_name is not None:
+            self.uploads.fields[self.field_name] = self.field_data.decode("utf-8", errors="replace")
+            self.field_name = None
+
+
+async def receive_uploads(
+    request: Request,
+    max_file_bytes: Optional[int] = None,
+    max_request_bytes: Optional[int] = None,
+    max_files: Optional[int] = None,
+) -> Uploads:
+    """Stream a multipart/form-data body into spooled files, enforcing the upload limits."""
+    max_file_bytes = max_file_bytes or UPLOAD_MAX_FILE_BYTES
+    max_request_bytes = max_request_bytes or UPLOAD_MAX_REQUEST_BYTES
+    max_files = max_files or UPLOAD_MAX_FILES
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body.")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_request_bytes:
+        # Refuse before reading a byte when the client is honest about the size.
+        raise _too_large(f"Upload exceeds the {_mb(max_request_bytes)} per-request limit.")
+
+    uploads = Uploads()
+    collector = _Collector(uploads, max_file_bytes, max_files)
+    parser = MultipartParser(params[b"boundary"], {
+        name: getattr(collector, name)
+        for name in (
+            "on_part_begin", "on_part_data", "on_part_end", "on_header_field",
+            "on_header_value", "on_header_end", "on_headers_finished",
+        )
+    })
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_request_bytes:
+                raise _too_large(f"Upload exceeds the {_mb(max_request_bytes)} per-request limit.")
+            if collector.may_write_to_disk(len(chunk)):
+                # Disk writes (and roll-overs) block; keep them off the event loop.
+                await run_in_threadpool(parser.write, chunk)
+            else:
+                parser.write(chunk)
+        parser.finalize()
+    except HTTPException:
+        uploads.close()
+        raise
+    except Exception as e:
+        uploads.close()
+        raise HTTPException(status_code=400, detail=f"Invalid multipart body: {e}")
+    return uploads
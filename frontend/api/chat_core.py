@@ -0,0 +1,595 @@
+"""Chat with a document: retrieval, prompts and LLM providers, shared by every entry point.
+
+Used by the backend (``utils.chat_with_document``) and by the serverless
+handlers (``api/chat.py``, ``frontend/api/chat.py``), which serve ``app``
+from this module. Only the standard library is imported up front, so a
+serverless cold start does not pay for FastAPI, pydantic, httpx or the
+OpenAI SDK. The provider client is imported on the first call that needs
+it, and a warm instance reuses it.
+
+Providers are tried in order: OpenAI (``OPENAI_API_KEY``), then Hugging Face
+hosted inference (``HUGGINGFACE_API_TOKEN``), then a local answer made of
+the matching passages. Retrieval uses precompiled patterns, and a document's
+split sentences and their token counts are kept for the next message, since a
+chat session sends the same document every turn.
+
+The context is packed to a token budget (``CHAT_CONTEXT_TOKENS``), counted
+with tiktoken when it is installed and an estimate otherwise. Sentences are
+picked by keyword relevance per token, and adjacent picks are merged into
+passages in document order. Responses report the context and prompt token
+counts under ``usage``.
+
+The conversation history is bounded the same way. The newest turns are sent
+verbatim within ``CHAT_HISTORY_TOKENS``, and the turns before them are
+compressed into a running extractive summary within ``CHAT_MEMORY_TOKENS``
+(see ``ConversationMemory``). The summary is kept per session, so each turn
+only compresses the turns that just left the verbatim window.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Sequence, Tuple
+
+# Context budgets in tokens: for LLM prompts, and for the local answer's quoted passages.
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1600"))
+FALLBACK_CONTEXT_TOKENS = 600
+# History budgets in tokens: recent turns sent verbatim, and the summary of the turns before them.
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "800"))
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", "300"))
+# auto: tiktoken with CHAT_TOKEN_ENCODING if it is installed and the encoding loads, else an estimate.
+CHAT_TOKENIZER = os.getenv("CHAT_TOKENIZER", "auto").lower()
+CHAT_TOKEN_ENCODING = os.getenv("CHAT_TOKEN_ENCODING", "o200k_base")
+
+SYSTEM_PROMPT = (
+    "You are Sumrify’s assistant. Answer the user’s question using ONLY the provided document context. "
+    "If the answer isn’t in the context, say you can’t find it in the document and ask a clarifying question. "
+    "Be concise, factual, and avoid inventing details."
+)
+NO_DOCUMENT = "I can help, but I don’t have any document text yet. Upload a document and then ask your question."
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-zA-Z0-9]+")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+# Documents recently split, most recent last.
+_DOCUMENTS: "OrderedDict[str, _Document]" = OrderedDict()
+_DOCUMENT_CACHE_SIZE = 8
+# Sync handlers run in a thread pool; an OrderedDict's reordering is not thread-safe.
+_documents_lock = threading.Lock()
+_openai_clients: Dict[str, Any] = {}
+_encoding: Any = None  # False once tiktoken turned out to be unavailable
+
+Stage = Callable[[str], ContextManager]
+Turn = Tuple[str, str]  # (role, content)
+
+
+def _no_stage(name: str) -> ContextManager:
+    return nullcontext()
+
+
+def _tiktoken():
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if CHAT_TOKENIZER == "auto":
+            try:
+                import tiktoken  # type: ignore
+
+                _encoding = tiktoken.get_encoding(CHAT_TOKEN_ENCODING)
+            except Exception:  # not installed, or the encoding file is not available offline
+                pass
+    return _encoding or None
+
+
+def tokenizer_name() -> str:
+    encoding = _tiktoken()
+    return f"tiktoken:{encoding.name}" if encoding else "estimate"
+
+
+def _estimate(word: str) -> int:
+    # Common words are one BPE token; longer ones split roughly every 6 characters.
+    return 1 + (len(word) - 1) // 6
+
+
+def count_tokens(text: str) -> int:
+    encoding = _tiktoken()
+    if encoding:
+        return len(encoding.encode_ordinary(text))
+    return sum(_estimate(w) for w in _TOKEN.findall(text))
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """The longest prefix of `text` within `limit` tokens."""
+    encoding = _tiktoken()
+    if encoding:
+        tokens = encoding.encode_ordinary(text)
+        return text if len(tokens) <= limit else encoding.decode(tokens[:limit])
+    used = 0
+    for match in _TOKEN.finditer(text):
+        used += _estimate(match.group())
+        if used > limit:
+            return text[:match.start()].rstrip()
+    return text
+
+
+class _Document:
+    """A document's rough sentences (over 25 characters), lowercased copies and token counts counted on demand."""
+
+    __slots__ = ("sentences", "lowered", "_tokens")
+
+    def __init__(self, text: str):
+        parts = (p.strip() for p in _SENTENCE_END.split(text.replace("\n", " ")))
+        self.sentences = [p for p in parts if len(p) > 25]
+        self.lowered = [s.lower() for s in self.sentences]
+        self._tokens = [0] * len(self.sentences)
+
+    def tokens(self, i: int) -> int:
+        if not self._tokens[i]:
+            self._tokens[i] = max(1, count_tokens(self.sentences[i]))
+        return self._tokens[i]
+
+
+def _document(text: str) -> _Document:
+    with _documents_lock:
+        doc = _DOCUMENTS.get(text)
+        if doc is not None:
+            _DOCUMENTS.move_to_end(text)
+            return doc
+    # Split outside the lock; two threads may both split a new document, and the second one is kept.
+    doc = _Document(text)
+    with _documents_lock:
+        _DOCUMENTS[text] = doc
+        _DOCUMENTS.move_to_end(text)
+        if len(_DOCUMENTS) > _DOCUMENT_CACHE_SIZE:
+            _DOCUMENTS.popitem(last=False)
+    return doc
+
+
+def relevance(message: str, doc: _Document) -> Dict[int, float]:
+    """Sentence index -> summed weight of the message keywords (words over 3 characters) it contains.
+
+    A keyword found in few sentences weighs more: log(1 + sentences / sentences containing it).
+    """
+    keywords = {w for w in _WORD.findall((message or "").lower()) if len(w) > 3}
+    scores: Dict[int, float] = {}
+    for keyword in keywords:
+        hits = [i for i, lower in enumerate(doc.lowered) if keyword in lower]
+        if hits:
+            weight = math.log(1 + len(doc.sentences) / len(hits))
+            for i in hits:
+                scores[i] = scores.get(i, 0.0) + weight
+    return scores
+
+
+def pack_context(message: str, document_text: str, budget: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Relevant sentences within `budget` tokens, as passages in document order: (context, tokens).
+    Sentences are taken by relevance per token, skipping any that no longer fit. Adjacent
+    picks merge into one passage. Without any keyword match the document's opening is used.
+    """
+    budget = CHAT_CONTEXT_TOKENS if budget is None else budget
+    if not document_text:
+        return "", 0
+    doc = _document(document_text)
+    if not doc.sentences:
+        context = truncate_tokens(document_text, budget)
+        return context, count_tokens(context)
+
+    scores = relevance(message, doc)
+    order = sorted(scores, key=lambda i: (-scores[i] / doc.tokens(i), i)) if scores else range(len(doc.sentences))
+    chosen: List[int] = []
+    used = 0
+    for i in order:
+        cost = doc.tokens(i) + 1  # plus the separator
+        if used + cost <= budget:
+            chosen.append(i)
+            used += cost
+        elif not scores:
+            break  # keep the opening contiguous
+    if not chosen:
+        context = truncate_tokens(doc.sentences[next(iter(order))], budget)
+        return context, count_tokens(context)
+
+    chosen.sort()
+    passages: List[List[str]] = []
+    for k, i in enumerate(chosen):
+        if k and i == chosen[k - 1] + 1:
+            passages[-1].append(doc.sentences[i])
+        else:
+            passages.append([doc.sentences[i]])
+    context = "\n\n".join(" ".join(p) for p in passages)
+    return context, count_tokens(context)
+
+
+def _usage(
+    context_tokens: int, prompt_tokens: Optional[int] = None, summary: str = "", recent: Sequence[Turn] = ()
+) -> Dict[str, Any]:
+    usage: Dict[str, Any] = {"contextTokens": context_tokens, "tokenizer": tokenizer_name()}
+    if prompt_tokens is not None:
+        usage["promptTokens"] = prompt_tokens
+        usage["historyTokens"] = sum(count_tokens(content) for _, content in recent)
+        usage["memoryTokens"] = count_tokens(summary) if summary else 0
+    return usage
+
+
+def local_answer(message: str, document_text: str, stage: Stage = _no_stage) -> Dict[str, Any]:
+    """The best-matching passages, quoted; used when no provider is configured or one fails."""
+    with stage("retrieval"):
+        context, tokens = pack_context(message, document_text, FALLBACK_CONTEXT_TOKENS)
+    if not context.strip():
+        content = "I don’t have any document text to reference yet. Please upload a document first."
+    else:
+        content = (
+            "Based on the document, here’s what I found:\n\n"
+            + context
+            + "\n\nIf you want, ask a more specific question (section/topic/term) and I’ll narrow it down."
+        )
+    return {"content": content, "provider": "local", "usage": _usage(tokens)}
+
+
+def _turns(conversation_history: Optional[List[Dict[str, str]]]) -> List[Turn]:
+    turns = []
+    for item in conversation_history or []:
+        role = item.get("role")
+        content = item.get("content")
+        if role in {"user", "assistant"} and isinstance(content, str) and content.strip():
+            turns.append((role, content.strip()))
+    return turns
+
+
+def _digest(turns: List[Turn]) -> str:
+    return hashlib.sha1(json.dumps(turns, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def distinctiveness_scores(sentences: List[str]) -> List[float]:
+    """
+    Mean weight of a sentence's distinct words (over 3 characters), weighted as in `relevance`:
+    log(1 + sentences / sentences containing the word). Sentences with a number, and the
+    opening one, get the summarizer's small bonuses. Specific statements outrank restated topics.
+    """
+    words = [{w for w in _WORD.findall(s.lower()) if len(w) > 3} for s in sentences]
+    counts = Counter(w for ws in words for w in ws)
+    scores = []
+    for i, (sentence, ws) in enumerate(zip(sentences, words)):
+        score = sum(math.log(1 + len(sentences) / counts[w]) for w in ws) / len(ws) if ws else 0.0
+        if any(c.isdigit() for c in sentence):
+            score *= 1.05
+        scores.append(score * (1.2 if i == 0 else 1.0))
+    return scores
+
+
+def render_memory(units: List[List[str]]) -> str:
+    """Summary units ([role, sentence]) as one "ROLE: sentences" line per run of the same speaker."""
+    lines: List[Tuple[str, List[str]]] = []
+    for role, sentence in units:
+        if lines and lines[-1][0] == role:
+            lines[-1][1].append(sentence)
+        else:
+            lines.append((role, [sentence]))
+    return "\n".join(f"{role.upper()}: {' '.join(sentences)}" for role, sentences in lines)
+
+
+class ConversationMemory:
+    """
+    Rolling extractive summary of the turns that no longer fit verbatim, kept per session.
+
+    An entry is {"covered": turns summarized, "digest": their digest, "units": [[role, sentence], ...]}.
+    While a request's history still starts with the covered turns, the entry's summary is
+    extended with the turns that have since left the verbatim window and compressed again,
+    so a turn costs one small compression however long the session is. Otherwise (a new
+    instance, an edited history) the older turns are compressed from scratch.
+
+    Entries live in process and sentences are scored by `distinctiveness_scores`; the backend
+    overrides `load`, `save` and `score` to share entries and reuse the summarizer's scoring.
+    """
+
+    def __init__(self, size: int = 256):
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._size = size
+        self._lock = threading.Lock()
+
+    def load(self, session: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(session)
+            if entry is not None:
+                self._entries.move_to_end(session)
+            return entry
+
+    def save(self, session: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[session] = entry
+            self._entries.move_to_end(session)
+            if len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def score(self, sentences: List[str]) -> List[float]:
+        return distinctiveness_scores(sentences)
+
+    def compress(self, units: List[List[str]], budget: int) -> List[List[str]]:
+        """The units with the best score per token within `budget` tokens, in conversation order."""
+        # Plus one per unit for the separators and speaker labels of the rendered summary.
+        tokens = [count_tokens(sentence) + 1 for _, sentence in units]
+        if sum(tokens) <= budget:
+            return units
+        scores = self.score([sentence for _, sentence in units])
+        chosen: List[int] = []
+        used = 0
+        for i in sorted(range(len(units)), key=lambda i: (-scores[i] / tokens[i], i)):
+            if used + tokens[i] <= budget:
+                chosen.append(i)
+                used += tokens[i]
+        return [units[i] for i in sorted(chosen)]
+
+    def split(
+        self,
+        conversation_history: Optional[List[Dict[str, str]]],
+        session_id: Optional[str] = None,
+        history_budget: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+    ) -> Tuple[str, List[Turn]]:
+        """
+        (summary of the older turns, the newest turns verbatim) for a prompt. The newest
+        turns are kept while they fit `history_budget` tokens, the last one truncated if it
+        alone does not. Without `session_id` the session is named by its opening exchange.
+        """
+        history_budget = CHAT_HISTORY_TOKENS if history_budget is None else history_budget
+        memory_budget = CHAT_MEMORY_TOKENS if memory_budget is None else memory_budget
+        turns = _turns(conversation_history)
+        recent: List[Turn] = []
+        used = 0
+        for role, content in reversed(turns):
+            tokens = count_tokens(content)
+            if used + tokens > history_budget:
+                if not recent:
+                    recent.append((role, truncate_tokens(content, history_budget)))
+                break
+            recent.append((role, content))
+            used += tokens
+        recent.reverse()
+        older = len(turns) - len(recent)
+        if not older:
+            return "", recent
+
+        session = session_id or _digest(turns[:2])
+        entry = self.load(session)
+        if entry is not None and entry["covered"] <= len(turns) and entry["digest"] == _digest(turns[:entry["covered"]]):
+            if entry["covered"] >= older:
+                # The window grew back over summarized turns; the summary still holds.
+                return render_memory(entry["units"]), recent
+            units, start = list(entry["units"]), entry["covered"]
+        else:
+            units, start = [], 0
+        seen = {sentence.lower() for _, sentence in units}
+        for role, content in turns[start:older]:
+            for part in _SENTENCE_END.split(content.replace("\n", " ")):
+                part = part.strip()
+                if part and part.lower() not in seen:  # answers repeat themselves; keep the first
+                    seen.add(part.lower())
+                    units.append([role, part])
+        units = self.compress(units, memory_budget)
+        self.save(session, {"covered": older, "digest": _digest(turns[:older]), "units": units})
+        return render_memory(units), recent
+
+
+conversation_memory = ConversationMemory()
+
+
+def openai_messages(message: str, context: str, summary: str, recent: List[Turn]) -> List[Dict[str, str]]:
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": "Document context:\n" + context},
+    ]
+    if summary:
+        messages.append({"role": "system", "content": "Earlier in this conversation (summary):\n" + summary})
+    messages += [{"role": role, "content": content} for role, content in recent]
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+def message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Prompt tokens of chat messages, with OpenAI's per-message and reply-priming overhead."""
+    return sum(count_tokens(m["content"]) + 3 for m in messages) + 3
+
+
+def huggingface_prompt(message: str, context: str, summary: str, recent: List[Turn]) -> str:
+    lines = [
+        "You are Sumrify’s assistant. Answer using ONLY the provided document context.",
+        "If the answer is not in the context, say you cannot find it in the document and ask a clarifying question.",
+        "",
+        "DOCUMENT CONTEXT:",
+        context,
+        "",
+    ]
+    if summary:
+        lines += ["EARLIER IN THIS CONVERSATION (summary):", summary, ""]
+    lines += [f"{role.upper()}: {content}" for role, content in recent]
+    lines.append(f"USER: {message}")
+    lines.append("ASSISTANT:")
+    return "\n".join(lines)
+
+
+def _openai_client(api_key: str):
+    """A cached OpenAI client, or None if the SDK is not installed."""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        try:
+            import openai  # type: ignore
+        except ImportError:
+            return None
+        client = _openai_clients[api_key] = openai.OpenAI(api_key=api_key)
+    return client
+
+
+def huggingface_generate(token: str, model: str, prompt: str) -> str:
+    import httpx
+
+    base_url = os.getenv("HUGGINGFACE_API_URL", "https://api-inference.huggingface.co/models").rstrip("/")
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json", "Content-Type": "application/json"}
+    # Hugging Face models vary; keep parameters conservative for reliability.
+    payload: Dict[str, Any] = {
+        "inputs": prompt,
+        "parameters": {"max_new_tokens": 350, "temperature": 0.2, "return_full_text": False},
+        "options": {"wait_for_model": True},
+    }
+    with httpx.Client(timeout=60) as client:
+        r = client.post(f"{base_url}/{model}", headers=headers, json=payload)
+        r.raise_for_status()
+        data = r.json()
+
+    # Most text-generation models return a list of {generated_text: ...}, some pipelines a dict.
+    if isinstance(data, list) and data and isinstance(data[0], dict) and isinstance(data[0].get("generated_text"), str):
+        return data[0]["generated_text"].strip()
+    if isinstance(data, dict) and isinstance(data.get("generated_text"), str):
+        return data["generated_text"].strip()
+    if isinstance(data, dict) and isinstance(data.get("error"), str):
+        raise RuntimeError(data["error"])
+    raise ValueError("Unexpected Hugging Face response format")
+
+
+def answer(
+    message: str,
+    document_text: str,
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    stage: Stage = _no_stage,
+    on_fallback: Optional[Callable[[str], None]] = None,
+    session_id: Optional[str] = None,
+    memory: Optional[ConversationMemory] = None,
+) -> Dict[str, Any]:
+    """
+    Answer `message` about `document_text`: {"content", "provider", "usage"} plus "model" or "error".
+    `usage` has the context's and the prompt's token counts, and for LLM prompts the verbatim
+    history's and the summary's. `stage(name)` wraps retrieval, history and provider calls
+    (the backend times them); `on_fallback(reason)` is called whenever a provider is skipped
+    or fails. Older turns are summarized by `memory` (default: `conversation_memory`) under `session_id`.
+    """
+    message = (message or "").strip()
+    document_text = (document_text or "").strip()
+    fallback = on_fallback or (lambda reason: None)
+    memory = memory or conversation_memory
+    if not document_text:
+        return {"content": NO_DOCUMENT, "provider": "local", "usage": _usage(0)}
+
+    # Read per call: the backend and the load test set these after import.
+    openai_key = os.getenv("OPENAI_API_KEY")
+    openai_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    hf_model = os.getenv("HUGGINGFACE_MODEL", "HuggingFaceH4/zephyr-7b-beta")
+    hf_token = os.getenv("HUGGINGFACE_API_TOKEN") or os.getenv("HF_API_TOKEN")
+    client = _openai_client(openai_key) if openai_key else None
+    if openai_key and client is None:
+        fallback("openai_unavailable")
+
+    if client is not None:
+        try:
+            with stage("retrieval"):
+                context, context_tokens = pack_context(message, document_text)
+            with stage("history"):
+                summary, recent = memory.split(conversation_history, session_id)
+            messages = openai_messages(message, context, summary, recent)
+            usage = _usage(context_tokens, message_tokens(messages), summary, recent)
+            with stage("openai"):
+                resp = client.chat.completions.create(model=openai_model, messages=messages, temperature=0.2)
+            content = (resp.choices[0].message.content or "").strip()
+            if content:
+                return {"content": content, "provider": "openai", "model": openai_model, "usage": usage}
+            fallback("openai_empty")
+            return local_answer(message, document_text, stage)
+        except Exception as e:
+            fallback("openai_error")
+            # Don’t leak internal details in prod responses.
+            return {**local_answer(message, document_text, stage), "error": str(e)[:300]}
+
+    if hf_token:
+        try:
+            with stage("retrieval"):
+                context, context_tokens = pack_context(message, document_text)
+            with stage("history"):
+                summary, recent = memory.split(conversation_history, session_id)
+            prompt = huggingface_prompt(message, context, summary, recent)
+            usage = _usage(context_tokens, count_tokens(prompt), summary, recent)
+            with stage("huggingface"):
+                text = huggingface_generate(hf_token, hf_model, prompt)
+            if text:
+                return {"content": text, "provider": "huggingface", "model": hf_model, "usage": usage}
+            fallback("huggingface_empty")
+        except ValueError:
+            fallback("huggingface_format")
+        except Exception:
+            fallback("huggingface_error")
+    else:
+        fallback("no_provider")
+    return local_answer(message, document_text, stage)
+
+
+# Serverless handler: a plain ASGI app, so no web framework is imported on a cold start.
+_CORS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"POST, OPTIONS"),
+    (b"access-control-allow-headers", b"*"),
+]
+
+
+async def _respond(send, status: int, payload: Optional[Dict[str, Any]] = None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    headers = _CORS + ([(b"content-type", b"application/json")] if payload is not None else [])
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _parse_request(body: bytes) -> Tuple[str, str, List[Dict[str, str]], Optional[str]]:
+    data = json.loads(body or b"null")
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    message, document_text = data.get("message"), data.get("documentText")
+    history = data.get("conversationHistory") or []
+    if not isinstance(message, str) or not isinstance(document_text, str) or not isinstance(history, list):
+        raise ValueError("message and documentText must be strings and conversationHistory a list")
+    session_id = data.get("sessionId")
+    return message, document_text, [h for h in history if isinstance(h, dict)], session_id if isinstance(session_id, str) else None
+
+
+async def app(scope, receive, send):
+    """POST / or /api/chat with {message, documentText, conversationHistory, sessionId?} (or an X-Session-Id header)."""
+    if scope["type"] == "lifespan":
+        while True:
+            event = await receive()
+            if event["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif event["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    if scope["method"] == "OPTIONS":
+        return await _respond(send, 204)
+    # Vercel maps `api/chat.py` to `/api/chat` and the app sees `/`; other hosts pass the full path.
+    if scope["path"].rstrip("/") not in {"", "/api/chat"}:
+        return await _respond(send, 404, {"detail": "Not Found"})
+    if scope["method"] != "POST":
+        return await _respond(send, 405, {"detail": "Method Not Allowed"})
+
+    body = b""
+    while True:
+        event = await receive()
+        body += event.get("body", b"")
+        if not event.get("more_body"):
+            break
+    try:
+        message, document_text, history, session_id = _parse_request(body)
+    except ValueError as e:
+        return await _respond(send, 422, {"detail": str(e)})
+    if not message.strip():
+        return await _respond(send, 400, {"detail": "Message is required"})
+
+    # Provider calls block; keep the event loop free for other requests on this instance.
+    if session_id is None:
+        session_id = dict(scope.get("headers") or []).get(b"x-session-id", b"").decode("latin-1") or None
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: answer(message, document_text, history, session_id=session_id)
+    )
+    await _respond(send, 200, {"role": "assistant", **result, "timestamp": datetime.utcnow().isoformat()})